@@ -19,17 +19,27 @@
 
 import subprocess
 import warnings
-import sys
+import hashlib
+
+from concurrent.futures import ThreadPoolExecutor,wait,FIRST_COMPLETED
 
 import numpy as np
 
 from datetime import datetime
 
+from .errors import *
+from .stats import timed,count
+from .seeds import fit_starts,start_args,remember_fit
+from .process import start_cbsmodel,kill_process_group,check_returncode
+from .parsers import read_input_file,sidecar_path,as_columns,parse_fit_output,parse_simple_output,complete_output
+from .native import extract_params_native,calculate_native_quantities
+
 #---------------------------------------------------------------------------------------#
 #		Dics and Colors
 #---------------------------------------------------------------------------------------#
 
 Dic_Keys 	= {0:'energy',1:'BE2',2:'ME2',3:'rho2E0'}
+Dic_Attributes 	= {'energy':'cbs_energies','BE2':'cbs_BE2','ME2':'cbs_ME2','rho2E0':'cbs_rho2E0'}
 
 class bcolors:
     HEADER = '\033[95m'
@@ -41,6 +51,64 @@ class bcolors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
+#---------------------------------------------------------------------------------------#
+#		Run cbsmodel
+#---------------------------------------------------------------------------------------#
+
+def run_cbsmodel(self,run_string,data_files=()):
+	'''Run cbsmodel with the commands in run_string and return its output.
+
+	data_files are the files read by cbsmodel, which are part of the cache key.
+	'''
+
+	if self.cache is not None:
+		key_cache 	= self.cache.key(run_string,data_files)
+		output_cbs 	= self.cache.get(key_cache)
+
+		if output_cbs is not None:
+			count(self,'cache_hits')
+			return output_cbs
+
+	#reuse the running cbsmodel process if a session is attached
+	with timed(self,'cbsmodel'):
+		if self.session is not None:
+			output_cbs 	= self.session.run(run_string,self.timeout)
+			success_cbs 	= complete_output(output_cbs)
+			count(self,'session_calls')
+		else:
+			process_cbs 	= start_cbsmodel(['cbsmodel']+run_string.split(),self.rlimits,
+							stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+			count(self,'subprocesses')
+			output_cbs 	= communicate_cbsmodel(self,process_cbs,run_string)
+			success_cbs 	= process_cbs.returncode == 0
+
+	count(self,'bytes_in',len(run_string))
+	count(self,'bytes_out',len(output_cbs))
+
+	if self.cache is not None and success_cbs:
+		self.cache.put(key_cache,output_cbs)
+
+	return output_cbs
+
+def communicate_cbsmodel(self,process_cbs,run_string):
+	'''Wait at most self.timeout seconds for cbsmodel to finish and return its output.
+
+	A process which does not finish in time is killed together with its children.
+	'''
+
+	try:
+		output_cbs,_ = process_cbs.communicate(timeout=self.timeout)
+	except subprocess.TimeoutExpired:
+		kill_process_group(process_cbs)
+		process_cbs.communicate()
+		count(self,'timeouts')
+		raise CBSTimeoutError('cbsmodel did not finish within %g s while running `%s`'% 
+					(self.timeout,' '.join(run_string.split()[:20])))
+
+	check_returncode(process_cbs,run_string)
+
+	return output_cbs
+
 #---------------------------------------------------------------------------------------#
 #		Read input file
 #---------------------------------------------------------------------------------------#
@@ -48,77 +116,48 @@ class bcolors:
 def read_input(self):
 	'''Read and parse cbsmodel input file'''
 
-	out_cbs_energies 	= []
-	out_cbs_BE2 		= []
-	out_cbs_ME2 		= []
-	out_cbs_rho2E0 		= []
+	parsed_input = read_input_file('%s%s'% (self.input_path,self.input_file),sidecar_path(self))
 
-	cbs_data_file 		= open('%s%s'% (self.input_path,self.input_file))
-	lines_cbs_data_file 	= list(cbs_data_file.readlines())
+	for A in parsed_input['A']:
+		if self.A != A:
+			warnings.warn('Mass numbers do not coincide! Using A = %i'% self.A,UserWarning)
 
-	for num_line,line in enumerate(lines_cbs_data_file):
-		
-		if len(line) > 1:
-			elements_line = line.split()
-		
-			if elements_line[0] == 'A':
-				if self.A != int(elements_line[1]):
-					warnings.warn('Mass numbers do not coincide! Using A = %i'% self.A,UserWarning)
-
-			elif elements_line[0] == 'Z':
-				if self.Z != int(elements_line[1]):
-					warnings.warn('Charge numbers do not coincide! Using Z = %i'% self.Z,UserWarning)
-
-			elif elements_line[0] == 'fit':
-				if len(elements_line) < 3:
-					raise ValueError('cbsmodel fit command should specify the data file\n \
-						and at least one fit parameter!')
-
-				self.name_fit_params 	= elements_line[2:]
-
-				splitted_cbs_file 	= elements_line[1].split('/')
-				self.cbs_file 		= splitted_cbs_file[-1]
-
-				if len(splitted_cbs_file) == 1:
-					self.cbs_path  	= ''
-				else:
-					self.cbs_path  	= '/'.join(elements_line[1].split('/')[:-1])+'/'
-
-			elif elements_line[0] == 'energy':
-				if len(elements_line) != 3:
-					raise ValueError('cbsmodel input for energy not correct in %s!\n \
-						Must be `energy L s` not `%s`!'% (self.cbs_file,' '.join(elements_line)))
-
-				out_cbs_energies.append([int(elements_line[1]),int(elements_line[2])])
-
-			elif elements_line[0] == 'BE2':
-				if int(elements_line[1]) == 0 and int(elements_line[3]) == 0:
-					warnings.warn('No E2 gamma transition between two states with J=0 possible.\n \
-						Ignoring the transition %s.'% ' '.join(elements_line),UserWarning)
-				else:
-					out_cbs_BE2.append([int(elements_line[1]),int(elements_line[2]),
-							int(elements_line[3]),int(elements_line[4])])
-
-			elif elements_line[0] == 'ME2':
-				if int(elements_line[1]) == 0 and int(elements_line[3]) == 0:
-					warnings.warn('No E2 gamma transition between two states with J=0 possible.\n \
-						Ignoring the transition %s.'% ' '.join(elements_line),UserWarning)
-				else:
-					out_cbs_ME2.append([int(elements_line[1]),int(elements_line[2]),
-							int(elements_line[3]),int(elements_line[4])])
-
-			elif elements_line[0] == 'rho2E0':
-				out_cbs_rho2E0.append([int(elements_line[1]),int(elements_line[2]),
-							int(elements_line[3]),int(elements_line[4])])
-
-	return np.array(out_cbs_energies),np.array(out_cbs_BE2),np.array(out_cbs_ME2),np.array(out_cbs_rho2E0)
+	for Z in parsed_input['Z']:
+		if self.Z != Z:
+			warnings.warn('Charge numbers do not coincide! Using Z = %i'% self.Z,UserWarning)
+
+	if len(parsed_input['fit']) > 0:
+		self.name_fit_params 	= [str(param) for param in parsed_input['fit'][1:]]
+
+		splitted_cbs_file 	= str(parsed_input['fit'][0]).split('/')
+		self.cbs_file 		= splitted_cbs_file[-1]
+
+		if len(splitted_cbs_file) == 1:
+			self.cbs_path  	= ''
+		else:
+			self.cbs_path  	= '/'.join(splitted_cbs_file[:-1])+'/'
+
+	out_quantities = {}
+
+	for in_keyword in ['BE2','ME2']:
+		quantities = parsed_input[in_keyword]
+		mask_E0    = (quantities['L1'] == 0) & (quantities['L2'] == 0)
+
+		for transition in quantities[mask_E0]:
+			warnings.warn('No E2 gamma transition between two states with J=0 possible.\n \
+				Ignoring the transition %s %s.'% (in_keyword,' '.join([str(x) for x in transition])),UserWarning)
+
+		out_quantities[in_keyword] = quantities[~mask_E0]
+
+	return as_columns(parsed_input['energy']),as_columns(out_quantities['BE2']),\
+		as_columns(out_quantities['ME2']),as_columns(parsed_input['rho2E0'])
 
 #---------------------------------------------------------------------------------------#
 #		Fit CBS to input data
 #---------------------------------------------------------------------------------------#
 
-def cbs_fit_data(self,*args):
-	'''Fit CBS to data as indicated in cbsmodel input file'''
+def fit_string(self,*args):
+	'''Create the cbsmodel commands for a fit to data as indicated in cbsmodel input file'''
 
 	run_string  = 'A %i Z %i '% (self.A,self.Z)
 	run_string += 'Wu '
@@ -129,10 +168,102 @@ def cbs_fit_data(self,*args):
 	run_string += 'fit %s%s %s '% (self.cbs_path,self.cbs_file,' '.join(self.name_fit_params))	
 	run_string += 'exit'  
 
-	output_cbs = subprocess.run('cbsmodel %s'% run_string,shell=True,capture_output=True).stdout
+	return run_string
+
+def cbs_fit_data(self,*args):
+	'''Fit CBS to data as indicated in cbsmodel input file'''
+
+	with timed(self,'cbs_fit_data'):
+		output_cbs = run_cbsmodel(self,fit_string(self,*args),[self.cbs_path+self.cbs_file])
 
 	return output_cbs
 
+def first_fit_success(outputs_cbs):
+	'''Index of the first successful fit, if all fits in front of it are known to have failed'''
+
+	num_next = 0
+
+	while num_next < len(outputs_cbs) and outputs_cbs[num_next] is not None \
+		and b'Fit successful' not in outputs_cbs[num_next]:
+		num_next += 1
+
+	if num_next < len(outputs_cbs) and outputs_cbs[num_next] is not None:
+		return num_next
+
+	return None
+
+def cbs_fit_data_parallel(self,list_args):
+	'''Perform the fits for all sets of arguments in list_args at once.
+	
+	As soon as the first successful fit in the order of list_args is known, 
+	all remaining fits are terminated. Their outputs are returned as None.
+	'''
+
+	run_strings 	= [fit_string(self,*args) for args in list_args]
+	data_files 	= [self.cbs_path+self.cbs_file]
+
+	if self.cache is not None:
+		keys_cache 	= [self.cache.key(run_string,data_files) for run_string in run_strings]
+		outputs_cbs 	= [self.cache.get(key_cache) for key_cache in keys_cache]
+		count(self,'cache_hits',len([output_cbs for output_cbs in outputs_cbs if output_cbs is not None]))
+	else:
+		outputs_cbs 	= [None]*len(run_strings)
+
+	#fits behind a stored successful fit are not needed
+	num_success 	= first_fit_success(outputs_cbs)
+	num_last 	= len(run_strings) if num_success is None else num_success
+
+	#fits run concurrently, hence the whole batch is recorded as a single stage
+	with timed(self,'cbs_fit_data'):
+		processes 	= {num_fit:start_cbsmodel(['cbsmodel']+run_strings[num_fit].split(),self.rlimits,
+					stdout=subprocess.PIPE,stderr=subprocess.PIPE) 
+					for num_fit in range(num_last) if outputs_cbs[num_fit] is None}
+
+		def finish_fit(num_fit):
+			#timed out or terminated fits count as failed
+			try:
+				return communicate_cbsmodel(self,processes[num_fit],run_strings[num_fit])
+			except (CBSTimeoutError,CBSProcessError):
+				return b''
+
+		count(self,'subprocesses',len(processes))
+
+		if processes:
+			with ThreadPoolExecutor(max_workers=len(processes)) as executor:
+
+				futures = {executor.submit(finish_fit,num_fit):num_fit for num_fit in processes}
+				pending = set(futures)
+				killed 	= set()
+
+				while pending:
+					done,pending = wait(pending,return_when=FIRST_COMPLETED)
+
+					for future in done:
+						num_fit 		= futures[future]
+						outputs_cbs[num_fit] 	= future.result()
+
+						count(self,'bytes_in',len(run_strings[num_fit]))
+						count(self,'bytes_out',len(outputs_cbs[num_fit]))
+
+						if self.cache is not None and processes[num_fit].returncode == 0:
+							self.cache.put(keys_cache[num_fit],outputs_cbs[num_fit])
+
+					#fits with lower starting values take precedence
+					num_success = first_fit_success(outputs_cbs)
+
+					if num_success is not None:
+						for num_fit,process in processes.items():
+							if num_fit > num_success and process.poll() is None and num_fit not in killed:
+								kill_process_group(process)
+								killed.add(num_fit)
+								count(self,'fits_killed')
+
+	#outputs of terminated fits are incomplete
+	if num_success is not None:
+		outputs_cbs[num_success+1:] = [None]*len(outputs_cbs[num_success+1:])
+
+	return outputs_cbs
+
 #---------------------------------------------------------------------------------------#
 #		Extract CBS parameters
 #---------------------------------------------------------------------------------------#
@@ -140,10 +271,32 @@ def cbs_fit_data(self,*args):
 def extract_params(self):
 	'''Extract structural parameters (r_beta etc.) from cbsmodel output'''
 
+	if self.backend == 'numpy':
+		with timed(self,'native_fit'):
+			return extract_params_native(self)
+
+	#r_beta from a fixed grid or ordered by the distance to the seed of a neighbour
+	starts = fit_starts(self)
+
+	#Perform all fits at once, only the first successful one is kept
+	if self.parallel_fit:
+		outputs_cbs = cbs_fit_data_parallel(self,[start_args(start) for start in starts])
+
 	#Perform fits to data with different r_beta until solution is found
-	for r_beta in np.arange(0.1,1,0.2):
+	for num_start,start in enumerate(starts):
+
+		r_beta = start['rb']
 
-		output_cbs = cbs_fit_data(self,'rb %s'% r_beta)
+		if self.parallel_fit:
+			output_cbs = outputs_cbs[num_start]
+		else:
+			#a fit which times out or is terminated is treated as not converged
+			try:
+				output_cbs = cbs_fit_data(self,*start_args(start))
+			except (CBSTimeoutError,CBSProcessError) as error:
+				if self.verbose:
+					print(error)
+				output_cbs = b''
 		
 		if b'Fit successful' in output_cbs:
 			self.cbs_fit_success = True
@@ -153,23 +306,26 @@ def extract_params(self):
 
 		if self.verbose:
 			print('Fit with starting value r_beta = %.2f not successful. Continuing...'% r_beta)
+
+		count(self,'fit_retries')
 	
 	else:	
-		sys.exit(f'{bcolors.FAIL}Error: Fits in cbsmodel did not converge.{bcolors.ENDC}')
+		raise CBSFitError('Fits in cbsmodel did not converge.')
+
+	with timed(self,'parse_fit_output'):
+		read_fit_output(self,output_cbs)
 
-	#Split output by linebreaks
-	output_cbs 	= output_cbs.split(b'\n')
+	remember_fit(self)
 
-	#extract reduced chisquare and fit parameters
-	self.red_chi 	= float(output_cbs[16].split(b':')[1])
-	self.fit_params = np.zeros((2*len(self.name_fit_params)))
+	return
 
-	for i in range(len(self.name_fit_params)):
+def read_fit_output(self,output_cbs):
+	'''Read reduced chisquare and fit parameters from the output of a successful fit'''
 
-		string_param = output_cbs[7+i].split(b':')[1].split(b'+-')
+	self.fit_result = parse_fit_output(output_cbs,self.name_fit_params)
 
-		self.fit_params[2*i] 	= float(string_param[0])
-		self.fit_params[2*i+1] 	= float(string_param[1])
+	self.red_chi 	= self.fit_result.red_chi
+	self.fit_params = self.fit_result.fit_params()
 
 	return
 
@@ -177,8 +333,8 @@ def extract_params(self):
 #		Calculate quantities of interest
 #---------------------------------------------------------------------------------------#
 
-def calculate_cbs_quantities(self,in_list,in_keyword):
-	'''Use obtained structural parameters to calculate CBS predictions for quantities specified in input file'''
+def parameters_string(self):
+	'''Create the cbsmodel commands setting the obtained structural parameters'''
 
 	run_string  = 'A %i Z %i '% (self.A,self.Z)
 	run_string += 'Wu simpleoutput '
@@ -186,6 +342,13 @@ def calculate_cbs_quantities(self,in_list,in_keyword):
 	for num_param,param in enumerate(self.name_fit_params):
 		run_string += '%s %.5f '% (param,self.fit_params[2*num_param])
 
+	return run_string
+
+def quantities_string(in_list,in_keyword):
+	'''Create the cbsmodel commands for all quantities in in_list of type in_keyword'''
+
+	run_string = ''
+
 	for num_quantity,quantity in enumerate(in_list):
 		if in_keyword == 'energy':
 			run_string += '%s %i %i '% (in_keyword,in_list[num_quantity,0],in_list[num_quantity,1])
@@ -193,26 +356,65 @@ def calculate_cbs_quantities(self,in_list,in_keyword):
 			run_string += '%s %i %i %i %i '% (in_keyword,in_list[num_quantity,0],in_list[num_quantity,1],
 								in_list[num_quantity,2],in_list[num_quantity,3])
 		else:
-			warning.warn('keyword %s not known in cbsmodel!'% in_keyword,UserWarning)
+			warnings.warn('keyword %s not known in cbsmodel!'% in_keyword,UserWarning)
+			break
+
+	return run_string
+
+def calculate_cbs_quantities(self,in_list,in_keyword):
+	'''Use obtained structural parameters to calculate CBS predictions for quantities specified in input file'''
 
+	run_string  = parameters_string(self)
+	run_string += quantities_string(in_list,in_keyword)
 	run_string += 'exit'
 
-	output_cbs = subprocess.run('cbsmodel %s'% run_string,shell=True,capture_output=True).stdout
+	output_cbs = run_cbsmodel(self,run_string)
 
 	return output_cbs
 
+def all_quantities_string(self,in_lists):
+	'''Create the cbsmodel commands for quantities of all types in in_lists.
+
+	Besides the commands, the positions (start,stop) of the values of each keyword
+	in the output are returned.
+	'''
+
+	run_string 	= parameters_string(self)
+	positions 	= {}
+	num_values 	= 0
+
+	for in_keyword,in_list in in_lists.items():
+		string_quantities = quantities_string(in_list,in_keyword)
+
+		if string_quantities:
+			run_string 		+= string_quantities
+			positions[in_keyword] 	= (num_values,num_values+len(in_list))
+			num_values 		+= len(in_list)
+
+	run_string += 'exit'
+
+	return run_string,positions
+
+def calculate_all_cbs_quantities(self,in_lists):
+	'''Calculate CBS predictions for quantities of all types in a single cbsmodel call.
+
+	in_lists is a dict {keyword:list of quantities}. Besides the output,
+	the positions (start,stop) of the values of each keyword in the output are returned.
+	'''
+
+	run_string,positions 	= all_quantities_string(self,in_lists)
+	output_cbs 		= run_cbsmodel(self,run_string)
+
+	return output_cbs,positions
+
 #---------------------------------------------------------------------------------------#
 #		Extract calculated CBS quantities
 #---------------------------------------------------------------------------------------#
 
-def extract_cbs_quantities(self,in_output_cbs):
-	'''Extract specified qauntities from cbsmodel output'''
-
-	in_output_cbs 	= in_output_cbs.split()
-
-	out_quantities 	= np.array([float(i) for i in in_output_cbs[2:]])
+def extract_cbs_quantities(self,in_output_cbs,num_values=None):
+	'''Extract specified quantities from cbsmodel output'''
 
-	return out_quantities
+	return parse_simple_output(in_output_cbs,num_values)
 
 #---------------------------------------------------------------------------------------#
 #		Write results to output file
@@ -221,69 +423,69 @@ def extract_cbs_quantities(self,in_output_cbs):
 def write_output(self):
 	'''Write essential output of cbsmodel to file'''
 
-	out_string  = '#############################\n'
-	out_string += '#      Results CBSplot      #\n'
-	out_string += '#           %i%s           #\n'% (self.A,self.nucl_name)
-	out_string += '#    %s    #\n'% datetime.now().strftime('%d-%m-%Y %H:%M:%S')
-	out_string += '#############################\n'
-	out_string += '\n'
+	out_lines = ['#############################',
+		'#      Results CBSplot      #',
+		'#           %i%s           #'% (self.A,self.nucl_name),
+		'#    %s    #'% datetime.now().strftime('%d-%m-%Y %H:%M:%S'),
+		'#############################',
+		'']
 
 	#CBS parameters
 	for num_param,param in enumerate(self.name_fit_params):
-		out_string += '%s\t%.5f +/- %.5f\n'% (param,self.fit_params[2*num_param],self.fit_params[2*num_param+1])
+		out_lines.append('%s\t%.5f +/- %.5f'% (param,self.fit_params[2*num_param],self.fit_params[2*num_param+1]))
 
-	out_string += '\n'
+	out_lines.append('')
 
 	#extracted quantities
 	for num_quantity,quantity in enumerate([self.cbs_energies,self.cbs_BE2,self.cbs_ME2,self.cbs_rho2E0]):
 		if isinstance(quantity,np.ndarray):
-			for element in quantity:
-				#print(element)
-				if num_quantity == 0:
-					out_string += '%s %i %i %.2f\n'% (Dic_Keys[num_quantity],element[0],
-										element[1],element[2])
-				else:
-					out_string += '%s %i %i %i %i %.2f\n'% (Dic_Keys[num_quantity],element[0],
-										element[1],element[2],element[3],element[4])
-			out_string += '\n'
-
-	return out_string
+			if num_quantity == 0:
+				out_lines += ['%s %i %i %.2f'% (Dic_Keys[num_quantity],*element) for element in quantity]
+			else:
+				out_lines += ['%s %i %i %i %i %.2f'% (Dic_Keys[num_quantity],*element) for element in quantity]
+			out_lines.append('')
+
+	return '\n'.join(out_lines)+'\n'
 
 #---------------------------------------------------------------------------------------#
-#		Main CBS calculations
+#		Sort and store quantities
 #---------------------------------------------------------------------------------------#
 
-def main_cbs_calculations(self):
-	'''Perform complete CBS calculation as specified in cbsmodel input file'''
+def quantities_in_lists(cbs_energies,cbs_BE2,cbs_ME2,cbs_rho2E0):
+	'''Sort the quantities from read_input into a dict {keyword:list} without empty lists'''
 
-	#extract quantities to be calculated
-	cbs_energies,cbs_BE2,cbs_ME2,cbs_rho2E0 	= read_input(self)
-	
-	#perform CBS fit to data and extract parameters (r_beta, etc.)
-	extract_params(self)
+	in_lists = {Dic_Keys[num_quantity]:quantity for num_quantity,quantity 
+			in enumerate([cbs_energies,cbs_BE2,cbs_ME2,cbs_rho2E0]) if len(quantity) > 0}
+
+	return in_lists
+
+def store_cbs_quantities(self,in_lists,values_cbs_quantities,positions):
+	'''Store calculated values alongside their quantities in cbs_energies, cbs_BE2 etc.'''
+
+	for in_keyword,(start,stop) in positions.items():
+		out_quantity 		= np.zeros((len(in_lists[in_keyword]),in_lists[in_keyword].shape[1]+1))
+		out_quantity[:,:-1]	= in_lists[in_keyword]
+		out_quantity[:,-1]	= values_cbs_quantities[start:stop]
+
+		setattr(self,Dic_Attributes[in_keyword],out_quantity)
+
+		#bands of earlier values are not valid anymore
+		setattr(self,'%s_bands'% Dic_Attributes[in_keyword],None)
+
+	return
+
+def finish_cbs_calculations(self):
+	'''Create output and save/print it if requested, append the results to the results store'''
+
+	#reruns which reused the fit and all quantities add nothing new to the store
+	if self.results_store is not None and self._results_key != results_stage_key(self):
+		self.results_store.append(self)
+		self._results_key = results_stage_key(self)
+
+	#the text summary is only a view of the results
+	if not self.write_output and not self.verbose:
+		return
 
-	for num_quantity,quantity in enumerate([cbs_energies,cbs_BE2,cbs_ME2,cbs_rho2E0]):
-		if quantity != []:
-			output_cbs_quantities = calculate_cbs_quantities(self,quantity,Dic_Keys[num_quantity])
-			
-			if num_quantity == 0:
-				self.cbs_energies 	= np.zeros((len(cbs_energies),3))
-				self.cbs_energies[:,:2]	= cbs_energies
-				self.cbs_energies[:,2]	= extract_cbs_quantities(self,output_cbs_quantities)
-			elif num_quantity == 1:
-				self.cbs_BE2 		= np.zeros((len(cbs_BE2),5))
-				self.cbs_BE2[:,:4]	= cbs_BE2
-				self.cbs_BE2[:,4]	= extract_cbs_quantities(self,output_cbs_quantities)
-			elif num_quantity == 2:
-				self.cbs_ME2 		= np.zeros((len(cbs_ME2),5))
-				self.cbs_ME2[:,:4]	= cbs_ME2
-				self.cbs_ME2[:,4]	= extract_cbs_quantities(self,output_cbs_quantities)
-			elif num_quantity == 3:
-				self.cbs_rho2E0 	= np.zeros((len(cbs_rho2E0),5))
-				self.cbs_rho2E0[:,:4]	= cbs_rho2E0
-				self.cbs_rho2E0[:,4]	= extract_cbs_quantities(self,output_cbs_quantities)
-
-	#create output and save/print it if requested
 	output = write_output(self)
 
 	if self.write_output:
@@ -296,4 +498,210 @@ def main_cbs_calculations(self):
 
 	return
 
+#---------------------------------------------------------------------------------------#
+#		Incremental recomputation
+#---------------------------------------------------------------------------------------#
+
+def fit_stage_key(self):
+	'''Key of everything the fit depends on: fit command, contents of the data file, A, Z and backend'''
+
+	hash_key = hashlib.sha256()
+
+	hash_key.update(('%s %i %i %s%s %s'% (self.backend,self.A,self.Z,self.cbs_path,self.cbs_file,
+						' '.join(self.name_fit_params))).encode())
+
+	try:
+		with open(self.cbs_path+self.cbs_file,'rb') as data_file:
+			hash_key.update(hashlib.sha256(data_file.read()).digest())
+	except OSError:
+		hash_key.update(b'missing')
+
+	return hash_key.hexdigest()
+
+def quantity_stage_key(self):
+	'''Key of the fit result all calculated quantities depend on'''
+
+	return '%s %i %i %s %s'% (self.backend,self.A,self.Z,' '.join(self.name_fit_params),self.fit_params.tobytes().hex())
+
+def results_stage_key(self):
+	'''Key of the stored results: the fit result and all calculated quantities'''
+
+	hash_key = hashlib.sha256(quantity_stage_key(self).encode())
+
+	for quantity in [self.cbs_energies,self.cbs_BE2,self.cbs_ME2,self.cbs_rho2E0]:
+		hash_key.update(np.asarray(quantity,dtype=float).tobytes()+b'|')
+
+	return hash_key.hexdigest()
+
+def fit_is_current(self):
+	'''Check whether the last successful fit is still valid, otherwise prepare a new one'''
+
+	key_fit = fit_stage_key(self)
+
+	if self.cbs_fit_success and self._fit_key == key_fit:
+		count(self,'fits_skipped')
+		return True
+
+	self.cbs_fit_success 	= False
+	self._fit_key 		= key_fit
+
+	return False
+
+def missing_quantities(self,in_lists):
+	'''Quantities in in_lists which have not been calculated for the current fit result'''
+
+	key_quantities = quantity_stage_key(self)
+
+	if self._quantities_key != key_quantities:
+		self._quantities_key 	= key_quantities
+		self._quantities 	= {}
+
+	out_lists = {}
+
+	for in_keyword,in_list in in_lists.items():
+		missing = [quantity for quantity in in_list if (in_keyword,tuple([int(i) for i in quantity])) not in self._quantities]
+
+		if missing:
+			out_lists[in_keyword] = np.array(missing,dtype=in_list.dtype)
+
+	count(self,'quantities_reused',sum([len(in_list) for in_list in in_lists.values()])
+				-sum([len(in_list) for in_list in out_lists.values()]))
+
+	return out_lists
+
+def remember_quantities(self,in_lists,values_cbs_quantities,positions):
+	'''Store calculated values of the quantities in in_lists for later runs'''
+
+	for in_keyword,(start,stop) in positions.items():
+		for quantity,value in zip(in_lists[in_keyword],values_cbs_quantities[start:stop]):
+			self._quantities[(in_keyword,tuple([int(i) for i in quantity]))] = value
+
+	return
+
+def recall_quantities(self,in_lists):
+	'''Values of all quantities in in_lists and their positions as returned by calculate_all_cbs_quantities'''
+
+	values_cbs_quantities 	= []
+	positions 		= {}
+
+	for in_keyword,in_list in in_lists.items():
+		positions[in_keyword] 	= (len(values_cbs_quantities),len(values_cbs_quantities)+len(in_list))
+		values_cbs_quantities 	+= [self._quantities[(in_keyword,tuple([int(i) for i in quantity]))] for quantity in in_list]
+
+	return np.array(values_cbs_quantities),positions
+
+def surrogate_quantities(self,in_lists):
+	'''Take the quantities in in_lists from the surrogate if their estimated relative error is at most surrogate_tol.
+
+	Returns the lists of the remaining quantities, which have to be calculated exactly.
+	'''
+
+	if not self.surrogate.covers(self.A,self.Z,self.backend,self.name_fit_params):
+		return in_lists
+
+	values_cbs_quantities,accurate 	= self.surrogate.lookup(self.fit_params[0::2],in_lists,self.surrogate_tol)
+	values_cbs_quantities,accurate 	= values_cbs_quantities[0],accurate[0]
+
+	out_lists 	= {}
+	num_values 	= 0
+
+	for in_keyword,in_list in in_lists.items():
+		accurate_list = accurate[num_values:num_values+len(in_list)]
+
+		remember_quantities(self,{in_keyword:in_list[accurate_list]},
+				values_cbs_quantities[num_values:num_values+len(in_list)][accurate_list],{in_keyword:(0,np.sum(accurate_list))})
+
+		if not np.all(accurate_list):
+			out_lists[in_keyword] = in_list[~accurate_list]
+
+		num_values += len(in_list)
+
+	count(self,'surrogate_hits',int(np.sum(accurate)))
+	count(self,'surrogate_fallbacks',int(np.sum(~accurate)))
+
+	return out_lists
+
+#---------------------------------------------------------------------------------------#
+#		Main CBS calculations
+#---------------------------------------------------------------------------------------#
+
+def prepare_cbs_calculations(self):
+	'''Read the input file and check whether the last fit is still valid.
+
+	Returns whether a new fit is needed and the quantities of all types in the input file.
+	'''
+
+	#extract quantities to be calculated
+	with timed(self,'read_input'):
+		cbs_energies,cbs_BE2,cbs_ME2,cbs_rho2E0 	= read_input(self)
+
+	#the fit is only repeated if anything it depends on changed since the last fit
+	new_fit = not fit_is_current(self)
+
+	return new_fit,quantities_in_lists(cbs_energies,cbs_BE2,cbs_ME2,cbs_rho2E0)
+
+def new_quantities(self,in_lists):
+	'''Quantities in in_lists which are neither known from previous runs nor predicted by the surrogate'''
+
+	new_lists = missing_quantities(self,in_lists)
+
+	#quantities predicted accurately by the surrogate are not calculated
+	if new_lists and self.surrogate is not None:
+		with timed(self,'surrogate'):
+			new_lists = surrogate_quantities(self,new_lists)
+
+	return new_lists
+
+def parse_new_quantities(self,output_cbs_quantities,new_lists):
+	'''Values of the quantities in new_lists from the output of calculate_all_cbs_quantities'''
+
+	with timed(self,'parse_quantities'):
+		return extract_cbs_quantities(self,output_cbs_quantities,sum([len(in_list) for in_list in new_lists.values()]))
+
+def complete_cbs_calculations(self,in_lists,new_lists,values_cbs_quantities,positions):
+	'''Remember the newly calculated quantities, store all quantities of in_lists and finish the calculation'''
+
+	if new_lists:
+		remember_quantities(self,new_lists,values_cbs_quantities,positions)
+
+	if in_lists:
+		values_cbs_quantities,positions = recall_quantities(self,in_lists)
+
+		store_cbs_quantities(self,in_lists,values_cbs_quantities,positions)
+
+	#quantities removed from the input file are reset as in a fresh CBSplot
+	for in_keyword,attribute in Dic_Attributes.items():
+		if in_keyword not in in_lists:
+			setattr(self,attribute,[])
+			setattr(self,'%s_bands'% attribute,None)
+
+	with timed(self,'write_output'):
+		finish_cbs_calculations(self)
+
+	return
+
+def main_cbs_calculations(self):
+	'''Perform complete CBS calculation as specified in cbsmodel input file'''
+
+	new_fit,in_lists = prepare_cbs_calculations(self)
+
+	#perform CBS fit to data and extract parameters (r_beta, etc.)
+	if new_fit:
+		extract_params(self)
+
+	#calculate all quantities not known from previous runs at once and split the output by type
+	new_lists 				= new_quantities(self,in_lists) if in_lists else {}
+	values_cbs_quantities,positions 	= None,None
+
+	if new_lists:
+		if self.backend == 'numpy':
+			with timed(self,'native_quantities'):
+				values_cbs_quantities,positions = calculate_native_quantities(self,new_lists)
+		else:
+			with timed(self,'calculate_cbs_quantities'):
+				output_cbs_quantities,positions = calculate_all_cbs_quantities(self,new_lists)
+			values_cbs_quantities = parse_new_quantities(self,output_cbs_quantities,new_lists)
+
+	complete_cbs_calculations(self,in_lists,new_lists,values_cbs_quantities,positions)
 
+	return
@@ -19,12 +19,29 @@
 
 '''Plotting routine for the program cbsmodel'''
 
-import warnings
-
-import numpy as np
+import asyncio
 
 from .CBS_commands import *
-from .plots import *
+from .session import CBSModelSession
+from .cache import CBSCache
+from .stats import CBSStats,timed
+from .seeds import CBSFitSeeds
+from .montecarlo import propagate_uncertainties,propagate_changed,MC_PERCENTILES
+from .process import check_rlimits
+from .errors import CBSError,CBSStatus
+from .native import require_scipy
+from .scan import scan_chi_square
+from .surrogate import CBSSurrogate,SURROGATE_TOL,build_surrogate
+from .datastore import CBSDataStore
+from .results import CBSResultsStore,shared_store
+from .async_commands import main_cbs_calculations_async
+
+#---------------------------------------------------------------------------------------#
+#		General
+#---------------------------------------------------------------------------------------#
+
+#output formats of plot()
+PLOT_FORMATS = ['pdf','png','svg']
 
 #---------------------------------------------------------------------------------------#
 #		Class
@@ -48,6 +65,50 @@ class CBSplot:
 	verbose: bool
 		Status output is plotted if True. 
 		If set to False a successful run will not produce any output.
+	session: CBSModelSession
+		persistent cbsmodel process used for all calculations.
+		If None, a new cbsmodel process is started for every call.
+	parallel_fit: bool
+		True if the fits for all starting values of r_beta are performed at once.
+		The first successful fit in the order of the starting values is used
+		and the remaining fits are terminated.
+	cache: CBSCache or bool
+		on-disk cache of cbsmodel outputs. Unchanged calculations are not repeated.
+		If True, the cache in the default location is used.
+	backend: string
+		'cbsmodel' to perform all calculations in cbsmodel or
+		'numpy' to use the native implementation of the CBS model (requires scipy).
+		The numpy backend supports the parameters rb, Bbm2 and bmax.
+	stats: CBSStats or bool
+		records wall and CPU time of all stages of run() and plot() and counts the cbsmodel calls.
+		If True, a new CBSStats is created. A CBSStats shared by several objects aggregates their statistics.
+	seeds: CBSFitSeeds
+		converged fit parameters of other nuclei. The fit is started from the parameters
+		of the nearest neighbour in (Z,N) and the starting values of r_beta are ordered 
+		by their distance to it. The result of the fit is added to seeds.
+	mc_samples: int
+		If larger than 0, run() propagates the uncertainties of the fit parameters 
+		to all calculated quantities with this number of samples, see propagate_uncertainties().
+	timeout: float
+		maximum wall-clock time of every cbsmodel call in seconds. cbsmodel is killed 
+		together with its children if it takes longer. Fits which time out count as not converged.
+	rlimits: dict
+		resource limits {'cpu':seconds,'memory':bytes} of every cbsmodel process.
+		The limits of a session are given to the CBSModelSession instead.
+	surrogate: CBSSurrogate or string
+		interpolating surrogate (or its directory) built by build_surrogate() for this nucleus.
+		Quantities are taken from it instead of cbsmodel if their estimated relative error is at most surrogate_tol.
+	surrogate_tol: float
+		maximum estimated relative error of predictions of the surrogate
+	exp_store: CBSDataStore or string
+		data store (or the path of one) the experimental values are read from by Z and N
+		instead of exp_data_file
+	results_store: CBSResultsStore or string
+		columnar store (or its directory) the results of every run() are appended to,
+		unless neither the fit nor the quantities changed since the last run().
+		Objects given the same directory share a single store, which writes the results
+		in chunks of its chunk_size, on close() and at exit.
+		The text summary of write_output is written in addition if requested.
 
 	Note:
 	-----
@@ -56,7 +117,7 @@ class CBSplot:
 	See the included documentation for more information.
 	'''
 
-	def __init__(self,nucleus=None,input_file=None,exp_data_file=None,out_path='',write_output=False,verbose=True):
+	def __init__(self,nucleus=None,input_file=None,exp_data_file=None,out_path='',write_output=False,verbose=True,session=None,parallel_fit=False,cache=None,backend='cbsmodel',stats=None,seeds=None,mc_samples=0,timeout=None,rlimits=None,surrogate=None,surrogate_tol=SURROGATE_TOL,exp_store=None,results_store=None):
 
 		if nucleus == None or len(nucleus) != 3:
 			raise ValueError('no nucleus is given. Must be list [abbreviated name,Z,N], e.g. [`Sm`,62,92] for 154Sm.')
@@ -95,6 +156,82 @@ class CBSplot:
 		else:
 			self.write_output = write_output
 
+		if session is not None and not isinstance(session,CBSModelSession):
+			raise ValueError('session must be a CBSModelSession or None!')
+		else:
+			self.session = session
+
+		if not isinstance(parallel_fit,bool):
+			raise ValueError('parallel_fit must be bool!')
+		else:
+			self.parallel_fit = parallel_fit
+
+		if cache is True:
+			self.cache = CBSCache()
+		elif cache is None or cache is False or isinstance(cache,CBSCache):
+			self.cache = cache or None
+		else:
+			raise ValueError('cache must be a CBSCache or bool!')
+
+		if backend not in ['cbsmodel','numpy']:
+			raise ValueError('backend must be either `cbsmodel` or `numpy`!')
+		elif backend == 'numpy':
+			require_scipy()
+		self.backend = backend
+
+		if stats is True:
+			self.stats = CBSStats()
+		elif stats is None or stats is False or isinstance(stats,CBSStats):
+			self.stats = stats or None
+		else:
+			raise ValueError('stats must be a CBSStats or bool!')
+
+		if seeds is not None and not isinstance(seeds,CBSFitSeeds):
+			raise ValueError('seeds must be a CBSFitSeeds or None!')
+		else:
+			self.seeds = seeds
+
+		if not isinstance(mc_samples,int) or mc_samples < 0 or mc_samples == 1:
+			raise ValueError('mc_samples must be 0 or an integer larger than 1!')
+		else:
+			self.mc_samples = mc_samples
+
+		if timeout is not None and (not isinstance(timeout,(int,float)) or timeout <= 0):
+			raise ValueError('timeout must be a positive number of seconds or None!')
+		else:
+			self.timeout = timeout
+
+		if session is not None and rlimits is not None:
+			raise ValueError('rlimits of a session must be given to the CBSModelSession!')
+		else:
+			self.rlimits = check_rlimits(rlimits)
+
+		if isinstance(surrogate,str):
+			self.surrogate = CBSSurrogate(surrogate)
+		elif surrogate is None or isinstance(surrogate,CBSSurrogate):
+			self.surrogate = surrogate
+		else:
+			raise ValueError('surrogate must be a CBSSurrogate, the path of one or None!')
+
+		if not isinstance(surrogate_tol,(int,float)) or surrogate_tol < 0:
+			raise ValueError('surrogate_tol must be a non-negative number!')
+		else:
+			self.surrogate_tol = surrogate_tol
+
+		if isinstance(exp_store,str):
+			self.exp_store = CBSDataStore(exp_store)
+		elif exp_store is None or isinstance(exp_store,CBSDataStore):
+			self.exp_store = exp_store
+		else:
+			raise ValueError('exp_store must be a CBSDataStore, the path of one or None!')
+
+		if isinstance(results_store,str):
+			self.results_store = shared_store(results_store)
+		elif results_store is None or isinstance(results_store,CBSResultsStore):
+			self.results_store = results_store
+		else:
+			raise ValueError('results_store must be a CBSResultsStore, the path of one or None!')
+
 		#already set exp_data_file which will be checked later on in self.run()
 		self.exp_data_file 	= exp_data_file
 
@@ -103,37 +240,202 @@ class CBSplot:
 		self.cbs_ME2		= []
 		self.cbs_rho2E0		= []
 
+		#percentile bands of the quantities above, see propagate_uncertainties()
+		self.cbs_energies_bands = None
+		self.cbs_BE2_bands 	= None
+		self.cbs_ME2_bands 	= None
+		self.cbs_rho2E0_bands 	= None
+
 		#Check whether CBS calculation has been performed. Substitute with success message at later stage. 
 		self.cbs_fit_success 	= False
 
+		#keys of the last fit and of the fit result of all quantities calculated so far, see run()
+		self._fit_key 		= None
+		self._quantities_key 	= None
+		self._results_key 	= None
+		self._quantities 	= {}
+		self._mc_key 		= None
+		self._mc_bands 		= {}
+
 		self.verbose 		= verbose
 
-	def run(self):
-		'''Run the requested calculations in cbsmodel'''
-		main_cbs_calculations(self)
+	def run(self,raise_errors=True):
+		'''Run the requested calculations in cbsmodel.
+
+		If run() is called again, the fit is only repeated if the fit command, the contents 
+		of the data file, A or Z have changed. Quantities which have been calculated 
+		for the same fit result before are not calculated again.
+
+		Returns a CBSStatus. With raise_errors=False, errors of the calculation (CBSError, e.g. 
+		CBSFitError or CBSTimeoutError) are not raised but returned in the status.
+		'''
+		try:
+			with timed(self,'run'):
+				main_cbs_calculations(self)
 
-	def plot(self):
-		'''Plot experimental values alongside results of the CBS calculation'''
+				if self.mc_samples:
+					propagate_changed(self)
 
-		if not isinstance(self.exp_data_file,str):
-			raise ValueError('exp_data_file must be string pointing to a data file.\n \
+		except CBSError as error:
+			if raise_errors:
+				raise
+			return CBSStatus(False,error)
+
+		return CBSStatus(True)
+
+	async def run_async(self,semaphore=None,raise_errors=True):
+		'''Run the requested calculations in cbsmodel without blocking the event loop.
+
+		Arguments:
+		----------
+		semaphore: asyncio.Semaphore
+			limits the number of cbsmodel processes running at once,
+			e.g. if shared by the calculations of many nuclei.
+		raise_errors: bool
+			as in run(). Returns a CBSStatus.
+		'''
+		try:
+			with timed(self,'run'):
+				await main_cbs_calculations_async(self,semaphore)
+
+				if self.mc_samples:
+					await asyncio.to_thread(propagate_changed,self)
+
+		except CBSError as error:
+			if raise_errors:
+				raise
+			return CBSStatus(False,error)
+
+		return CBSStatus(True)
+
+	def propagate_uncertainties(self,num_samples=1000,percentiles=MC_PERCENTILES,seed=None,max_workers=None):
+		'''Propagate the uncertainties of the fit parameters to all calculated quantities.
+
+		Arguments:
+		----------
+		num_samples: int
+			number of parameter sets drawn from the values and uncertainties of the fit parameters
+		percentiles: tuple
+			percentiles of the calculated quantities stored for every quantity
+		seed: int
+			seed of the random numbers
+		max_workers: int
+			number of chunks of samples evaluated in parallel. Defaults to the number of CPUs.
+
+		The bands are stored in cbs_energies_bands, cbs_BE2_bands, cbs_ME2_bands and cbs_rho2E0_bands
+		with one column per percentile and the rows in the order of cbs_energies etc.
+		'''
+
+		propagate_uncertainties(self,num_samples,percentiles,seed,max_workers)
+
+	def scan(self,grid,out_file,chunk_size=1000,max_workers=None):
+		'''Calculate the reduced chisquare of the CBS fit on a grid of the fit parameters.
+
+		Arguments:
+		----------
+		grid: dict
+			values of every fit parameter (as named in the fit command), e.g.
+			{'rb':np.linspace(0,0.9,100),'Bbm2':...,'bmax':...}
+		out_file: string
+			.npy file the reduced chisquare is written to (memory-mapped).
+			If the file exists, only missing points are calculated.
+		chunk_size: int
+			number of grid points evaluated in a single call
+		max_workers: int
+			number of chunks evaluated in parallel. Defaults to the number of CPUs.
+
+		Returns the reduced chisquare as array of shape (len(grid[param]) for all fit parameters).
+		'''
+
+		#parameters and data of the fit
+		read_input(self)
+
+		return scan_chi_square(self,grid,out_file,chunk_size=chunk_size,max_workers=max_workers)
+
+	def build_surrogate(self,path,grid,in_lists=None,chunk_size=1000,max_workers=None):
+		'''Build an interpolating surrogate of the CBS predictions on a grid of the fit parameters.
+
+		Arguments:
+		----------
+		path: string
+			directory the surrogate is stored in. If it exists, only missing points are calculated.
+		grid: dict
+			values of every fit parameter (at least 3 each), e.g.
+			{'rb':np.linspace(0,0.9,46),'Bbm2':...,'bmax':...}
+		in_lists: dict
+			quantities {keyword:list}, e.g. {'energy':[[2,0],[4,0]],'BE2':[[2,0,0,0]]}.
+			Defaults to all quantities of the input file.
+		chunk_size: int
+			number of grid points evaluated in a single call
+		max_workers: int
+			number of chunks evaluated in parallel. Defaults to the number of CPUs.
+
+		Returns the CBSSurrogate, which is used by this object from now on.
+		'''
+
+		#parameters of the fit and quantities of the input file
+		cbs_quantities = read_input(self)
+
+		if in_lists is None:
+			in_lists = quantities_in_lists(*cbs_quantities)
+
+		self.surrogate = build_surrogate(self,path,grid,in_lists,chunk_size=chunk_size,max_workers=max_workers)
+
+		return self.surrogate
+
+	def plot(self,headless=False,out_format='pdf',to_bytes=False,uncertainties=None):
+		'''Plot experimental values alongside results of the CBS calculation.
+
+		Arguments:
+		----------
+		headless: bool
+			True if the figure is rendered without pyplot (Agg/PDF backends) and freed after saving
+		out_format: string
+			format of the plot, one of 'pdf', 'png' and 'svg'
+		to_bytes: bool
+			True if the contents of the plot are returned instead of written to out_path
+		uncertainties: string
+			'symmetric' or 'asymmetric' to label calculated transitions with 
+			the outermost percentiles of propagate_uncertainties()
+
+		Returns the contents of the plot if to_bytes=True and the path of the written file otherwise.
+		'''
+
+		#the experimental values are read from exp_data_file unless a data store is given
+		if self.exp_store is None:
+			if not isinstance(self.exp_data_file,str):
+				raise ValueError('exp_data_file must be string pointing to a data file.\n \
 			 			This file contains all energies and transition strengths\n \
 						to be plotted in the experimental spectrum.')
-		else:
-			splitted_exp_data_file 	= self.exp_data_file.split('/')
-			self.exp_file 		= splitted_exp_data_file[-1]
-
-			if len(splitted_exp_data_file) == 1:
-				self.exp_path 	= ''
 			else:
-				self.exp_path 	= '/'.join(splitted_exp_data_file[:-1])+'/'
+				splitted_exp_data_file 	= self.exp_data_file.split('/')
+				self.exp_file 		= splitted_exp_data_file[-1]
+
+				if len(splitted_exp_data_file) == 1:
+					self.exp_path 	= ''
+				else:
+					self.exp_path 	= '/'.join(splitted_exp_data_file[:-1])+'/'
 
 		if not self.cbs_fit_success:
 			raise ValueError('No CBS calculation available.\n \
 				Either .run() was not invoked before .plot()\n \
 				or the fit of cbsmodel was not successful!')
 
-		plot_comparison(self)
+		if out_format not in PLOT_FORMATS:
+			raise ValueError('out_format must be one of %s!'% ', '.join(PLOT_FORMATS))
+
+		if uncertainties not in [None,'symmetric','asymmetric']:
+			raise ValueError('uncertainties must be None, `symmetric` or `asymmetric`!')
+		elif uncertainties is not None and self.cbs_BE2_bands is None and self.cbs_rho2E0_bands is None:
+			raise ValueError('No uncertainties available. propagate_uncertainties() must be invoked before .plot()!')
+
+		#matplotlib and uncertainties are only imported once the first plot is made
+		from .plots import plot_comparison
+
+		with timed(self,'plot_comparison'):
+			out_plot = plot_comparison(self,headless,out_format,to_bytes,uncertainties)
+
+		return out_plot
 
 
 
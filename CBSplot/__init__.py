@@ -17,6 +17,35 @@
 # You should have received a copy of the GNU General Public License
 # along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
 
+import importlib
+
 from .CBSplot import *
 from .CBS_commands import * 
-from .plots import *
\ No newline at end of file
+from .session import *
+from .errors import *
+from .batch import *
+from .cache import *
+from .stats import *
+from .seeds import *
+from .surrogate import *
+from .chain import *
+from .datastore import *
+from .results import *
+from .async_commands import run_many_async
+
+#the plotting functions need matplotlib and uncertainties, hence plots.py and systematics.py
+#are only imported once one of them is used. Compute-only workers never import them.
+PLOT_NAMES = {'plots':('Level','Transition','load_experiment','plot_comparison','draw_spectrum','draw_arrows',
+			'draw_levels','transition_arrow','ArrowCollection',
+			'value_string','band_values','cbs_values','level_index','transition_geometry',
+			'new_figure','save_figure'),
+		'systematics':('systematics_table','plot_systematics','SYSTEMATICS_QUANTITIES')}
+
+def __getattr__(name):
+
+	for name_module,names in PLOT_NAMES.items():
+		if name == name_module or name in names:
+			module = importlib.import_module('.%s'% name_module,__name__)
+			return module if name == name_module else getattr(module,name)
+
+	raise AttributeError('module %r has no attribute %r'% (__name__,name))
@@ -0,0 +1,241 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+'''asyncio versions of the cbsmodel commands.
+
+All coroutines accept an optional asyncio.Semaphore which limits the number
+of cbsmodel processes running at once. If a coroutine is cancelled,
+the cbsmodel process started by it is killed.
+'''
+
+import asyncio
+
+from .CBS_commands import *
+from .native import extract_params_native,calculate_native_quantities
+from .stats import timed,count
+from .seeds import fit_starts,start_args,remember_fit
+from .parsers import complete_output
+from .process import process_options,apply_rlimits,kill_process_group,check_returncode,start_error
+
+#---------------------------------------------------------------------------------------#
+#		Run cbsmodel
+#---------------------------------------------------------------------------------------#
+
+async def run_cbsmodel_async(self,run_string,data_files=(),semaphore=None):
+	'''Run cbsmodel with the commands in run_string without blocking the event loop'''
+
+	#hashing the data files and reading the cache block
+	if self.cache is not None:
+		key_cache 	= await asyncio.to_thread(self.cache.key,run_string,data_files)
+		output_cbs 	= await asyncio.to_thread(self.cache.get,key_cache)
+
+		if output_cbs is not None:
+			count(self,'cache_hits')
+			return output_cbs
+
+	if semaphore is not None:
+		await semaphore.acquire()
+
+	try:
+		#the session is blocking, hence it is run in a thread
+		if self.session is not None:
+			output_cbs 	= await asyncio.to_thread(self.session.run,run_string,self.timeout)
+			success_cbs 	= complete_output(output_cbs)
+			count(self,'session_calls')
+		else:
+			try:
+				process_cbs = await asyncio.create_subprocess_exec('cbsmodel',*run_string.split(),
+							stdout=asyncio.subprocess.PIPE,stderr=asyncio.subprocess.PIPE,
+							**process_options())
+			except OSError as error:
+				raise start_error(['cbsmodel']+run_string.split(),error)
+
+			apply_rlimits(process_cbs,self.rlimits)
+
+			count(self,'subprocesses')
+
+			try:
+				output_cbs,_ = await asyncio.wait_for(process_cbs.communicate(),self.timeout)
+			except asyncio.TimeoutError:
+				kill_process_group(process_cbs)
+				await process_cbs.wait()
+				count(self,'timeouts')
+				raise CBSTimeoutError('cbsmodel did not finish within %g s while running `%s`'% 
+							(self.timeout,' '.join(run_string.split()[:20])))
+			except asyncio.CancelledError:
+				if process_cbs.returncode is None:
+					kill_process_group(process_cbs)
+					await process_cbs.wait()
+				raise
+
+			check_returncode(process_cbs,run_string)
+
+			success_cbs = process_cbs.returncode == 0
+
+	finally:
+		if semaphore is not None:
+			semaphore.release()
+
+	count(self,'bytes_in',len(run_string))
+	count(self,'bytes_out',len(output_cbs))
+
+	if self.cache is not None and success_cbs:
+		await asyncio.to_thread(self.cache.put,key_cache,output_cbs)
+
+	return output_cbs
+
+#---------------------------------------------------------------------------------------#
+#		Fit CBS to input data
+#---------------------------------------------------------------------------------------#
+
+async def cbs_fit_data_async(self,*args,semaphore=None):
+	'''Fit CBS to data as indicated in cbsmodel input file'''
+
+	with timed(self,'cbs_fit_data'):
+		output_cbs = await run_cbsmodel_async(self,fit_string(self,*args),[self.cbs_path+self.cbs_file],semaphore)
+
+	return output_cbs
+
+async def extract_params_async(self,semaphore=None):
+	'''Extract structural parameters (r_beta etc.) from cbsmodel output'''
+
+	if self.backend == 'numpy':
+		with timed(self,'native_fit'):
+			return await asyncio.to_thread(extract_params_native,self)
+
+	#r_beta from a fixed grid or ordered by the distance to the seed of a neighbour
+	starts = fit_starts(self)
+
+	#Perform all fits at once, the remaining ones are cancelled after the first success
+	if self.parallel_fit:
+		tasks = [asyncio.ensure_future(cbs_fit_data_async(self,*start_args(start),semaphore=semaphore))
+				for start in starts]
+
+	try:
+		#Perform fits to data with different r_beta until solution is found
+		for num_start,start in enumerate(starts):
+
+			r_beta = start['rb']
+
+			#a fit which times out or is terminated is treated as not converged
+			try:
+				if self.parallel_fit:
+					output_cbs = await tasks[num_start]
+				else:
+					output_cbs = await cbs_fit_data_async(self,*start_args(start),semaphore=semaphore)
+			except (CBSTimeoutError,CBSProcessError) as error:
+				if self.verbose:
+					print(error)
+				output_cbs = b''
+
+			if b'Fit successful' in output_cbs:
+				self.cbs_fit_success = True
+				if self.verbose:
+					print('Fit successful!')
+				break
+
+			if self.verbose:
+				print('Fit with starting value r_beta = %.2f not successful. Continuing...'% r_beta)
+
+			count(self,'fit_retries')
+
+		else:
+			raise CBSFitError('Fits in cbsmodel did not converge.')
+
+	finally:
+		if self.parallel_fit:
+			for task in tasks:
+				task.cancel()
+			await asyncio.gather(*tasks,return_exceptions=True)
+
+	with timed(self,'parse_fit_output'):
+		await asyncio.to_thread(read_fit_output,self,output_cbs)
+
+	remember_fit(self)
+
+	return
+
+#---------------------------------------------------------------------------------------#
+#		Calculate quantities of interest
+#---------------------------------------------------------------------------------------#
+
+async def calculate_cbs_quantities_async(self,in_list,in_keyword,semaphore=None):
+	'''Use obtained structural parameters to calculate CBS predictions for quantities specified in input file'''
+
+	run_string  = parameters_string(self)
+	run_string += quantities_string(in_list,in_keyword)
+	run_string += 'exit'
+
+	output_cbs = await run_cbsmodel_async(self,run_string,semaphore=semaphore)
+
+	return output_cbs
+
+async def calculate_all_cbs_quantities_async(self,in_lists,semaphore=None):
+	'''Calculate CBS predictions for quantities of all types in a single cbsmodel call'''
+
+	run_string,positions 	= all_quantities_string(self,in_lists)
+	output_cbs 		= await run_cbsmodel_async(self,run_string,semaphore=semaphore)
+
+	return output_cbs,positions
+
+#---------------------------------------------------------------------------------------#
+#		Main CBS calculations
+#---------------------------------------------------------------------------------------#
+
+async def main_cbs_calculations_async(self,semaphore=None):
+	'''Perform complete CBS calculation as specified in cbsmodel input file.
+
+	Reading and parsing files, hashing and writing results block, hence they run in a thread.
+	'''
+
+	new_fit,in_lists = await asyncio.to_thread(prepare_cbs_calculations,self)
+
+	#perform CBS fit to data and extract parameters (r_beta, etc.)
+	if new_fit:
+		await extract_params_async(self,semaphore)
+
+	#calculate all quantities not known from previous runs at once and split the output by type
+	new_lists 				= await asyncio.to_thread(new_quantities,self,in_lists) if in_lists else {}
+	values_cbs_quantities,positions 	= None,None
+
+	if new_lists:
+		if self.backend == 'numpy':
+			with timed(self,'native_quantities'):
+				values_cbs_quantities,positions = await asyncio.to_thread(calculate_native_quantities,self,new_lists)
+		else:
+			with timed(self,'calculate_cbs_quantities'):
+				output_cbs_quantities,positions = await calculate_all_cbs_quantities_async(self,new_lists,semaphore)
+			values_cbs_quantities = await asyncio.to_thread(parse_new_quantities,self,output_cbs_quantities,new_lists)
+
+	await asyncio.to_thread(complete_cbs_calculations,self,in_lists,new_lists,values_cbs_quantities,positions)
+
+	return
+
+async def run_many_async(list_cbs,max_concurrency=None,raise_errors=True):
+	'''Run the calculations of many CBSplot objects from one event loop.
+
+	At most max_concurrency cbsmodel processes run at once.
+	Returns a list with the CBSStatus of every calculation, which ran until its end, and the exception otherwise.
+	With raise_errors=False, errors of the calculations (CBSError) are returned in their CBSStatus.
+	'''
+
+	semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+	return await asyncio.gather(*[cbs.run_async(semaphore=semaphore,raise_errors=raise_errors) for cbs in list_cbs],
+					return_exceptions=True)
@@ -0,0 +1,308 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from concurrent.futures import ProcessPoolExecutor,as_completed,wait,FIRST_COMPLETED
+
+import numpy as np
+
+from .CBSplot import CBSplot,PLOT_FORMATS
+from .session import CBSModelSession
+from .stats import aggregate_stats
+from .seeds import CBSFitSeeds
+from .results import CBSResultsStore,shared_store
+
+#---------------------------------------------------------------------------------------#
+#		Worker
+#---------------------------------------------------------------------------------------#
+
+#cbsmodel process kept by every worker process if requested
+_worker_session = None
+
+def _init_worker(use_session):
+	'''Start a cbsmodel session in the worker process if requested'''
+
+	global _worker_session
+
+	if use_session:
+		_worker_session = CBSModelSession()
+
+def new_result(job):
+	'''Create the results of a job which has not been run (successfully)'''
+
+	nucleus,input_file,exp_data_file = job
+
+	result = {'nucleus':list(nucleus),
+		'input_file':input_file,
+		'exp_data_file':exp_data_file,
+		'success':False,
+		'error':None,
+		'error_type':None,
+		'name_fit_params':None,
+		'fit_params':None,
+		'red_chi':None,
+		'cbs_energies':None,
+		'cbs_BE2':None,
+		'cbs_ME2':None,
+		'cbs_rho2E0':None,
+		'plot':None,
+		'stats':None}
+
+	return result
+
+def run_job(job,options,plot_format=None,plot_bytes=False):
+	'''Run the CBS calculation for a single job and collect its results.
+
+	If plot_format is given, the level scheme is rendered headless as well.
+	Errors are not raised but stored in the results,
+	so that a failing job does not stop the remaining ones.
+	'''
+
+	result 	= new_result(job)
+	cbs 	= None
+
+	try:
+		cbs = CBSplot(nucleus=list(job[0]),input_file=job[1],exp_data_file=job[2],
+				verbose=False,session=_worker_session,**options)
+		cbs.run()
+
+		result['name_fit_params'] 	= cbs.name_fit_params
+		result['fit_params'] 		= cbs.fit_params
+		result['red_chi'] 		= cbs.red_chi
+
+		for key in ['cbs_energies','cbs_BE2','cbs_ME2','cbs_rho2E0']:
+			result[key] = np.array(getattr(cbs,key))
+
+		if plot_format is not None:
+			result['plot'] = cbs.plot(headless=True,out_format=plot_format,to_bytes=plot_bytes)
+
+		result['success'] = True
+
+	except Exception as error:
+		result['error'] 	= '%s: %s'% (type(error).__name__,error)
+		result['error_type'] 	= type(error).__name__
+
+	#statistics are also collected for failed jobs
+	if cbs is not None and cbs.stats is not None:
+		result['stats'] = cbs.stats.as_dict()
+
+	return result
+
+def plot_job(cbs,out_format,to_bytes):
+	'''Render the level scheme of a single CBSplot object without pyplot'''
+
+	return cbs.plot(headless=True,out_format=out_format,to_bytes=to_bytes)
+
+#---------------------------------------------------------------------------------------#
+#		Rendering
+#---------------------------------------------------------------------------------------#
+
+def plot_many(list_cbs,out_format='pdf',to_bytes=False,max_workers=None):
+	'''Render the level schemes of many CBSplot objects on a pool of worker processes.
+
+	All objects must have been run before. Returns the contents of the plots if to_bytes=True
+	and the paths of the written files otherwise, in the order of list_cbs.
+	'''
+
+	if out_format not in PLOT_FORMATS:
+		raise ValueError('out_format must be one of %s!'% ', '.join(PLOT_FORMATS))
+
+	if len(list_cbs) == 0:
+		return []
+
+	num_workers = min(max_workers or os.cpu_count() or 1,len(list_cbs))
+
+	with ProcessPoolExecutor(max_workers=num_workers) as executor:
+		out_plots = list(executor.map(plot_job,list_cbs,[out_format]*len(list_cbs),[to_bytes]*len(list_cbs)))
+
+	return out_plots
+
+#---------------------------------------------------------------------------------------#
+#		Class
+#---------------------------------------------------------------------------------------#
+
+class CBSplotBatch:
+	'''Class for CBS calculations of many nuclei on a pool of worker processes.
+
+	Arguments:
+	----------
+	jobs: list
+		list of jobs (nucleus,input_file,exp_data_file) with the arguments as in CBSplot,
+		e.g. (['Sm',62,92],'input_154Sm.cbs','plot_data_154Sm.ET')
+	max_workers: int
+		maximum number of worker processes. Defaults to the number of CPUs.
+	session: bool
+		True if every worker process keeps a single cbsmodel process for all its jobs
+	verbose: bool
+		Status output is printed for every finished job if True.
+	plot_format: string
+		If given ('pdf', 'png' or 'svg'), the level scheme of every job is rendered headless in its worker.
+	plot_bytes: bool
+		True if the contents of the plots are stored in the results instead of written to files
+	warm_start: bool or CBSFitSeeds
+		True if every fit is started from the parameters of the nearest nucleus fitted before.
+		The jobs are run in the order of (Z,N) and submitted one by one as workers become free,
+		so that every job uses all results known at that time. A CBSFitSeeds adds known seeds.
+	results_store: CBSResultsStore or string
+		The results of all successful jobs are written to this columnar store (or its directory)
+		as a single chunk at the end of run().
+	options:
+		further keyword arguments passed to every CBSplot object, e.g. parallel_fit or timeout.
+		With stats=True, the statistics of every job are stored in its results.
+
+	Note:
+	-----
+	The results of all jobs are stored in self.results in the order of the jobs.
+	Each result is a dict containing the keys nucleus, input_file, exp_data_file,
+	success, error, error_type (e.g. CBSTimeoutError), name_fit_params, fit_params, red_chi, the arrays cbs_energies,
+	cbs_BE2, cbs_ME2 and cbs_rho2E0, plot (path or contents of the plot, if rendered)
+	and stats (dict of CBSStats, if requested).
+	'''
+
+	def __init__(self,jobs=None,max_workers=None,session=False,verbose=True,plot_format=None,plot_bytes=False,warm_start=False,results_store=None,**options):
+
+		if not isinstance(jobs,(list,tuple)) or len(jobs) == 0:
+			raise ValueError('jobs must be a list of (nucleus,input_file,exp_data_file)!')
+		else:
+			for job in jobs:
+				if len(job) != 3:
+					raise ValueError('job %s must be given as (nucleus,input_file,exp_data_file)!'% str(job))
+			self.jobs = [tuple(job) for job in jobs]
+
+		if max_workers is None:
+			self.max_workers = os.cpu_count() or 1
+		elif not isinstance(max_workers,int) or max_workers < 1:
+			raise ValueError('max_workers must be a positive integer!')
+		else:
+			self.max_workers = max_workers
+
+		if not isinstance(session,bool):
+			raise ValueError('session must be bool!')
+		else:
+			self.session = session
+
+		if plot_format is not None and plot_format not in PLOT_FORMATS:
+			raise ValueError('plot_format must be one of %s!'% ', '.join(PLOT_FORMATS))
+		else:
+			self.plot_format = plot_format
+
+		if not isinstance(plot_bytes,bool):
+			raise ValueError('plot_bytes must be bool!')
+		else:
+			self.plot_bytes = plot_bytes
+
+		if isinstance(warm_start,CBSFitSeeds):
+			self.seeds = warm_start
+		elif warm_start is True:
+			self.seeds = CBSFitSeeds()
+		elif warm_start is False:
+			self.seeds = None
+		else:
+			raise ValueError('warm_start must be bool or CBSFitSeeds!')
+
+		if isinstance(results_store,str):
+			self.results_store = shared_store(results_store)
+		elif results_store is None or isinstance(results_store,CBSResultsStore):
+			self.results_store = results_store
+		else:
+			raise ValueError('results_store must be a CBSResultsStore, the path of one or None!')
+
+		self.verbose 	= verbose
+		self.options 	= options
+
+		self.results 	= [None]*len(self.jobs)
+
+	def run(self):
+		'''Run the CBS calculations of all jobs'''
+
+		num_workers = min(self.max_workers,len(self.jobs))
+
+		with ProcessPoolExecutor(max_workers=num_workers,initializer=_init_worker,initargs=(self.session,)) as executor:
+
+			if self.seeds is None:
+				futures = {executor.submit(run_job,job,self.options,self.plot_format,self.plot_bytes):num_job 
+						for num_job,job in enumerate(self.jobs)}
+
+				for future in as_completed(futures):
+					self._finish_job(futures[future],future)
+
+			else:
+				#sweep along isotopic chains, the seeds are sent along with every job when it is submitted
+				order 	= sorted(range(len(self.jobs)),key=lambda num_job: (self.jobs[num_job][0][1],self.jobs[num_job][0][2]))
+				futures = {}
+
+				while order or futures:
+					while order and len(futures) < num_workers:
+						num_job 	= order.pop(0)
+						options 	= dict(self.options,seeds=self.seeds)
+						future 		= executor.submit(run_job,self.jobs[num_job],options,self.plot_format,self.plot_bytes)
+						futures[future] = num_job
+
+					done,pending = wait(futures,return_when=FIRST_COMPLETED)
+
+					for future in done:
+						result = self._finish_job(futures.pop(future),future)
+						self.seeds.add_results([result])
+
+		#written by the coordinator, hence the workers never hold unwritten results
+		if self.results_store is not None:
+			self.results_store.write(self.results)
+
+		return self.results
+
+	def _finish_job(self,num_job,future):
+		'''Store the result of a finished job'''
+
+		try:
+			result = future.result()
+		except Exception as error:
+			#e.g. a worker process was terminated
+			result 			= new_result(self.jobs[num_job])
+			result['error'] 	= '%s: %s'% (type(error).__name__,error)
+			result['error_type'] 	= type(error).__name__
+
+		self.results[num_job] = result
+
+		if self.verbose:
+			name = '%i%s'% (result['nucleus'][1]+result['nucleus'][2],result['nucleus'][0])
+			if result['success']:
+				print('%s finished.'% name)
+			else:
+				print('%s failed: %s'% (name,result['error']))
+
+		return result
+
+	def failed(self):
+		'''Return the results of all failed jobs'''
+
+		return [result for result in self.results if result is not None and not result['success']]
+
+	def stats(self):
+		'''Aggregate the statistics of all jobs (requires stats=True) into a CBSStats'''
+
+		return aggregate_stats([result['stats'] for result in self.results if result is not None])
+
+	def plot_systematics(self,x='N',quantities=('R42','BE2_ratio','rho2E0','rb'),experiment=None,**kwargs):
+		'''Plot the systematics of all successful jobs, see systematics.plot_systematics()'''
+
+		#imported here since workers of compute-only batches never need matplotlib
+		from .systematics import plot_systematics
+
+		return plot_systematics([result for result in self.results if result is not None],x,quantities,experiment,**kwargs)
@@ -0,0 +1,205 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import shutil
+import uuid
+import os
+
+#---------------------------------------------------------------------------------------#
+#		Cache of cbsmodel outputs
+#---------------------------------------------------------------------------------------#
+
+#number of writes after which the directory is scanned again, since other processes may write to it
+EVICT_INTERVAL 	= 100
+
+class CBSCache:
+	'''Content-addressed on-disk cache of cbsmodel outputs.
+
+	Arguments:
+	----------
+	path: string
+		directory in which the outputs are stored. Defaults to ~/.cache/CBSplot.
+	max_size: int
+		maximum size of all stored outputs in bytes.
+		The least recently used outputs are removed if it is exceeded.
+	executable: string
+		name or path of the cbsmodel executable
+
+	Note:
+	-----
+	The key of every output is built from the cbsmodel commands,
+	the contents of the data files used by them and the cbsmodel executable
+	(path, size and modification time). Outputs are written atomically,
+	hence the same cache can be used by several processes at once.
+	The size of the cache is tracked while writing, the directory is only scanned
+	if max_size is exceeded or after EVICT_INTERVAL writes.
+	'''
+
+	def __init__(self,path=None,max_size=100*1024**2,executable='cbsmodel'):
+
+		if path is None:
+			path = os.path.join(os.environ.get('XDG_CACHE_HOME',os.path.expanduser('~/.cache')),'CBSplot')
+
+		if not isinstance(path,str):
+			raise ValueError('path of the cache must be string!')
+		else:
+			self.path = path
+
+		if not isinstance(max_size,int) or max_size < 0:
+			raise ValueError('max_size must be a non-negative integer!')
+		else:
+			self.max_size = max_size
+
+		self.executable 	= executable
+		self._executable_id 	= None
+
+		#size of the stored outputs (unknown until the first scan) and writes since the last scan
+		self._size 		= None
+		self._writes 		= 0
+
+		os.makedirs(self.path,exist_ok=True)
+
+	def executable_id(self):
+		'''Identify the cbsmodel executable by its path, size and modification time'''
+
+		if self._executable_id is None:
+			path_executable = shutil.which(self.executable)
+
+			if path_executable is None:
+				self._executable_id = 'not found: %s'% self.executable
+			else:
+				path_executable 	= os.path.realpath(path_executable)
+				stat_executable 	= os.stat(path_executable)
+				self._executable_id 	= '%s %i %i'% (path_executable,stat_executable.st_size,stat_executable.st_mtime_ns)
+
+		return self._executable_id
+
+	def key(self,run_string,data_files=()):
+		'''Create the key of the cbsmodel commands in run_string using data_files'''
+
+		hash_key = hashlib.sha256()
+
+		hash_key.update(self.executable_id().encode())
+		hash_key.update(b'\0'+' '.join(run_string.split()).encode())
+
+		for data_file in data_files:
+			hash_key.update(b'\0'+data_file.encode()+b'\0')
+			try:
+				with open(data_file,'rb') as in_file:
+					hash_key.update(hashlib.sha256(in_file.read()).digest())
+			except OSError:
+				hash_key.update(b'missing')
+
+		return hash_key.hexdigest()
+
+	def _file(self,key):
+
+		return os.path.join(self.path,'%s.out'% key)
+
+	def get(self,key):
+		'''Return the stored output for key or None if not available'''
+
+		try:
+			with open(self._file(key),'rb') as in_file:
+				output_cbs = in_file.read()
+			#mark as recently used
+			os.utime(self._file(key))
+		except OSError:
+			return None
+
+		return output_cbs
+
+	def put(self,key,output_cbs):
+		'''Store the output for key and remove old outputs if necessary'''
+
+		tmp_file = os.path.join(self.path,'.%s.tmp'% uuid.uuid4().hex)
+
+		try:
+			with open(tmp_file,'wb') as out_file:
+				out_file.write(output_cbs)
+			os.replace(tmp_file,self._file(key))
+		except OSError:
+			try:
+				os.remove(tmp_file)
+			except OSError:
+				pass
+			return
+
+		self._writes += 1
+
+		if self._size is None or self._writes >= EVICT_INTERVAL:
+			self.evict()
+			return
+
+		#overwritten outputs are counted twice until the next scan
+		self._size += len(output_cbs)
+
+		if self._size > self.max_size:
+			self.evict()
+
+	def _entries(self):
+
+		entries = []
+
+		with os.scandir(self.path) as scan_dir:
+			for entry in scan_dir:
+				if entry.name.endswith('.out'):
+					try:
+						stat_entry = entry.stat()
+					except OSError:
+						continue
+					entries.append((stat_entry.st_mtime,stat_entry.st_size,entry.path))
+
+		return entries
+
+	def size(self):
+		'''Total size of all stored outputs in bytes'''
+
+		return sum([entry[1] for entry in self._entries()])
+
+	def evict(self):
+		'''Remove the least recently used outputs until max_size is not exceeded'''
+
+		entries 	= sorted(self._entries())
+		total_size 	= sum([entry[1] for entry in entries])
+
+		for mtime,size,path in entries:
+			if total_size <= self.max_size:
+				break
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+			total_size -= size
+
+		self._size 	= total_size
+		self._writes 	= 0
+
+	def clear(self):
+		'''Remove all stored outputs'''
+
+		for mtime,size,path in self._entries():
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+
+		self._size 	= 0
+		self._writes 	= 0
@@ -0,0 +1,322 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Simultaneous fit of the CBS model to several nuclei, e.g. an isotopic chain.
+
+Every fit parameter is either fitted independently for every nucleus,
+shared by all nuclei or given by a polynomial in the neutron number,
+
+	p(N) = c_0 + c_1 (N-N_0) + ... + c_d (N-N_0)^d,
+
+with N_0 being the mean neutron number of all nuclei. The combined chisquare of all nuclei
+is minimized. The Jacobian is calculated by finite differences, for which all shifted parameter
+sets of a nucleus are evaluated in a single call and all nuclei are evaluated concurrently.
+'''
+
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .CBS_commands import *
+from .CBSplot import CBSplot
+from .native import fit_data,require_scipy
+from .scan import cbs_quantities_many
+from .seeds import remember_fit
+from .parsers import CBSFitResult
+
+#---------------------------------------------------------------------------------------#
+#		General
+#---------------------------------------------------------------------------------------#
+
+#bounds of the fit parameters, all others are unbounded
+PARAM_BOUNDS 	= {'rb':(0.,0.999),'Bbm2':(1e-6,np.inf),'bmax':(1e-6,np.inf)}
+
+#relative step of the finite differences and its minimum absolute value
+FD_STEP 	= 1e-4
+FD_MIN 		= 1e-3
+
+def fit_member(member):
+	'''Read the input of a member and fit it on its own unless its fit is current.
+
+	Returns True if a fit is available.
+	'''
+
+	read_input(member)
+
+	if fit_is_current(member):
+		return True
+
+	try:
+		extract_params(member)
+	except CBSFitError:
+		return False
+
+	return True
+
+#---------------------------------------------------------------------------------------#
+#		Class
+#---------------------------------------------------------------------------------------#
+
+class CBSChainFit:
+	'''Simultaneous fit of the CBS model to several nuclei.
+
+	Arguments:
+	----------
+	members: list
+		CBSplot objects of all nuclei, whose fit commands must contain the same parameters
+	shared: list
+		parameters with a single value for all nuclei, e.g. ['Bbm2']
+	polynomial: dict
+		parameters given by a polynomial in N and its degree, e.g. {'bmax':1}
+	max_workers: int
+		number of nuclei evaluated concurrently. Defaults to the number of CPUs.
+
+	Note:
+	-----
+	All other parameters are fitted independently for every nucleus.
+	The starting values are taken from fits of the single nuclei.
+	After fit(), every member holds its parameters from the global fit in fit_params and fit_result
+	and the reduced chisquare of the global fit in red_chi, hence its run() calculates
+	the quantities of its input file without fitting again.
+	As in cbsmodel, the uncertainties are not scaled by the reduced chisquare.
+	'''
+
+	def __init__(self,members=None,shared=None,polynomial=None,max_workers=None):
+
+		if not isinstance(members,(list,tuple)) or len(members) < 2:
+			raise ValueError('members must be a list of at least two CBSplot objects!')
+		elif not all([isinstance(member,CBSplot) for member in members]):
+			raise ValueError('members must be CBSplot objects!')
+		else:
+			self.members = list(members)
+
+		if not isinstance(polynomial,(dict,type(None))):
+			raise ValueError('polynomial must be a dict {parameter:degree}!')
+		else:
+			self.degrees = dict(polynomial or {})
+
+		for param in shared or []:
+			if param in self.degrees:
+				raise ValueError('parameter %s cannot be shared and polynomial!'% param)
+			self.degrees[param] = 0
+
+		self.numbers_N 	= np.array([member.A-member.Z for member in self.members],dtype=float)
+		self.N0 	= np.mean(self.numbers_N)
+
+		for param,degree in self.degrees.items():
+			if not isinstance(degree,int) or degree < 0:
+				raise ValueError('degree of parameter %s must be a non-negative integer!'% param)
+			elif degree >= len(set(self.numbers_N)):
+				raise ValueError('degree of parameter %s must be smaller than the number of different N!'% param)
+
+		if max_workers is not None and (not isinstance(max_workers,int) or max_workers < 1):
+			raise ValueError('max_workers must be a positive integer!')
+		else:
+			self.max_workers = max_workers or os.cpu_count() or 1
+
+		self.name_fit_params 	= None
+		self.coefficients 	= None
+		self.params 		= None
+		self.errors 		= None
+		self.red_chi 		= None
+		self.success 		= False
+		self.num_evaluations 	= 0
+
+	def _design(self,param):
+		'''Matrix from the global parameters of param to its values for all members'''
+
+		if param in self.degrees:
+			return np.vander(self.numbers_N-self.N0,self.degrees[param]+1,increasing=True)
+
+		return np.eye(len(self.members))
+
+	def _layout(self):
+		'''Blocks (start,design) of the global parameters of every fit parameter'''
+
+		blocks 	= []
+		start 	= 0
+
+		for param in self.name_fit_params:
+			design = self._design(param)
+			blocks.append((start,design))
+			start += design.shape[1]
+
+		return blocks,start
+
+	def member_values(self,x):
+		'''Values of all fit parameters (shape (members,parameters)) for the global parameters x'''
+
+		values = np.column_stack([design@x[start:start+design.shape[1]] for start,design in self._blocks])
+
+		return np.clip(values,self._lower,self._upper)
+
+	def _evaluate_member(self,num_member,values):
+		'''Normalized residuals of a member and their derivatives by its parameters'''
+
+		member 		= self.members[num_member]
+		data 		= self._data[num_member]
+
+		steps 		= FD_STEP*np.maximum(np.abs(values),FD_MIN)
+		values_sets 	= np.vstack([values,values+np.diag(steps)])
+
+		quantities 	= cbs_quantities_many(member,values_sets,{in_keyword:data[in_keyword][0] for in_keyword in data},exact=True)
+		residuals 	= np.concatenate([(quantities[in_keyword]-data[in_keyword][1])/data[in_keyword][2] for in_keyword in data],axis=1)
+
+		return residuals[0],((residuals[1:]-residuals[0])/steps[:,None]).T
+
+	def _evaluate(self,x):
+		'''Residuals of all members and their Jacobian by the global parameters x'''
+
+		if self._last is not None and np.array_equal(self._last[0],x):
+			return self._last[1:]
+
+		values 		= self.member_values(x)
+		results 	= list(self._executor.map(self._evaluate_member,range(len(self.members)),values))
+
+		residuals 	= np.concatenate([result[0] for result in results])
+		jacobian 	= np.zeros((len(residuals),len(x)))
+		row 		= 0
+
+		#chain rule with the design matrices
+		for num_member,(residuals_member,jacobian_member) in enumerate(results):
+			for num_param,(start,design) in enumerate(self._blocks):
+				jacobian[row:row+len(residuals_member),start:start+design.shape[1]] = np.outer(jacobian_member[:,num_param],design[num_member])
+			row += len(residuals_member)
+
+		self._last 		= (x.copy(),residuals,jacobian)
+		self.num_evaluations 	+= 1
+
+		return residuals,jacobian
+
+	def start_values(self):
+		'''Global parameters from fits of the single nuclei'''
+
+		fitted = list(self._executor.map(fit_member,self.members))
+
+		if not any(fitted):
+			raise CBSFitError('Fits of all single nuclei did not converge.')
+
+		values 		= np.array([member.fit_params[0::2] if success else np.full(len(self.name_fit_params),np.nan)
+					for member,success in zip(self.members,fitted)])
+		values 		= np.where(np.isnan(values),np.nanmean(values,axis=0),values)
+
+		start_values = []
+
+		for num_param,(start,design) in enumerate(self._blocks):
+			start_values.append(np.linalg.lstsq(design,values[:,num_param],rcond=None)[0])
+
+		return np.concatenate(start_values)
+
+	def fit(self):
+		'''Minimize the combined chisquare of all members'''
+
+		require_scipy()
+		from scipy.optimize import least_squares
+
+		for member in self.members:
+			read_input(member)
+
+		self.name_fit_params = list(self.members[0].name_fit_params)
+
+		if any([list(member.name_fit_params) != self.name_fit_params for member in self.members]):
+			raise ValueError('The fit commands of all members must contain the same parameters!')
+
+		for param in self.degrees:
+			if param not in self.name_fit_params:
+				raise ValueError('parameter %s is not fitted!'% param)
+
+		self._blocks,num_global = self._layout()
+		self._data 	= [fit_data(member) for member in self.members]
+		self._lower 	= np.array([PARAM_BOUNDS.get(param,(-np.inf,np.inf))[0] for param in self.name_fit_params])
+		self._upper 	= np.array([PARAM_BOUNDS.get(param,(-np.inf,np.inf))[1] for param in self.name_fit_params])
+		self._last 	= None
+
+		#values of a parameter for every nucleus and the constant terms of polynomials are bounded
+		lower 		= np.full(num_global,-np.inf)
+		upper 		= np.full(num_global,np.inf)
+
+		for num_param,(start,design) in enumerate(self._blocks):
+			width 				= 1 if self.name_fit_params[num_param] in self.degrees else design.shape[1]
+			lower[start:start+width] 	= self._lower[num_param]
+			upper[start:start+width] 	= self._upper[num_param]
+
+		with ThreadPoolExecutor(max_workers=self.max_workers) as self._executor:
+			start_values 	= np.clip(self.start_values(),np.nextafter(lower,np.inf),np.nextafter(upper,-np.inf))
+
+			result 		= least_squares(lambda x: self._evaluate(x)[0],start_values,
+							jac=lambda x: self._evaluate(x)[1],bounds=(lower,upper))
+
+		self._executor = None
+
+		num_data 	= len(result.fun)
+		num_dof 	= num_data-num_global
+
+		self.success 	= bool(result.success and np.all(np.isfinite(result.fun)))
+		self.red_chi 	= np.sum(result.fun**2)/num_dof if num_dof > 0 else np.nan
+
+		if not self.success:
+			raise CBSFitError('Global fit did not converge: %s'% result.message)
+
+		#covariance not scaled by the reduced chisquare as in cbsmodel, propagated to the values of every member
+		try:
+			cov = np.linalg.inv(result.jac.T@result.jac)
+		except np.linalg.LinAlgError:
+			cov = np.full((num_global,num_global),np.nan)
+
+		self.coefficients 	= {param:result.x[start:start+design.shape[1]] for param,(start,design) in zip(self.name_fit_params,self._blocks)}
+		self.params 		= self.member_values(result.x)
+		self.errors 		= np.zeros_like(self.params)
+
+		for num_member,member in enumerate(self.members):
+			derivatives = np.zeros((len(self.name_fit_params),num_global))
+			for num_param,(start,design) in enumerate(self._blocks):
+				derivatives[num_param,start:start+design.shape[1]] = design[num_member]
+
+			self.errors[num_member] = np.sqrt(np.abs(np.diag(derivatives@cov@derivatives.T)))
+
+			#the results of the fits of the single nuclei are replaced
+			member.fit_result 		= CBSFitResult(True,self.red_chi,self.name_fit_params,
+								self.params[num_member],self.errors[num_member])
+			member.fit_params 		= member.fit_result.fit_params()
+			member.red_chi 			= self.red_chi
+			member.cbs_fit_success 		= True
+			member._fit_key 		= fit_stage_key(member)
+
+			remember_fit(member)
+
+		return
+
+	def run(self,raise_errors=True):
+		'''Perform the global fit and calculate the quantities of all members.
+
+		Returns the CBSStatus of every member. With raise_errors=False, errors are
+		returned in the statuses instead of being raised.
+		'''
+
+		try:
+			self.fit()
+		except CBSError as error:
+			if raise_errors:
+				raise
+			return [CBSStatus(False,error) for member in self.members]
+
+		with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+			return list(executor.map(lambda member: member.run(raise_errors=raise_errors),self.members))
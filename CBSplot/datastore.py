@@ -0,0 +1,204 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import sqlite3
+import os
+
+import numpy as np
+
+from .parsers import parse_data_file,sidecar_key,DTYPE_DATA_LEVEL,DTYPE_DATA_TRANSITION
+
+#---------------------------------------------------------------------------------------#
+#		General
+#---------------------------------------------------------------------------------------#
+
+SCHEMA_STORE = '''
+CREATE TABLE IF NOT EXISTS files (
+	Z 		INTEGER NOT NULL,
+	N 		INTEGER NOT NULL,
+	path 		TEXT NOT NULL,
+	key 		TEXT NOT NULL,
+	PRIMARY KEY (Z,N));
+CREATE TABLE IF NOT EXISTS levels (
+	Z 		INTEGER NOT NULL,
+	N 		INTEGER NOT NULL,
+	L 		INTEGER NOT NULL,
+	s 		INTEGER NOT NULL,
+	value 		REAL NOT NULL,
+	uncertainty 	REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS transitions (
+	Z 		INTEGER NOT NULL,
+	N 		INTEGER NOT NULL,
+	keyword 	TEXT NOT NULL,
+	L1 		INTEGER NOT NULL,
+	s1 		INTEGER NOT NULL,
+	L2 		INTEGER NOT NULL,
+	s2 		INTEGER NOT NULL,
+	value 		REAL NOT NULL,
+	uncertainty 	REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS levels_state ON levels (Z,N,L,s);
+CREATE INDEX IF NOT EXISTS transitions_initial ON transitions (Z,N,L1,s1,L2,s2);
+CREATE INDEX IF NOT EXISTS transitions_final ON transitions (Z,N,L2,s2);
+'''
+
+#---------------------------------------------------------------------------------------#
+#		Data store
+#---------------------------------------------------------------------------------------#
+
+class CBSDataStore:
+	'''Store of experimental levels and transitions of many nuclei in a SQLite file.
+
+	Arguments:
+	----------
+	path: string
+		path of the SQLite file. It is created if it does not exist.
+
+	Note:
+	-----
+	Data files in cbsmodel syntax (E and T records) are imported by import_files().
+	Levels are indexed by (Z,N,L,s) and transitions by (Z,N,L1,s1,L2,s2) and (Z,N,L2,s2),
+	hence the data of a nucleus is found without reading other data.
+	Files which have not changed since their last import (path, modification time and size)
+	are not imported again.
+	'''
+
+	def __init__(self,path):
+
+		if not isinstance(path,str):
+			raise ValueError('path of the data store must be string!')
+		else:
+			self.path = path
+
+		self._local = threading.local()
+
+		connection = self._connection()
+		connection.executescript(SCHEMA_STORE)
+		connection.commit()
+
+	def __getstate__(self):
+		#connections cannot be pickled, the file is opened again
+		return {'path':self.path}
+
+	def __setstate__(self,state):
+		self.__init__(state['path'])
+
+	def _connection(self):
+		'''Connection of the current thread and process'''
+
+		if getattr(self._local,'pid',None) != os.getpid():
+			self._local.connection 	= sqlite3.connect(self.path,timeout=60)
+			self._local.pid 	= os.getpid()
+
+		return self._local.connection
+
+	def import_files(self,entries,force=False):
+		'''Import the data files of many nuclei given as list of (Z,N,data_file).
+
+		The data of a nucleus replaces all data imported for it before.
+		Unless force=True, unchanged files are skipped. Returns the number of imported files.
+		'''
+
+		connection 	= self._connection()
+		num_imported 	= 0
+
+		with connection:
+			for Z,N,data_file in entries:
+				key = sidecar_key(data_file)
+
+				if not force:
+					row = connection.execute('SELECT key FROM files WHERE Z=? AND N=?',(Z,N)).fetchone()
+					if row is not None and row[0] == key:
+						continue
+
+				data = parse_data_file(data_file)
+
+				connection.execute('DELETE FROM levels WHERE Z=? AND N=?',(Z,N))
+				connection.execute('DELETE FROM transitions WHERE Z=? AND N=?',(Z,N))
+
+				connection.executemany('INSERT INTO levels VALUES (?,?,?,?,?,?)',
+							[(Z,N)+tuple(level.tolist()) for level in data['energy']])
+
+				for in_keyword in ['BE2','rho2E0']:
+					connection.executemany('INSERT INTO transitions VALUES (?,?,?,?,?,?,?,?,?)',
+							[(Z,N,in_keyword)+tuple(transition.tolist()) for transition in data[in_keyword]])
+
+				connection.execute('INSERT OR REPLACE INTO files VALUES (?,?,?,?)',(Z,N,os.path.realpath(data_file),key))
+
+				num_imported += 1
+
+		return num_imported
+
+	def import_file(self,Z,N,data_file,force=False):
+		'''Import the data file of nucleus (Z,N). Returns True if it has been imported.'''
+
+		return self.import_files([(Z,N,data_file)],force=force) > 0
+
+	def nuclei(self):
+		'''All nuclei (Z,N) in the store'''
+
+		return [tuple(row) for row in self._connection().execute('SELECT Z,N FROM files ORDER BY Z,N')]
+
+	def __contains__(self,nucleus):
+
+		return self._connection().execute('SELECT 1 FROM files WHERE Z=? AND N=?',tuple(nucleus)).fetchone() is not None
+
+	def levels(self,Z,N,L=None,s=None):
+		'''Levels of nucleus (Z,N) with the fields (L,s,value,uncertainty), optionally only those with L and s'''
+
+		query 		= 'SELECT L,s,value,uncertainty FROM levels WHERE Z=? AND N=?'
+		arguments 	= [Z,N]
+
+		for name,value in [('L',L),('s',s)]:
+			if value is not None:
+				query 		+= ' AND %s=?'% name
+				arguments.append(value)
+
+		return np.array(self._connection().execute(query+' ORDER BY rowid',arguments).fetchall(),dtype=DTYPE_DATA_LEVEL)
+
+	def transitions(self,Z,N,in_keyword='BE2',L=None,s=None):
+		'''Transitions of type in_keyword (BE2 or rho2E0) of nucleus (Z,N) 
+		with the fields (L1,s1,L2,s2,value,uncertainty), optionally only those from or to the state (L,s)
+		'''
+
+		query 		= 'SELECT L1,s1,L2,s2,value,uncertainty FROM transitions WHERE Z=? AND N=? AND keyword=?'
+		arguments 	= [Z,N,in_keyword]
+
+		if L is not None and s is not None:
+			query 		+= ' AND ((L1=? AND s1=?) OR (L2=? AND s2=?))'
+			arguments 	+= [L,s,L,s]
+
+		return np.array(self._connection().execute(query+' ORDER BY rowid',arguments).fetchall(),dtype=DTYPE_DATA_TRANSITION)
+
+	def read(self,Z,N):
+		'''Levels and transitions of nucleus (Z,N) as returned by read_data_file'''
+
+		if (Z,N) not in self:
+			raise ValueError('No data of the nucleus Z = %i, N = %i in %s!'% (Z,N,self.path))
+
+		return self.levels(Z,N),self.transitions(Z,N,'BE2'),self.transitions(Z,N,'rho2E0')
+
+	def remove(self,Z,N):
+		'''Remove all data of nucleus (Z,N)'''
+
+		connection = self._connection()
+
+		with connection:
+			for table in ['files','levels','transitions']:
+				connection.execute('DELETE FROM %s WHERE Z=? AND N=?'% table,(Z,N))
@@ -0,0 +1,458 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Distribution of CBS calculations over several hosts by a job queue in a SQLite file.
+
+The coordinator submits the jobs to the queue and waits for their results,
+the workers (on any host which can access the file, e.g. over a shared filesystem)
+claim one job after another, run it and store its results in the queue.
+
+Usage:
+------
+python -m CBSplot.distributed QUEUE_FILE [--session] [--worker-id ID] [--timeout SECONDS]
+
+starts a worker which runs jobs until the queue is empty.
+'''
+
+import argparse
+import threading
+import sqlite3
+import pickle
+import socket
+import json
+import time
+import uuid
+import os
+
+from multiprocessing import Process
+
+from .batch import new_result,run_job
+from .results import shared_store
+from . import batch
+
+#---------------------------------------------------------------------------------------#
+#		General
+#---------------------------------------------------------------------------------------#
+
+#errors after which a job is tried again, other errors (e.g. CBSFitError) are permanent
+RETRY_ERRORS = ('CBSTimeoutError','CBSProcessError','OSError','MemoryError')
+
+JOB_STATES = ('pending','running','done','failed')
+
+SCHEMA_QUEUE = '''
+CREATE TABLE IF NOT EXISTS jobs (
+	id 			INTEGER PRIMARY KEY,
+	nucleus 		TEXT NOT NULL,
+	input_file 		TEXT NOT NULL,
+	exp_data_file 		TEXT NOT NULL,
+	options 		BLOB,
+	state 			TEXT NOT NULL DEFAULT 'pending',
+	attempts 		INTEGER NOT NULL DEFAULT 0,
+	max_attempts 		INTEGER NOT NULL,
+	heartbeat_timeout 	REAL NOT NULL,
+	worker 			TEXT,
+	heartbeat 		REAL,
+	result 			BLOB,
+	error 			TEXT,
+	UNIQUE (nucleus,input_file,exp_data_file));
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state,id);
+'''
+
+def job_key(job):
+	'''Columns (nucleus,input_file,exp_data_file) of a job, a missing exp_data_file is stored as empty string'''
+
+	return json.dumps(list(job[0])),job[1],job[2] or ''
+
+def job_of(nucleus,input_file,exp_data_file):
+	'''Job (nucleus,input_file,exp_data_file) of the columns of a row'''
+
+	return json.loads(nucleus),input_file,exp_data_file or None
+
+def new_worker_id():
+	'''Identify a worker by its host, process and a random suffix'''
+
+	return '%s:%i:%s'% (socket.gethostname(),os.getpid(),uuid.uuid4().hex[:8])
+
+#---------------------------------------------------------------------------------------#
+#		Queue
+#---------------------------------------------------------------------------------------#
+
+class CBSJobQueue:
+	'''Queue of CBS jobs stored in a SQLite file shared by the coordinator and all workers.
+
+	Arguments:
+	----------
+	path: string
+		path of the SQLite file. It is created if it does not exist.
+
+	Note:
+	-----
+	All states are kept in the file, hence a restarted coordinator continues where it stopped:
+	jobs submitted again are not duplicated and finished results are kept.
+	A running job whose worker has not sent a heartbeat within heartbeat_timeout
+	is returned to the queue, as are jobs which failed with one of RETRY_ERRORS,
+	until max_attempts is reached. The clocks of all hosts must be roughly synchronised.
+	'''
+
+	def __init__(self,path):
+
+		if not isinstance(path,str):
+			raise ValueError('path of the queue must be string!')
+		else:
+			self.path = path
+
+		with self._connect() as connection:
+			connection.executescript(SCHEMA_QUEUE)
+
+	def _connect(self):
+		'''Open a new connection, every thread and process uses its own ones'''
+
+		connection = sqlite3.connect(self.path,timeout=60,isolation_level=None)
+
+		return _Transaction(connection)
+
+	def submit(self,jobs,options=None,max_attempts=3,heartbeat_timeout=60.):
+		'''Add jobs (nucleus,input_file,exp_data_file) with the CBSplot arguments in options.
+
+		Jobs which are already in the queue are not added again.
+		Returns the ids of all jobs in the order of jobs.
+		'''
+
+		if not isinstance(max_attempts,int) or max_attempts < 1:
+			raise ValueError('max_attempts must be a positive integer!')
+
+		if not isinstance(heartbeat_timeout,(int,float)) or heartbeat_timeout <= 0:
+			raise ValueError('heartbeat_timeout must be a positive number!')
+
+		blob_options 	= pickle.dumps(options or {})
+		ids_jobs 	= []
+
+		with self._connect() as connection:
+			connection.execute('BEGIN IMMEDIATE')
+
+			for job in jobs:
+				if len(job) != 3:
+					raise ValueError('job %s must be given as (nucleus,input_file,exp_data_file)!'% str(job))
+
+				key_job = job_key(job)
+
+				connection.execute('INSERT OR IGNORE INTO jobs (nucleus,input_file,exp_data_file,options,max_attempts,heartbeat_timeout) '
+							'VALUES (?,?,?,?,?,?)',key_job+(blob_options,max_attempts,heartbeat_timeout))
+				ids_jobs.append(connection.execute('SELECT id FROM jobs WHERE nucleus=? AND input_file=? AND exp_data_file=?',
+							key_job).fetchone()[0])
+
+		return ids_jobs
+
+	def requeue_expired(self,connection=None):
+		'''Return running jobs without recent heartbeat to the queue or mark them as failed'''
+
+		if connection is None:
+			with self._connect() as connection:
+				connection.execute('BEGIN IMMEDIATE')
+				return self.requeue_expired(connection)
+
+		now 	= time.time()
+		expired = connection.execute("SELECT id,attempts,max_attempts,worker FROM jobs "
+						"WHERE state='running' AND heartbeat < ?-heartbeat_timeout",(now,)).fetchall()
+
+		for id_job,attempts,max_attempts,worker in expired:
+			state = 'pending' if attempts < max_attempts else 'failed'
+			connection.execute("UPDATE jobs SET state=?,worker=NULL,error=? WHERE id=?",
+						(state,'worker %s stopped sending heartbeats'% worker,id_job))
+
+		return len(expired)
+
+	def claim(self,worker_id):
+		'''Claim the next pending job for worker_id.
+
+		Returns (id,job,options) or None if no job is pending.
+		'''
+
+		with self._connect() as connection:
+			connection.execute('BEGIN IMMEDIATE')
+
+			self.requeue_expired(connection)
+
+			row = connection.execute("SELECT id,nucleus,input_file,exp_data_file,options FROM jobs "
+						"WHERE state='pending' ORDER BY id LIMIT 1").fetchone()
+
+			if row is None:
+				return None
+
+			connection.execute("UPDATE jobs SET state='running',attempts=attempts+1,worker=?,heartbeat=? WHERE id=?",
+						(worker_id,time.time(),row[0]))
+
+		return row[0],job_of(*row[1:4]),pickle.loads(row[4])
+
+	def heartbeat(self,id_job,worker_id):
+		'''Mark job id_job as alive. Returns False if the job is not claimed by worker_id anymore.'''
+
+		with self._connect() as connection:
+			cursor = connection.execute("UPDATE jobs SET heartbeat=? WHERE id=? AND state='running' AND worker=?",
+							(time.time(),id_job,worker_id))
+
+		return cursor.rowcount > 0
+
+	def complete(self,id_job,worker_id,result):
+		'''Store the result of job id_job (as returned by run_job).
+
+		Failed jobs are returned to the queue if their error is in RETRY_ERRORS and attempts remain.
+		Results of workers whose job has been given to another worker are discarded.
+		'''
+
+		if result['success']:
+			state = 'done'
+		else:
+			state = 'failed'
+
+		with self._connect() as connection:
+			connection.execute('BEGIN IMMEDIATE')
+
+			row = connection.execute("SELECT attempts,max_attempts FROM jobs WHERE id=? AND state='running' AND worker=?",
+							(id_job,worker_id)).fetchone()
+
+			if row is None:
+				return False
+
+			if state == 'failed' and result['error_type'] in RETRY_ERRORS and row[0] < row[1]:
+				state = 'pending'
+
+			connection.execute("UPDATE jobs SET state=?,worker=NULL,result=?,error=? WHERE id=?",
+						(state,pickle.dumps(result),result['error'],id_job))
+
+		return True
+
+	def counts(self):
+		'''Number of jobs in every state'''
+
+		with self._connect() as connection:
+			rows = connection.execute('SELECT state,COUNT(*) FROM jobs GROUP BY state').fetchall()
+
+		counts_states = dict.fromkeys(JOB_STATES,0)
+		counts_states.update(dict(rows))
+
+		return counts_states
+
+	def running_heartbeat_timeout(self):
+		'''Largest heartbeat_timeout of all running jobs (0 if none is running)'''
+
+		with self._connect() as connection:
+			row = connection.execute("SELECT MAX(heartbeat_timeout) FROM jobs WHERE state='running'").fetchone()
+
+		return row[0] or 0.
+
+	def results(self,ids_jobs=None):
+		'''Results of the jobs ids_jobs (default: all jobs) as dicts of CBSplotBatch.
+
+		Jobs which have not finished yet get an unsuccessful result without error.
+		'''
+
+		with self._connect() as connection:
+			rows = connection.execute('SELECT id,nucleus,input_file,exp_data_file,state,result,error FROM jobs ORDER BY id').fetchall()
+
+		results = {}
+
+		for id_job,nucleus,input_file,exp_data_file,state,blob_result,error in rows:
+			if blob_result is not None:
+				result = pickle.loads(blob_result)
+			else:
+				result = new_result(job_of(nucleus,input_file,exp_data_file))
+
+			#e.g. lost workers are only recorded in the queue
+			if state == 'failed' and result['error'] is None:
+				result['error'] = error
+
+			results[id_job] = result
+
+		if ids_jobs is None:
+			return list(results.values())
+
+		return [results[id_job] for id_job in ids_jobs]
+
+	def wait(self,ids_jobs=None,poll_interval=1.,timeout=None,verbose=False):
+		'''Wait until no job is pending or running anymore and return the results as in results().
+
+		Raises TimeoutError if the jobs have not finished within timeout seconds.
+		'''
+
+		time_start 	= time.monotonic()
+		last_counts 	= None
+
+		while True:
+			self.requeue_expired()
+
+			counts_states = self.counts()
+
+			if verbose and counts_states != last_counts:
+				print(', '.join(['%i %s'% (counts_states[state],state) for state in JOB_STATES]))
+				last_counts = counts_states
+
+			if counts_states['pending'] == 0 and counts_states['running'] == 0:
+				return self.results(ids_jobs)
+
+			if timeout is not None and time.monotonic()-time_start > timeout:
+				raise TimeoutError('jobs in %s did not finish within %g s'% (self.path,timeout))
+
+			time.sleep(poll_interval)
+
+	def reset_failed(self):
+		'''Return all failed jobs to the queue, e.g. after a problem on a host has been fixed'''
+
+		with self._connect() as connection:
+			cursor = connection.execute("UPDATE jobs SET state='pending',attempts=0,result=NULL,error=NULL WHERE state='failed'")
+
+		return cursor.rowcount
+
+class _Transaction:
+	'''Connection which is committed (or rolled back) and closed at the end of a with block'''
+
+	def __init__(self,connection):
+
+		self.connection = connection
+
+	def __enter__(self):
+
+		return self.connection
+
+	def __exit__(self,exc_type,exc_value,traceback):
+
+		try:
+			if self.connection.in_transaction:
+				self.connection.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+		finally:
+			self.connection.close()
+
+#---------------------------------------------------------------------------------------#
+#		Worker
+#---------------------------------------------------------------------------------------#
+
+def send_heartbeats(queue,id_job,worker_id,interval,stop):
+	'''Send heartbeats for job id_job until stop is set'''
+
+	while not stop.wait(interval):
+		try:
+			queue.heartbeat(id_job,worker_id)
+		except sqlite3.Error:
+			#a busy or briefly unavailable queue is retried with the next heartbeat
+			pass
+
+def run_worker(path,worker_id=None,session=False,poll_interval=1.,heartbeat_interval=10.,
+		idle_timeout=None,max_jobs=None,verbose=False,**options):
+	'''Run jobs from the queue in the file path one after another.
+
+	The worker stops once no job is pending or running, or after max_jobs jobs.
+	While nothing is pending but other workers are still running jobs, which are returned to the queue
+	if their worker dies, the worker keeps polling. With idle_timeout, it stops after idle_timeout seconds
+	without a job, but never before the heartbeat_timeout of the running jobs has passed. The options override those submitted with the jobs,
+	e.g. to use a different cache on every host. With the option results_store (a directory),
+	the results of all successful jobs are appended to a CBSResultsStore, which is written
+	in chunks and when the worker stops. Returns the number of jobs run.
+	'''
+
+	queue 		= CBSJobQueue(path)
+	worker_id 	= worker_id or new_worker_id()
+	num_jobs 	= 0
+	time_idle 	= time.monotonic()
+	stores 		= set()
+
+	batch._init_worker(session)
+
+	while max_jobs is None or num_jobs < max_jobs:
+		claimed = queue.claim(worker_id)
+
+		if claimed is None:
+			if queue.counts()['running'] == 0:
+				break
+
+			if idle_timeout is not None and \
+				time.monotonic()-time_idle > max(idle_timeout,queue.running_heartbeat_timeout()):
+				break
+
+			time.sleep(poll_interval)
+			continue
+
+		id_job,job,options_job = claimed
+
+		if verbose:
+			print('%s runs job %i: %s'% (worker_id,id_job,' '.join([str(x) for x in job[0]])))
+
+		stop 		= threading.Event()
+		heartbeats 	= threading.Thread(target=send_heartbeats,args=(queue,id_job,worker_id,heartbeat_interval,stop),daemon=True)
+		heartbeats.start()
+
+		options_job 	= dict(options_job,**options)
+		path_store 	= options_job.pop('results_store',None)
+
+		try:
+			result = run_job(job,options_job)
+		finally:
+			stop.set()
+			heartbeats.join()
+
+		if queue.complete(id_job,worker_id,result) and path_store is not None:
+			stores.add(shared_store(path_store))
+			shared_store(path_store).append(result)
+
+		num_jobs 	+= 1
+		time_idle 	= time.monotonic()
+
+	for store in stores:
+		store.close()
+
+	if batch._worker_session is not None:
+		batch._worker_session.close()
+		batch._worker_session = None
+
+	return num_jobs
+
+def start_local_workers(path,num_workers,**kwargs):
+	'''Start num_workers worker processes on this host, e.g. for tests. Returns the processes.'''
+
+	workers = [Process(target=run_worker,args=(path,),kwargs=kwargs) for num_worker in range(num_workers)]
+
+	for worker in workers:
+		worker.start()
+
+	return workers
+
+#---------------------------------------------------------------------------------------#
+#		Command line
+#---------------------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Run CBS jobs from a queue file.')
+	parser.add_argument('path',help='SQLite file of the queue')
+	parser.add_argument('--worker-id',default=None,help='name of the worker, defaults to host:pid:random')
+	parser.add_argument('--session',action='store_true',help='keep a single cbsmodel process for all jobs')
+	parser.add_argument('--timeout',type=float,default=None,help='timeout of every cbsmodel call in seconds')
+	parser.add_argument('--heartbeat-interval',type=float,default=10.,help='seconds between heartbeats')
+	parser.add_argument('--idle-timeout',type=float,default=None,
+				help='seconds to wait for jobs of other workers (at least their heartbeat timeout), '
+				'by default as long as jobs are running')
+	parser.add_argument('--max-jobs',type=int,default=None,help='stop after this number of jobs')
+	args = parser.parse_args()
+
+	options = {} if args.timeout is None else {'timeout':args.timeout}
+
+	num_jobs = run_worker(args.path,worker_id=args.worker_id,session=args.session,
+			heartbeat_interval=args.heartbeat_interval,idle_timeout=args.idle_timeout,
+			max_jobs=args.max_jobs,verbose=True,**options)
+
+	print('%i jobs finished.'% num_jobs)
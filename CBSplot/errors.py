@@ -0,0 +1,70 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+#---------------------------------------------------------------------------------------#
+#		Exceptions
+#---------------------------------------------------------------------------------------#
+
+class CBSError(Exception):
+	'''Base class of all errors raised by CBSplot during CBS calculations'''
+
+class CBSFitError(CBSError):
+	'''Fits in cbsmodel did not converge for any starting value'''
+
+class CBSOutputError(CBSError):
+	'''Output of cbsmodel does not have the expected format'''
+
+class CBSTimeoutError(CBSError):
+	'''cbsmodel did not finish within the time limit and was killed'''
+
+class CBSProcessError(CBSError):
+	'''cbsmodel could not be started or was terminated, e.g. by a resource limit'''
+
+#---------------------------------------------------------------------------------------#
+#		Status
+#---------------------------------------------------------------------------------------#
+
+class CBSStatus:
+	'''Outcome of a CBS calculation, returned instead of raising its errors.
+
+	Attributes:
+	-----------
+	success: bool
+		True if the calculation was successful
+	error: CBSError
+		the error which stopped the calculation or None
+	error_type: string
+		name of the class of the error, e.g. CBSTimeoutError
+	'''
+
+	def __init__(self,success,error=None):
+
+		self.success 	= success
+		self.error 	= error
+		self.error_type = None if error is None else type(error).__name__
+
+	def __bool__(self):
+		return self.success
+
+	def __repr__(self):
+
+		if self.success:
+			return 'CBSStatus(success=True)'
+
+		return 'CBSStatus(success=False, %s: %s)'% (self.error_type,self.error)
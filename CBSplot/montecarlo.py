@@ -0,0 +1,141 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .CBS_commands import Dic_Attributes,results_stage_key
+from .scan import cbs_quantities_many
+from .stats import timed,count
+
+#---------------------------------------------------------------------------------------#
+#		General
+#---------------------------------------------------------------------------------------#
+
+#number of parameter sets evaluated in a single call
+MC_CHUNK 		= 250
+
+#median and 1 sigma band of a normal distribution
+MC_PERCENTILES 		= (15.87,50.,84.13)
+
+#physical limits of the parameters, samples are clipped to them
+PARAM_LIMITS 		= {'rb':(0.,0.999)}
+DEFAULT_LIMITS 		= (1e-6,np.inf)
+
+#---------------------------------------------------------------------------------------#
+#		Monte-Carlo propagation of uncertainties
+#---------------------------------------------------------------------------------------#
+
+def sample_params(self,num_samples,rng):
+	'''Draw num_samples sets of fit parameters from their values and uncertainties (uncorrelated)'''
+
+	values 		= self.fit_params[0::2]
+	errors 		= self.fit_params[1::2]
+
+	samples 	= values+errors*rng.standard_normal((num_samples,len(values)))
+
+	limits 		= np.array([PARAM_LIMITS.get(param,DEFAULT_LIMITS) for param in self.name_fit_params])
+
+	return np.clip(samples,limits[:,0],limits[:,1])
+
+def calculated_lists(self):
+	'''Quantities of the last run as dict {keyword:list} without their values'''
+
+	in_lists = {}
+
+	for in_keyword,attribute in Dic_Attributes.items():
+		quantities = np.asarray(getattr(self,attribute))
+
+		if len(quantities) > 0:
+			in_lists[in_keyword] = quantities[:,:-1].astype(int)
+
+	return in_lists
+
+def propagate_uncertainties(self,num_samples=1000,percentiles=MC_PERCENTILES,seed=None,max_workers=None):
+	'''Percentile bands of all calculated quantities from fit parameters sampled within their uncertainties.
+
+	All samples are evaluated in chunks of MC_CHUNK parameter sets, each in a single call of cbsmodel
+	(or the numpy backend). The bands are stored in cbs_energies_bands, cbs_BE2_bands etc.
+	with one column per percentile and one row per quantity as in cbs_energies, cbs_BE2 etc.
+	'''
+
+	if not self.cbs_fit_success:
+		raise ValueError('No CBS calculation available. .run() must be invoked first!')
+
+	if not isinstance(num_samples,int) or num_samples < 2:
+		raise ValueError('num_samples must be an integer larger than 1!')
+
+	#bands of an explicit call are never taken for those of run()
+	self._mc_key 	= None
+
+	rng 		= np.random.default_rng(seed)
+	samples 	= sample_params(self,num_samples,rng)
+	in_lists 	= calculated_lists(self)
+
+	values_samples 	= {in_keyword:np.zeros((num_samples,len(in_list))) for in_keyword,in_list in in_lists.items()}
+
+	def run_chunk(start):
+		quantities = cbs_quantities_many(self,samples[start:start+MC_CHUNK],in_lists)
+
+		for in_keyword in in_lists:
+			values_samples[in_keyword][start:start+MC_CHUNK] = quantities[in_keyword]
+
+	with timed(self,'propagate_uncertainties'):
+		if in_lists:
+			with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+				for result in executor.map(run_chunk,range(0,num_samples,MC_CHUNK)):
+					pass
+
+	for in_keyword,attribute in Dic_Attributes.items():
+		if in_keyword in in_lists:
+			bands = np.percentile(values_samples[in_keyword],percentiles,axis=0).T
+		else:
+			bands = np.zeros((0,len(percentiles)))
+
+		setattr(self,'%s_bands'% attribute,bands)
+
+	self.mc_percentiles = tuple(percentiles)
+
+	return
+
+def propagate_changed(self):
+	'''Propagate the uncertainties with mc_samples in run(), unless the fit result and 
+	all calculated quantities are unchanged since the last propagation of run().
+	'''
+
+	key_mc = '%s %i'% (results_stage_key(self),self.mc_samples)
+
+	if self._mc_key == key_mc:
+		#the bands have been reset by storing the reused quantities
+		for attribute,bands in self._mc_bands.items():
+			setattr(self,'%s_bands'% attribute,bands)
+
+		count(self,'propagations_skipped')
+		return
+
+	propagate_uncertainties(self,self.mc_samples)
+
+	self._mc_key 	= key_mc
+	self._mc_bands 	= {attribute:getattr(self,'%s_bands'% attribute) for attribute in Dic_Attributes.values()}
+
+	return
@@ -0,0 +1,454 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Native implementation of the Confined beta-soft rotor model in NumPy.
+
+In the CBS model, the radial part of the Bohr Hamiltonian with gamma frozen at 0
+is solved in an infinite square well between beta_M*r_beta and beta_M.
+With x = beta/beta_M, the wave function of the state (L,s) reads
+
+	xi_{L,s}(x) = N x^(-3/2) [Y_nu(z r_beta) J_nu(z x) - J_nu(z r_beta) Y_nu(z x)]
+
+with nu = sqrt(L(L+1)/3+9/4) and z = z_{L,s} being the (s+1)-th zero of
+J_nu(z r_beta) Y_nu(z) - J_nu(z) Y_nu(z r_beta). Energies are given by
+E(L,s) = (z_{L,s}^2-z_{0,0}^2)/(2 Bbm2) with Bbm2 = B beta_M^2 in hbar^2/keV.
+
+Conventions:
+B(E2) in W.u., ME2 = <f||E2||i> in W.u.^(1/2) and rho2E0 = rho^2(E0)*10^3.
+See N. Pietralla and O.M. Gorbachenko, Phys. Rev. C 70, 011304(R) (2004).
+'''
+
+import numpy as np
+
+#scipy is imported by require_scipy() once the numpy backend is used
+jv = yv = least_squares = None
+
+from .parsers import read_data_file,as_columns,sidecar_path
+from .errors import *
+from .seeds import fit_starts,remember_fit
+
+#---------------------------------------------------------------------------------------#
+#		General
+#---------------------------------------------------------------------------------------#
+
+#parameters known to the native backend and their values if not fitted
+NATIVE_PARAMS 	= {'rb':0.1,'Bbm2':0.05,'bmax':0.3}
+
+#step of the zero search in units of pi/(1-r_beta) and iterations of the refinement
+ROOT_STEP 	= 0.4
+ROOT_ITER 	= 40
+ROOT_TOL 	= 1e-14
+
+#number of Gauss-Legendre nodes of the radial integrals
+NUM_NODES 	= 64
+
+#radius parameter r_0 in fm of the E2 operator, reproduces the B(E2) values of cbsmodel
+R_E2 		= 1.22
+
+#number of parameter sets evaluated at once
+CHUNK 		= 512
+
+def require_scipy():
+	'''Import scipy on first use, raise an ImportError if it is not available'''
+
+	global jv,yv,least_squares
+
+	if jv is None:
+		try:
+			#jv is bound last, since it marks scipy as imported
+			from scipy.optimize import least_squares
+			from scipy.special import yv,jv
+		except ImportError:
+			raise ImportError('The numpy backend of CBSplot requires scipy (pip install scipy).')
+
+def nu(L):
+	'''Order of the Bessel functions for angular momentum L'''
+
+	return np.sqrt(L*(L+1)/3+9/4)
+
+#---------------------------------------------------------------------------------------#
+#		Eigenvalues
+#---------------------------------------------------------------------------------------#
+
+def _cross(order,z,rb):
+	'''Boundary condition J_nu(z r_beta) Y_nu(z) - J_nu(z) Y_nu(z r_beta), up to a positive factor'''
+
+	j_out = jv(order,z)
+
+	with np.errstate(all='ignore'):
+		y_in 	= yv(order,z*rb)
+		out 	= jv(order,z*rb)*yv(order,z)-j_out*y_in
+
+	#for r_beta -> 0 the condition reduces to J_nu(z) = 0
+	return np.where(np.isfinite(y_in),out,j_out)
+
+def eigenvalues(L,rb,num_s):
+	'''Lowest num_s zeros z_{L,s} for all angular momenta L and all r_beta.
+
+	Returns an array of shape (len(rb),len(L),num_s).
+	'''
+
+	require_scipy()
+
+	order 	= nu(np.atleast_1d(L).astype(float))[None,:,None]
+	rb 	= np.atleast_1d(rb).astype(float)[:,None,None]
+
+	if np.any(rb < 0) or np.any(rb >= 1):
+		raise ValueError('r_beta must be in [0,1)!')
+
+	#zeros are separated by about pi/(1-r_beta)
+	u_max 	= num_s+2+np.max(order)/2
+	z 	= np.arange(ROOT_STEP,u_max,ROOT_STEP)[None,None,:]*np.pi/(1-rb)
+	z 	= np.broadcast_to(z,(rb.shape[0],order.shape[1],z.shape[2]))
+
+	sign 	= np.signbit(_cross(order,z,rb))
+	change 	= sign[...,1:] != sign[...,:-1]
+
+	if np.any(np.sum(change,axis=-1) < num_s):
+		raise CBSError('Not all eigenvalues of the CBS model found.')
+
+	#indices of the first num_s sign changes
+	index 	= np.argsort(~change,axis=-1,kind='stable')[...,:num_s]
+
+	z_low 	= np.take_along_axis(z,index,axis=-1)
+	z_high 	= np.take_along_axis(z,index+1,axis=-1)
+	f_low 	= _cross(order,z_low,rb)
+	f_high 	= _cross(order,z_high,rb)
+
+	#Illinois variant of regula falsi for all brackets at once
+	order 	= np.broadcast_to(order,z_low.shape).ravel()
+	rb 	= np.broadcast_to(rb,z_low.shape).ravel()
+	shape 	= z_low.shape
+
+	z_low,z_high,f_low,f_high = [array.ravel().copy() for array in [z_low,z_high,f_low,f_high]]
+
+	side 	= np.zeros(z_low.shape,dtype=int)
+	active 	= np.arange(len(z_low))
+
+	for num_iter in range(ROOT_ITER):
+		z_l,z_h,f_l,f_h = z_low[active],z_high[active],f_low[active],f_high[active]
+
+		with np.errstate(all='ignore'):
+			z_new = (z_l*f_h-z_h*f_l)/(f_h-f_l)
+		z_new 	= np.where(np.isfinite(z_new) & (z_new > z_l) & (z_new < z_h),z_new,0.5*(z_l+z_h))
+		f_new 	= _cross(order[active],z_new,rb[active])
+
+		low 	= np.signbit(f_new) == np.signbit(f_l)
+		s_a 	= side[active]
+
+		z_low[active] 	= np.where(low,z_new,z_l)
+		z_high[active] 	= np.where(low,z_h,z_new)
+		f_high[active] 	= np.where(low & (s_a == 1),0.5*f_h,np.where(low,f_h,f_new))
+		f_low[active] 	= np.where(~low & (s_a == -1),0.5*f_l,np.where(low,f_new,f_l))
+		side[active] 	= np.where(low,1,-1)
+
+		#only brackets which are not converged are refined further
+		active = active[(z_high[active]-z_low[active] > ROOT_TOL*z_high[active]) & (f_new != 0)]
+
+		if len(active) == 0:
+			break
+
+	z_low,z_high,f_low,f_high = [array.reshape(shape) for array in [z_low,z_high,f_low,f_high]]
+
+	return np.where(np.abs(f_low) < np.abs(f_high),z_low,z_high)
+
+#---------------------------------------------------------------------------------------#
+#		Wave functions and matrix elements
+#---------------------------------------------------------------------------------------#
+
+def wave_functions(states,rb,zeros,L_values):
+	'''Normalized radial wave functions of all states on the Gauss-Legendre nodes.
+
+	Returns the wave functions of shape (P,len(states),NUM_NODES) together with 
+	the nodes x and weights w (shape (P,NUM_NODES)) of the integration with measure x^4 dx.
+	The sign is chosen such that the wave functions are positive close to r_beta.
+	'''
+
+	nodes,weights 	= np.polynomial.legendre.leggauss(NUM_NODES)
+
+	x 		= rb[:,None]+(1-rb[:,None])*(nodes[None,:]+1)/2
+	w 		= weights[None,:]*(1-rb[:,None])/2*x**4
+
+	z 		= zeros[:,np.searchsorted(L_values,states[:,0]),states[:,1]][...,None]
+	order 		= nu(states[:,0].astype(float))[None,:,None]
+
+	with np.errstate(all='ignore'):
+		j_in = jv(order,z*rb[:,None,None])
+		y_in = yv(order,z*rb[:,None,None])
+
+	finite 	= np.isfinite(y_in)
+	c_j 	= np.where(finite,y_in,-1.)
+	c_y 	= np.where(finite,-j_in,0.)
+	scale 	= np.maximum(np.abs(c_j),np.abs(c_y))
+
+	z_x 	= z*x[:,None,:]
+	out_psi = x[:,None,:]**-1.5*(c_j/scale*jv(order,z_x)+c_y/scale*yv(order,z_x))
+	out_psi = out_psi/np.sqrt(np.sum(w[:,None,:]*out_psi**2,axis=-1))[...,None]
+
+	return out_psi*np.where(out_psi[...,:1] < 0,-1.,1.),x,w
+
+def radial_integrals(psi_i,psi_f,power,x,w):
+	'''Radial integrals <xi_f|x^power|xi_i> of wave functions as returned by wave_functions'''
+
+	return np.sum(w[:,None,:]*psi_f*x[:,None,:]**power*psi_i,axis=-1)
+
+def clebsch_e2(L_i,L_f):
+	'''Clebsch-Gordan coefficients <L_i 0 2 0|L_f 0>'''
+
+	L 	= L_i.astype(float)
+	out_cg 	= np.zeros(len(L))
+
+	with np.errstate(all='ignore'):
+		out_cg = np.where(L_f == L_i+2,np.sqrt(3*(L+1)*(L+2)/(2*(2*L+1)*(2*L+3))),out_cg)
+		out_cg = np.where((L_f == L_i) & (L_i > 0),-np.sqrt(L*(L+1)/((2*L-1)*(2*L+3))),out_cg)
+		out_cg = np.where(L_f == L_i-2,np.sqrt(3*L*(L-1)/(2*(2*L-1)*(2*L+1))),out_cg)
+
+	return out_cg
+
+#---------------------------------------------------------------------------------------#
+#		Observables
+#---------------------------------------------------------------------------------------#
+
+def _chunk_quantities(A,Z,rb,Bbm2,bmax,in_lists):
+	'''CBS predictions for all quantities in in_lists for one chunk of parameter sets'''
+
+	in_lists 	= {in_keyword:np.asarray(in_list,dtype=int) for in_keyword,in_list in in_lists.items()}
+
+	states 		= [np.array([[0,0]])]
+	states_trans 	= []
+
+	for in_keyword,in_list in in_lists.items():
+		if in_keyword not in ['energy','BE2','ME2','rho2E0']:
+			raise ValueError('keyword %s not known in the numpy backend!'% in_keyword)
+
+		states.append(in_list[:,:2])
+		if in_keyword != 'energy':
+			states_trans += [in_list[:,:2],in_list[:,2:4]]
+
+	states 		= np.unique(np.concatenate(states+states_trans),axis=0)
+	L_values 	= np.unique(states[:,0])
+	zeros 		= eigenvalues(L_values,rb,np.max(states[:,1])+1)
+
+	#wave functions are only needed for states involved in transitions
+	if states_trans:
+		states_trans 	= np.unique(np.concatenate(states_trans),axis=0)
+		psi,x,w 	= wave_functions(states_trans,rb,zeros,L_values)
+
+	def index_states(in_states):
+		return np.nonzero((states_trans[None,:,:] == in_states[:,None,:]).all(axis=2))[1]
+
+	#E2 operator 3 Z R^2/(4 pi) beta in units of W.u.^(1/2)
+	R_0 		= R_E2*A**(1/3)
+	t_E2 		= 3*Z*R_0**2/(4*np.pi)/np.sqrt(0.0594*A**(4/3))
+
+	out_quantities 	= {}
+
+	for in_keyword,in_list in in_lists.items():
+
+		if in_keyword == 'energy':
+			z = zeros[:,np.searchsorted(L_values,in_list[:,0]),in_list[:,1]]
+			out_quantities[in_keyword] = (z**2-zeros[:,:1,0]**2)/(2*Bbm2[:,None])
+			continue
+
+		psi_i = psi[:,index_states(in_list[:,:2])]
+		psi_f = psi[:,index_states(in_list[:,2:4])]
+
+		if in_keyword in ['BE2','ME2']:
+			integral 	= radial_integrals(psi_i,psi_f,1,x,w)
+			me2 		= t_E2*bmax[:,None]*clebsch_e2(in_list[:,0],in_list[:,2])*integral
+			me2 		= np.sqrt(2*in_list[:,0]+1)*me2
+
+			if in_keyword == 'BE2':
+				out_quantities[in_keyword] = me2**2/(2*in_list[:,0]+1)
+			else:
+				out_quantities[in_keyword] = me2
+
+		elif in_keyword == 'rho2E0':
+			integral 	= radial_integrals(psi_i,psi_f,2,x,w)
+			out_quantities[in_keyword] = 10**3*(3*Z/(4*np.pi)*bmax[:,None]**2*integral)**2
+
+	return out_quantities
+
+def native_quantities(A,Z,params,in_lists):
+	'''CBS predictions for many quantities and many parameter sets at once.
+
+	params is a dict {name:value(s)} of the parameters rb, Bbm2 and bmax,
+	each a scalar or an array of P values. in_lists is a dict {keyword:list of quantities}
+	as used for cbsmodel. Returns a dict {keyword:array} of shape (P,len(list)).
+	'''
+
+	require_scipy()
+
+	for param in params:
+		if param not in NATIVE_PARAMS:
+			raise ValueError('parameter %s not known in the numpy backend!'% param)
+
+	values 		= [np.atleast_1d(np.asarray(params.get(param,default),dtype=float))
+				for param,default in NATIVE_PARAMS.items()]
+	rb,Bbm2,bmax 	= np.broadcast_arrays(*values)
+
+	out_quantities 	= {in_keyword:np.zeros((len(rb),len(in_list))) for in_keyword,in_list in in_lists.items()}
+
+	for start in range(0,len(rb),CHUNK):
+		chunk 		= slice(start,start+CHUNK)
+		out_chunk 	= _chunk_quantities(A,Z,rb[chunk],Bbm2[chunk],bmax[chunk],in_lists)
+
+		for in_keyword in out_chunk:
+			out_quantities[in_keyword][chunk] = out_chunk[in_keyword]
+
+	return out_quantities
+
+#---------------------------------------------------------------------------------------#
+#		CBSplot interface
+#---------------------------------------------------------------------------------------#
+
+def fit_data(self):
+	'''Read data of the CBS fit as dict {keyword:(quantities,values,uncertainties)}'''
+
+	fit_energies,fit_BE2,fit_rho2E0 = read_data_file(self.cbs_path+self.cbs_file,sidecar_path(self))
+
+	out_data = {}
+
+	for in_keyword,data in [('energy',fit_energies),('BE2',fit_BE2),('rho2E0',fit_rho2E0)]:
+		if len(data) > 0:
+			out_data[in_keyword] = (as_columns(data[list(data.dtype.names[:-2])]),data['value'],data['uncertainty'])
+
+	return out_data
+
+def native_residuals(self,values,data):
+	'''Normalized residuals of the data for all parameter sets in values (shape (P,len(name_fit_params)))'''
+
+	values 		= np.atleast_2d(values)
+	params 		= {param:values[:,num_param] for num_param,param in enumerate(self.name_fit_params)}
+
+	quantities 	= native_quantities(self.A,self.Z,params,{in_keyword:data[in_keyword][0] for in_keyword in data})
+
+	return np.concatenate([(quantities[in_keyword]-data[in_keyword][1])/data[in_keyword][2]
+				for in_keyword in data],axis=1)
+
+def native_fit(self,start_values):
+	'''Fit the CBS model to the data in the numpy backend'''
+
+	data 		= fit_data(self)
+	num_data 	= sum([len(data[in_keyword][1]) for in_keyword in data])
+
+	lower 		= [0. if param == 'rb' else 1e-6 for param in self.name_fit_params]
+	upper 		= [0.999 if param == 'rb' else np.inf for param in self.name_fit_params]
+
+	result 		= least_squares(lambda values: native_residuals(self,values,data)[0],
+				start_values,bounds=(lower,upper))
+
+	success 	= result.success and np.all(np.isfinite(result.fun))
+
+	num_dof 	= num_data-len(start_values)
+	red_chi 	= np.sum(result.fun**2)/num_dof if num_dof > 0 else np.nan
+
+	#uncertainties are not scaled by the reduced chisquare, as in cbsmodel
+	try:
+		cov = np.linalg.inv(result.jac.T@result.jac)
+	except np.linalg.LinAlgError:
+		cov = np.full((len(start_values),len(start_values)),np.nan)
+
+	return success,result.x,np.sqrt(np.abs(np.diag(cov))),red_chi
+
+def extract_params_native(self):
+	'''Extract structural parameters (r_beta etc.) by a fit in the numpy backend'''
+
+	require_scipy()
+
+	for param in self.name_fit_params:
+		if param not in NATIVE_PARAMS:
+			raise ValueError('parameter %s cannot be fitted in the numpy backend!'% param)
+
+	#Perform fits to data with different r_beta until solution is found
+	for start in fit_starts(self):
+
+		r_beta 		= start['rb']
+		start_values 	= [start.get(param,NATIVE_PARAMS[param]) for param in self.name_fit_params]
+
+		success,values,errors,red_chi = native_fit(self,start_values)
+
+		if success:
+			self.cbs_fit_success = True
+			if self.verbose:
+				print('Fit successful!')
+			break
+
+		if self.verbose:
+			print('Fit with starting value r_beta = %.2f not successful. Continuing...'% r_beta)
+
+	else:
+		raise CBSFitError('Fits in the numpy backend did not converge.')
+
+	self.red_chi 		= red_chi
+	self.fit_params 	= np.zeros((2*len(self.name_fit_params)))
+	self.fit_params[0::2] 	= values
+	self.fit_params[1::2] 	= errors
+
+	remember_fit(self)
+
+	return
+
+def calculate_native_quantities(self,in_lists):
+	'''Calculate CBS predictions for quantities of all types in the numpy backend.
+
+	Returns the values of all quantities and their positions (start,stop) as
+	calculate_all_cbs_quantities does for the cbsmodel output.
+	'''
+
+	params 		= {param:self.fit_params[2*num_param] for num_param,param in enumerate(self.name_fit_params)}
+	quantities 	= native_quantities(self.A,self.Z,params,in_lists)
+
+	positions 	= {}
+	num_values 	= 0
+
+	for in_keyword,in_list in in_lists.items():
+		positions[in_keyword] 	= (num_values,num_values+len(in_list))
+		num_values 		+= len(in_list)
+
+	return np.concatenate([quantities[in_keyword][0] for in_keyword in in_lists]),positions
+
+def compare_backends(self):
+	'''Compare the numpy backend to cbsmodel for the fitted parameters of self.
+
+	Returns a dict {keyword:maximum relative deviation} for all quantities in the input file.
+	'''
+
+	from .CBS_commands import read_input,calculate_all_cbs_quantities,extract_cbs_quantities
+
+	if not self.cbs_fit_success:
+		raise ValueError('No CBS calculation available. Invoke .run() first!')
+
+	in_lists = {in_keyword:in_list for in_keyword,in_list in zip(['energy','BE2','ME2','rho2E0'],read_input(self))
+			if len(in_list) > 0}
+
+	output_cbs,positions 	= calculate_all_cbs_quantities(self,in_lists)
+	values_cbs 		= extract_cbs_quantities(self,output_cbs,
+				sum([len(in_list) for in_list in in_lists.values()]))
+	values_native,_ 	= calculate_native_quantities(self,in_lists)
+
+	out_deviations = {}
+
+	for in_keyword,(start,stop) in positions.items():
+		with np.errstate(all='ignore'):
+			deviation = np.abs(values_native[start:stop]-values_cbs[start:stop])/np.abs(values_cbs[start:stop])
+		out_deviations[in_keyword] = np.nanmax(np.where(values_cbs[start:stop] == 0,np.nan,deviation)) \
+						if np.any(values_cbs[start:stop] != 0) else 0.
+
+	return out_deviations
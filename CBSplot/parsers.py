@@ -0,0 +1,387 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import warnings
+import hashlib
+import uuid
+import re
+import os
+
+import numpy as np
+
+from numpy.lib.recfunctions import structured_to_unstructured
+
+from .errors import CBSOutputError
+
+#---------------------------------------------------------------------------------------#
+#		General
+#---------------------------------------------------------------------------------------#
+
+#increased whenever the parsed format changes, which invalidates all sidecar files
+PARSER_VERSION 		= 1
+
+LEVEL_FIELDS 		= [('L',int),('s',int)]
+TRANSITION_FIELDS 	= [('L1',int),('s1',int),('L2',int),('s2',int)]
+VALUE_FIELDS 		= [('value',float),('uncertainty',float)]
+
+#quantities of cbsmodel input files and levels/transitions of data files
+DTYPE_LEVEL 		= np.dtype(LEVEL_FIELDS)
+DTYPE_TRANSITION 	= np.dtype(TRANSITION_FIELDS)
+DTYPE_DATA_LEVEL 	= np.dtype(LEVEL_FIELDS+VALUE_FIELDS)
+DTYPE_DATA_TRANSITION 	= np.dtype(TRANSITION_FIELDS+VALUE_FIELDS)
+
+def as_columns(in_array):
+	'''Convert a structured array into a plain 2D array with one column per field'''
+
+	return structured_to_unstructured(in_array)
+
+#---------------------------------------------------------------------------------------#
+#		Sidecar files
+#---------------------------------------------------------------------------------------#
+
+#smaller files are parsed faster than their sidecar files are loaded
+SIDECAR_MIN_SIZE 	= 16*1024
+
+def sidecar_path(self):
+	'''Directory of the sidecar files of the CBSplot object self, inside its CBSCache or None without cache'''
+
+	if getattr(self,'cache',None) is None:
+		return None
+
+	return os.path.join(self.cache.path,'parsed')
+
+def sidecar_file(in_file,path_sidecars):
+	'''Path of the .npz sidecar file storing the parsed contents of in_file in the directory path_sidecars'''
+
+	name_file = hashlib.sha256(os.path.realpath(in_file).encode()).hexdigest()[:32]
+
+	return os.path.join(path_sidecars,'%s.npz'% name_file)
+
+def sidecar_key(in_file):
+	'''Identify the contents of in_file by its path, modification time and size'''
+
+	stat_file = os.stat(in_file)
+
+	return '%s %i %i %i'% (os.path.realpath(in_file),stat_file.st_mtime_ns,stat_file.st_size,PARSER_VERSION)
+
+def load_parsed(in_file,parse_file,path_sidecars=None):
+	'''Parse in_file with parse_file or load the result from its sidecar file.
+
+	parse_file returns a dict of arrays. If path_sidecars is given and in_file has
+	at least SIDECAR_MIN_SIZE bytes, the result is stored in a sidecar file in path_sidecars,
+	which is used as long as path, modification time and size of in_file are unchanged.
+	'''
+
+	if path_sidecars is None or os.path.getsize(in_file) < SIDECAR_MIN_SIZE:
+		return parse_file(in_file)
+
+	key 	= sidecar_key(in_file)
+	sidecar = sidecar_file(in_file,path_sidecars)
+
+	try:
+		with np.load(sidecar,allow_pickle=False) as data:
+			if str(data['key']) == key:
+				return {name:data[name] for name in data.files if name != 'key'}
+	except (OSError,KeyError,ValueError):
+		pass
+
+	out_parsed = parse_file(in_file)
+
+	#written atomically since many processes may parse the same file
+	tmp_file = os.path.join(path_sidecars,'.%s.tmp'% uuid.uuid4().hex)
+
+	try:
+		os.makedirs(path_sidecars,exist_ok=True)
+		with open(tmp_file,'wb') as out_file:
+			np.savez(out_file,key=np.array(key),**out_parsed)
+		os.replace(tmp_file,sidecar)
+	except OSError:
+		#e.g. read-only directory, parse again next time
+		try:
+			os.remove(tmp_file)
+		except OSError:
+			pass
+
+	return out_parsed
+
+#---------------------------------------------------------------------------------------#
+#		Read data file
+#---------------------------------------------------------------------------------------#
+
+def parse_data_file(in_file):
+	'''Parse levels (E) and transitions (T) of a data file in cbsmodel syntax'''
+
+	out_energies 	= []
+	out_BE2 	= []
+	out_rho2E0 	= []
+
+	with open(in_file) as data_file:
+		lines_data_file = list(data_file.readlines())
+
+	for num_line,line in enumerate(lines_data_file):
+		if len(line) > 1:
+			elements_line = line.split()
+
+			if elements_line[0] == 'E':
+				#if len(elements_line) != 5:
+				#	raise ValueError('experimental input for energy not correct in %s!\n \
+				#		Must be `E L s val delta_val` not `%s`!'% (in_file,' '.join(elements_line)))
+				
+				out_energies.append((int(elements_line[1]),int(elements_line[2]),
+							float(elements_line[3]),float(elements_line[4])))
+
+			elif elements_line[0] == 'T':
+				#if len(elements_line) != 7:
+				#	raise ValueError('experimental input for energy not correct in %s!\n \
+				#		Must be `T L1 s1 L2 s2 val delta_val` not `%s`!'% (in_file,' '.join(elements_line)))
+
+				transition = (int(elements_line[1]),int(elements_line[2]),
+						int(elements_line[3]),int(elements_line[4]),
+						float(elements_line[5]),float(elements_line[6]))
+
+				if transition[0] == 0 and transition[2] == 0:
+					out_rho2E0.append(transition)
+				else:
+					out_BE2.append(transition)
+
+	return {'energy':np.array(out_energies,dtype=DTYPE_DATA_LEVEL),
+		'BE2':np.array(out_BE2,dtype=DTYPE_DATA_TRANSITION),
+		'rho2E0':np.array(out_rho2E0,dtype=DTYPE_DATA_TRANSITION)}
+
+def read_data_file(in_file,path_sidecars=None):
+	'''Read levels (E) and transitions (T) from a data file in cbsmodel syntax.
+	
+	Returns structured arrays with the fields (L,s,value,uncertainty) for the levels
+	and (L1,s1,L2,s2,value,uncertainty) for the transitions.
+	Transitions between two states with J=0 are returned as rho2E0, all others as BE2.
+	Large files are parsed once if path_sidecars is given, see load_parsed().
+	'''
+
+	data = load_parsed(in_file,parse_data_file,path_sidecars)
+
+	return data['energy'],data['BE2'],data['rho2E0']
+
+#---------------------------------------------------------------------------------------#
+#		Read cbsmodel input file
+#---------------------------------------------------------------------------------------#
+
+def parse_input_file(in_file):
+	'''Parse the commands of a cbsmodel input file used by CBSplot'''
+
+	out_A 		= []
+	out_Z 		= []
+	out_fit 	= []
+	out_quantities 	= {'energy':[],'BE2':[],'ME2':[],'rho2E0':[]}
+
+	with open(in_file) as cbs_data_file:
+		lines_cbs_data_file = list(cbs_data_file.readlines())
+
+	for num_line,line in enumerate(lines_cbs_data_file):
+		
+		if len(line) > 1:
+			elements_line = line.split()
+		
+			if elements_line[0] == 'A':
+				out_A.append(int(elements_line[1]))
+
+			elif elements_line[0] == 'Z':
+				out_Z.append(int(elements_line[1]))
+
+			elif elements_line[0] == 'fit':
+				if len(elements_line) < 3:
+					raise ValueError('cbsmodel fit command should specify the data file\n \
+						and at least one fit parameter!')
+
+				out_fit = elements_line[1:]
+
+			elif elements_line[0] == 'energy':
+				if len(elements_line) != 3:
+					raise ValueError('cbsmodel input for energy not correct in %s!\n \
+						Must be `energy L s` not `%s`!'% (in_file,' '.join(elements_line)))
+
+				out_quantities['energy'].append((int(elements_line[1]),int(elements_line[2])))
+
+			elif elements_line[0] in ['BE2','ME2','rho2E0']:
+				out_quantities[elements_line[0]].append((int(elements_line[1]),int(elements_line[2]),
+									int(elements_line[3]),int(elements_line[4])))
+
+	out_parsed = {'A':np.array(out_A,dtype=int),
+			'Z':np.array(out_Z,dtype=int),
+			'fit':np.array(out_fit,dtype=str)}
+
+	for in_keyword,quantities in out_quantities.items():
+		out_parsed[in_keyword] = np.array(quantities,dtype=DTYPE_LEVEL if in_keyword == 'energy' else DTYPE_TRANSITION)
+
+	return out_parsed
+
+def read_input_file(in_file,path_sidecars=None):
+	'''Read a cbsmodel input file.
+
+	Returns a dict with the mass and charge numbers (A, Z), the arguments of the fit command (fit)
+	and structured arrays with the fields (L,s) or (L1,s1,L2,s2) of the requested quantities
+	(energy, BE2, ME2, rho2E0). Large files are parsed once if path_sidecars is given, see load_parsed().
+	'''
+
+	return load_parsed(in_file,parse_input_file,path_sidecars)
+
+#---------------------------------------------------------------------------------------#
+#		Read cbsmodel output
+#---------------------------------------------------------------------------------------#
+
+#number of tokens printed by cbsmodel before the values of simpleoutput
+SIMPLE_OUTPUT_HEADER 	= 2
+
+#lines `label : value +- uncertainty` and `chi^2/ndf : value` of fit results
+PATTERN_PARAM 		= re.compile(rb'^[ \t]*([^:\n]+?)[ \t]*:[ \t]*(\S+)[ \t]*\+-[ \t]*(\S+)[ \t]*\r?$',re.M)
+PATTERN_CHI 		= re.compile(rb'^[ \t]*([^:\n]*chi[^:\n]*?)[ \t]*:[ \t]*(\S+)[ \t]*\r?$',re.M|re.I)
+PATTERN_HEADER 		= re.compile(rb'\A\s*' + rb'\S+(?:\s+|\Z)'*SIMPLE_OUTPUT_HEADER)
+PATTERN_ERROR 		= re.compile(rb'^[ \t]*Error\b',re.M)
+
+class CBSFitResult:
+	'''Result of a fit in cbsmodel.
+
+	Attributes:
+	-----------
+	success: bool
+		True if the fit converged
+	red_chi: float
+		reduced chisquare of the fit
+	names: list
+		names of the fit parameters
+	values: array
+		values of the fit parameters
+	uncertainties: array
+		uncertainties of the fit parameters
+	'''
+
+	def __init__(self,success,red_chi,names,values,uncertainties):
+
+		self.success 		= success
+		self.red_chi 		= red_chi
+		self.names 		= list(names)
+		self.values 		= values
+		self.uncertainties 	= uncertainties
+
+	def fit_params(self):
+		'''Values and uncertainties alternating as in CBSplot.fit_params'''
+
+		out_params 		= np.zeros(2*len(self.names))
+		out_params[0::2] 	= self.values
+		out_params[1::2] 	= self.uncertainties
+
+		return out_params
+
+	def __repr__(self):
+
+		return 'CBSFitResult(success=%s, red_chi=%s, %s)'% (self.success,self.red_chi,
+			', '.join(['%s=%s+-%s'% param for param in zip(self.names,self.values,self.uncertainties)]))
+
+def output_excerpt(output_cbs,max_lines=20):
+	'''First lines of a cbsmodel output for error messages'''
+
+	return '\n'.join(output_cbs.decode(errors='replace').splitlines()[:max_lines])
+
+def parse_float(string,label,output_cbs):
+
+	try:
+		return float(string)
+	except ValueError:
+		raise CBSOutputError('value %r of %s in cbsmodel output is not a number:\n%s'% 
+					(string.decode(errors='replace'),label,output_excerpt(output_cbs)))
+
+def complete_output(output_cbs):
+	'''Check whether cbsmodel answered with a fit or simpleoutput and without an error.
+
+	Used for replies of a session, which has no return code.
+	'''
+
+	if PATTERN_ERROR.search(output_cbs) is not None:
+		return False
+
+	return b'Fit successful' in output_cbs or PATTERN_HEADER.match(output_cbs) is not None
+
+def parse_fit_output(output_cbs,name_fit_params):
+	'''Parse the output of a fit in cbsmodel into a CBSFitResult.
+
+	Parameters are found by their labels. If the labels differ from the names
+	of the fit parameters but their number coincides, they are taken in the order of the fit parameters.
+	'''
+
+	num_params 	= len(name_fit_params)
+
+	if b'Fit successful' not in output_cbs:
+		return CBSFitResult(False,np.nan,name_fit_params,np.full(num_params,np.nan),np.full(num_params,np.nan))
+
+	match_chi = PATTERN_CHI.search(output_cbs)
+
+	if match_chi is None:
+		raise CBSOutputError('reduced chisquare not found in cbsmodel output:\n%s'% output_excerpt(output_cbs))
+
+	red_chi 	= parse_float(match_chi.group(2),'chisquare',output_cbs)
+
+	lines_params 	= PATTERN_PARAM.findall(output_cbs)
+	labels 		= [line[0].split()[0].decode(errors='replace') for line in lines_params]
+
+	values 		= np.zeros(num_params)
+	uncertainties 	= np.zeros(num_params)
+
+	for num_param,param in enumerate(name_fit_params):
+		if param in labels:
+			line_param = lines_params[labels.index(param)]
+		elif len(lines_params) == num_params:
+			line_param = lines_params[num_param]
+		else:
+			raise CBSOutputError('fit parameter %s not found in cbsmodel output:\n%s'% (param,output_excerpt(output_cbs)))
+
+		values[num_param] 	 = parse_float(line_param[1],param,output_cbs)
+		uncertainties[num_param] = parse_float(line_param[2],param,output_cbs)
+
+	return CBSFitResult(True,red_chi,name_fit_params,values,uncertainties)
+
+def parse_simple_output(output_cbs,num_values=None):
+	'''Convert the values printed by cbsmodel with simpleoutput into an array.
+
+	The numbers are converted in bulk without splitting the output into tokens.
+	If num_values is given, the number of values is checked.
+	'''
+
+	match_header = PATTERN_HEADER.match(output_cbs)
+
+	if match_header is None:
+		raise CBSOutputError('header of simpleoutput not found in cbsmodel output:\n%s'% output_excerpt(output_cbs))
+
+	body = output_cbs[match_header.end():]
+
+	#fromstring stops at the first token which is not a number and only warns about it
+	with warnings.catch_warnings():
+		warnings.simplefilter('error',DeprecationWarning)
+		try:
+			out_values = np.fromstring(body,dtype=float,sep=' ')
+		except (ValueError,DeprecationWarning):
+			for line in body.splitlines():
+				for token in line.split():
+					parse_float(token,'simpleoutput',output_cbs)
+			raise CBSOutputError('values in cbsmodel output could not be read:\n%s'% output_excerpt(output_cbs))
+
+	if num_values is not None and len(out_values) != num_values:
+		raise CBSOutputError('cbsmodel printed %i values instead of %i:\n%s'% 
+					(len(out_values),num_values,output_excerpt(output_cbs)))
+
+	return out_values
@@ -17,11 +17,20 @@
 # You should have received a copy of the GNU General Public License
 # along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
+
 import numpy as np
 import matplotlib.pyplot as plt
 
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection,PolyCollection
+from matplotlib.transforms import IdentityTransform
+
 from uncertainties import ufloat
 
+from .parsers import read_data_file,as_columns,sidecar_path
+
 #---------------------------------------------------------------------------------------#
 #		General
 #---------------------------------------------------------------------------------------#
@@ -51,31 +60,24 @@ OFFSET 			= 0.003
 #---------------------------------------------------------------------------------------#
 
 class Level():
+	'''Single level of a level scheme, drawn as by draw_spectrum'''
+
 	def __init__(self,ax,band,energy,name):
 		
 		self.ax 	= ax
 		self.band 	= band
-		#if energy > 25:
 		self.energy 	= energy/10**3
-		self.offset 	= 10/10**3
-		#else:
-		#	self.energy 	= energy
-		#	self.offset 	= 10
 		self.name 	= name
 		self.color 	= COLOR_LEVEL
 
 	def plot(self):
-		self.ax.set_xlim(0,self.band*5+6)
 		self.ax.axis('off')
-		self.ax.plot([WIDTH*self.band,WIDTH*self.band+(WIDTH-1)],[self.energy,self.energy],
-			linewidth=2,color=self.color,zorder=25)
-		self.ax.text(WIDTH*self.band+0.025,self.energy+self.offset,r'%s'% self.name,
-			color=self.color,horizontalalignment='left',zorder=25,fontsize=FONTSIZE)
-		self.ax.text(WIDTH*self.band+(WIDTH-1.15),self.energy+self.offset,'%.3f'% self.energy,
-			color=self.color,horizontalalignment='right',zorder=25,fontsize=FONTSIZE)
+		draw_levels(self.ax,np.array([self.band]),np.array([self.energy]),[self.name],self.color)
 		return
 
 class Transition():
+	'''Single transition of a level scheme, drawn as by draw_spectrum'''
+
 	def __init__(self,ax,bands,energies,value,print_val,color):
 		self.ax 	= ax
 		self.bands 	= bands
@@ -86,172 +88,324 @@ class Transition():
 
 	def create_string(self):
 
-		if len(self.value)==1:
-			out_string = r'$%s$'% (str(self.value[0]))
-		elif len(self.value)==2:
-			unc_value  = ufloat(self.value[0],self.value[1])
-			if self.value[1] > 2 and self.value[1] < 10:
-				out_string = '{:.1uS}'.format(unc_value)
-			else:
-				out_string = '{:.2uS}'.format(unc_value)
-			#out_string = r'$%s(%s)$'% (str(self.value[0]),str(self.value[1]))
-		elif len(self.value)==3:
-			out_string = r'$%s^{%s}_{%s}$'% (str(self.value[0]),str(self.value[1]),str(self.value[2]))
-
-		return out_string
+		return value_string(self.value)
 
 	def plot(self):
 
-		if self.value:
-			arrow_width 	= np.max((self.value[0]/20,0.5))
-			head_width 	= np.max((1.5*arrow_width,2))
+		arrow = transition_arrow(self.ax,self.bands,self.energies,self.value,self.color,self.print_val)
+
+		if arrow is None:
+			return
+
+		arrow,extension = arrow
+
+		if extension is not None:
+			self.ax.add_collection(LineCollection([extension],linestyles='--',colors='grey'))
+
+		draw_arrows(self.ax,[arrow])
+
+		return
+
+def value_string(value):
+	'''Label of a transition with value [val], [val,unc] or [val,upper,lower]'''
+
+	if len(value)==1:
+		out_string = r'$%s$'% (str(value[0]))
+	elif len(value)==2:
+		unc_value  = ufloat(value[0],value[1])
+		if value[1] > 2 and value[1] < 10:
+			out_string = '{:.1uS}'.format(unc_value)
 		else:
-			arrow_width 	= 0.5
-			head_width 	= 2
-
-		if self.bands[0] == self.bands[1]:
-			self.ax.annotate('',xy=(WIDTH*self.bands[1]+1.5,self.energies[1]+OFFSET),
-				xytext=(WIDTH*self.bands[0]+1.5,self.energies[0]),
-				arrowprops=dict(color=self.color,width=arrow_width,headwidth=head_width),fontsize=FONTSIZE)
-			if self.value and self.print_val:
-				string = self.create_string()
-				self.ax.text(WIDTH*self.bands[1]+1.5,(1-0.55)*min(self.energies[0],self.energies[1])+0.55*max(self.energies[0],self.energies[1]),
-					string,ha='center',va='center',bbox=dict(color='white',alpha=0.85,pad=0.5),zorder=10,fontsize=0.75*FONTSIZE)
-		
-		elif self.bands[0]+1 == self.bands[1]:
-			self.ax.annotate('',xy=(WIDTH*self.bands[1],self.energies[1]),
-				xytext=(WIDTH*self.bands[0]+(WIDTH-1),self.energies[0]),
-				arrowprops=dict(color=self.color,width=arrow_width,headwidth=head_width))
-			if self.value and self.print_val:
-				string = self.create_string()
-				self.ax.text(0.5*(WIDTH*self.bands[0]+(WIDTH-1)+WIDTH*self.bands[1]),0.5*(self.energies[0]+self.energies[1]),
-					string,ha='center',va='center',bbox=dict(color='white',alpha=0.85,pad=0.5),zorder=10,fontsize=0.75*FONTSIZE)
-		
-		elif self.bands[0] == self.bands[1]+1:
-			self.ax.annotate('',xy=(WIDTH*self.bands[1]+(WIDTH-1),self.energies[1]),
-				xytext=(WIDTH*self.bands[0],self.energies[0]),
-				arrowprops=dict(color=self.color,width=arrow_width,headwidth=head_width))
-			if self.value and self.print_val:
-				string = self.create_string()
-				self.ax.text(0.5*(WIDTH*self.bands[0]+WIDTH*self.bands[1]+(WIDTH-1)),0.5*(self.energies[0]+self.energies[1]),
-					string,ha='center',va='center',bbox=dict(color='white',alpha=0.85,pad=0.5),zorder=10,fontsize=0.75*FONTSIZE)
-
-		elif self.bands[0]+1 < self.bands[1]:
-			print('Not included yet.')
-
-		elif self.bands[0] > self.bands[1]+1:
-			#extend level first
-			plt.plot([WIDTH*self.bands[1]+(WIDTH-1),WIDTH*(self.bands[0]-1)+2.5],[self.energies[1],self.energies[1]],
-				linestyle='--',color='grey')
-			self.ax.annotate('',xy=(WIDTH*(self.bands[0]-1)+2.5,self.energies[1]),
-				xytext=(WIDTH*self.bands[0],self.energies[0]),
-				arrowprops=dict(color=self.color,width=arrow_width,headwidth=head_width))
-			if self.value and self.print_val:
-				string = self.create_string()
-				self.ax.text(0.5*(WIDTH*self.bands[0]+WIDTH*(self.bands[0]-1)+2.5),0.5*(self.energies[0]+self.energies[1]),
-					string,ha='center',va='center',bbox=dict(color='white',alpha=0.85,pad=0.5),zorder=10,fontsize=0.75*FONTSIZE)
+			out_string = '{:.2uS}'.format(unc_value)
+		#out_string = r'$%s(%s)$'% (str(value[0]),str(value[1]))
+	elif len(value)==3:
+		out_string = r'$%s^{%s}_{%s}$'% (str(value[0]),str(value[1]),str(value[2]))
+
+	return out_string
+
+def band_values(value,band,uncertainties):
+	'''Values of a calculated quantity with percentile band (lower,...,upper) as accepted by value_string.
+
+	uncertainties is either 'symmetric' (val(unc)) or 'asymmetric' (val^{+upper}_{-lower}).
+	'''
+
+	if uncertainties == 'symmetric':
+		return [int(value),int(np.ceil(0.5*(band[-1]-band[0])))]
+
+	return [int(value),'+%i'% np.ceil(band[-1]-value),'-%i'% np.ceil(value-band[0])]
+
+def cbs_values(self,attribute,uncertainties=None):
+	'''Label values of all calculated transitions in attribute, with bands if requested'''
+
+	bands = getattr(self,'%s_bands'% attribute,None)
+
+	if uncertainties is None or bands is None:
+		return [[int(transition[4])] for transition in getattr(self,attribute)]
+
+	return [band_values(transition[4],band,uncertainties) for transition,band in zip(getattr(self,attribute),bands)]
 
 #---------------------------------------------------------------------------------------#
-#		Load data experiment
+#		Batched drawing of level schemes
 #---------------------------------------------------------------------------------------#
 
-def load_experiment(self):
-	'''Load experimental values as specified in exp_data_file'''
-
-	out_exp_energies 	= []
-	out_exp_BE2 		= []
-	out_exp_rho2E0 		= []
-
-	exp_data_file 		= open('%s%s'% (self.exp_path,self.exp_file))
-	lines_exp_data_file 	= list(exp_data_file.readlines())
-	exp_data_file.close()
-
-	for num_line,line in enumerate(lines_exp_data_file):
-		if len(line) > 1:
-			elements_line = line.split()
-
-			if elements_line[0] == 'E':
-				#if len(elements_line) != 5:
-				#	raise ValueError('experimental input for energy not correct in %s!\n \
-				#		Must be `E L s val delta_val` not `%s`!'% (self.exp_file,' '.join(elements_line)))
-				
-				out_exp_energies.append([int(elements_line[1]),int(elements_line[2]),
-							float(elements_line[3]),float(elements_line[4])])
-
-			elif elements_line[0] == 'T':
-				#if len(elements_line) != 7:
-				#	raise ValueError('experimental input for energy not correct in %s!\n \
-				#		Must be `T L1 s1 L2 s2 val delta_val` not `%s`!'% (self.exp_file,' '.join(elements_line)))
-
-				if int(elements_line[1]) == 0 and int(elements_line[3]) == 0:
-					out_exp_rho2E0.append([int(elements_line[1]),int(elements_line[2]),
-							int(elements_line[3]),int(elements_line[4]),
-							float(elements_line[5]),float(elements_line[6])])
-				else:
-					out_exp_BE2.append([int(elements_line[1]),int(elements_line[2]),
-							int(elements_line[3]),int(elements_line[4]),
-							float(elements_line[5]),float(elements_line[6])])
-
-	return np.array(out_exp_energies),np.array(out_exp_BE2),np.array(out_exp_rho2E0)
+def level_index(in_energies):
+	'''Index {(L,s):energy} of all levels of a spectrum'''
+
+	return {(int(state[0]),int(state[1])):state[2] for state in in_energies}
+
+def transition_geometry(bands,energies):
+	'''Start and end of the arrow of a transition, position of its label 
+	and the extension of the final level (if needed), all in data coordinates.
+
+	Returns None if the transition cannot be drawn.
+	'''
+
+	if bands[0] == bands[1]:
+		return ((WIDTH*bands[0]+1.5,energies[0]),(WIDTH*bands[1]+1.5,energies[1]+OFFSET),
+			(WIDTH*bands[1]+1.5,(1-0.55)*min(energies[0],energies[1])+0.55*max(energies[0],energies[1])),None)
+
+	elif bands[0]+1 == bands[1]:
+		return ((WIDTH*bands[0]+(WIDTH-1),energies[0]),(WIDTH*bands[1],energies[1]),
+			(0.5*(WIDTH*bands[0]+(WIDTH-1)+WIDTH*bands[1]),0.5*(energies[0]+energies[1])),None)
+
+	elif bands[0] == bands[1]+1:
+		return ((WIDTH*bands[0],energies[0]),(WIDTH*bands[1]+(WIDTH-1),energies[1]),
+			(0.5*(WIDTH*bands[0]+WIDTH*bands[1]+(WIDTH-1)),0.5*(energies[0]+energies[1])),None)
+
+	elif bands[0] > bands[1]+1:
+		#extend level first
+		return ((WIDTH*bands[0],energies[0]),(WIDTH*(bands[0]-1)+2.5,energies[1]),
+			(0.5*(WIDTH*bands[0]+WIDTH*(bands[0]-1)+2.5),0.5*(energies[0]+energies[1])),
+			[(WIDTH*bands[1]+(WIDTH-1),energies[1]),(WIDTH*(bands[0]-1)+2.5,energies[1])])
+
+	return None
+
+def draw_levels(ax,bands,energies,names,color=COLOR_LEVEL):
+	'''Draw levels with their names and energies (in MeV) with batched artists'''
+
+	segments 	= np.zeros((len(energies),2,2))
+	segments[:,0,0] = WIDTH*bands
+	segments[:,1,0] = WIDTH*bands+(WIDTH-1)
+	segments[:,:,1] = energies[:,None]
+
+	ax.add_collection(LineCollection(segments,linewidths=2,colors=color,zorder=25))
+	ax.set_xlim(0,np.max(bands)*WIDTH+6)
+
+	for name,band,energy in zip(names,bands,energies):
+		ax.text(WIDTH*band+0.025,energy+10/10**3,name,
+			color=color,horizontalalignment='left',zorder=25,fontsize=FONTSIZE)
+		ax.text(WIDTH*band+(WIDTH-1.15),energy+10/10**3,'%.3f'% energy,
+			color=color,horizontalalignment='right',zorder=25,fontsize=FONTSIZE)
+
+	return
+
+def transition_arrow(ax,bands,energies,value,color,label=True):
+	'''Arrow (start,end,width,head_width,color) of a transition between bands with energies in MeV
+	and the extension of its final level (or None). The value is written next to the arrow if label is set.
+
+	Returns None if the transition cannot be drawn.
+	'''
+
+	geometry = transition_geometry(bands,energies)
+
+	if geometry is None:
+		print('Not included yet.')
+		return None
+
+	start,end,position,extension = geometry
+
+	if value:
+		arrow_width 	= np.max((value[0]/20,0.5))
+		head_width 	= np.max((1.5*arrow_width,2))
+	else:
+		arrow_width 	= 0.5
+		head_width 	= 2
+
+	if value and label:
+		ax.text(position[0],position[1],value_string(value),ha='center',va='center',
+			bbox=dict(color='white',alpha=0.85,pad=0.5),zorder=10,fontsize=0.75*FONTSIZE)
+
+	return (start,end,arrow_width,head_width,color),extension
+
+def draw_spectrum(ax,in_energies,in_transitions):
+	'''Draw levels and transition labels of a spectrum with batched artists.
+
+	in_transitions is a list of (transitions,values,color) with the values
+	as accepted by value_string. The arrows are returned as list of
+	(start,end,width,head_width,color) and drawn by draw_arrows.
+	'''
+
+	ax.axis('off')
+
+	index = level_index(in_energies)
+
+	if len(in_energies) > 0:
+		draw_levels(ax,in_energies[:,1].astype(int),in_energies[:,2]/10**3,
+			[r'$%i^+$'% state[0] for state in in_energies])
+
+	out_arrows 	= []
+	extensions 	= []
+
+	for transitions,values,color in in_transitions:
+		for transition,value in zip(transitions,values):
+
+			try:
+				energies = [index[(int(transition[0]),int(transition[1]))]/10**3,
+						index[(int(transition[2]),int(transition[3]))]/10**3]
+			except KeyError:
+				raise ValueError('levels of transition %i %i -> %i %i must be part of the spectrum!'% 
+						tuple(transition[:4]))
+
+			arrow = transition_arrow(ax,[int(transition[1]),int(transition[3])],energies,value,color)
+
+			if arrow is None:
+				continue
+
+			out_arrows.append(arrow[0])
+
+			if arrow[1] is not None:
+				extensions.append(arrow[1])
+
+	if extensions:
+		ax.add_collection(LineCollection(extensions,linestyles='--',colors='grey'))
+
+	return out_arrows
+
+class ArrowCollection(PolyCollection):
+	'''Arrows between points in data coordinates with widths in points as for annotate.
+
+	The polygons are built in display coordinates whenever the collection is drawn,
+	hence the arrows keep their shape if limits, size or dpi of the figure change.
+	'''
+
+	def __init__(self,in_arrows,head_length=12,**kwargs):
+
+		self.start 		= np.array([arrow[0] for arrow in in_arrows],dtype=float)
+		self.end 		= np.array([arrow[1] for arrow in in_arrows],dtype=float)
+		self.width 		= np.array([arrow[2] for arrow in in_arrows],dtype=float)[:,None]/2
+		self.head_width 	= np.array([arrow[3] for arrow in in_arrows],dtype=float)[:,None]/2
+		self.head_length 	= head_length
+
+		colors 			= [arrow[4] for arrow in in_arrows]
+
+		super().__init__([],facecolors=colors,edgecolors=colors,transform=IdentityTransform(),**kwargs)
+
+	def arrow_vertices(self,scale):
+		'''Polygons of all arrows in display coordinates with scale pixels per point'''
+
+		start 		= self.axes.transData.transform(self.start)
+		end 		= self.axes.transData.transform(self.end)
+
+		direction 	= end-start
+		length 		= np.maximum(np.hypot(direction[:,0],direction[:,1]),1e-12)[:,None]
+		direction 	= direction/length
+		normal 		= np.stack([-direction[:,1],direction[:,0]],axis=1)
+		neck 		= end-direction*np.minimum(scale*self.head_length,length)
+
+		width 		= scale*self.width
+		head_width 	= scale*self.head_width
+
+		return np.stack([start+normal*width,neck+normal*width,neck+normal*head_width,end,
+				neck-normal*head_width,neck-normal*width,start-normal*width],axis=1)
+
+	def draw(self,renderer):
+
+		self.set_verts(self.arrow_vertices(renderer.points_to_pixels(1.)))
+
+		super().draw(renderer)
+
+def draw_arrows(ax,in_arrows,head_length=12):
+	'''Draw all arrows of a spectrum as a single ArrowCollection.
+
+	Widths are given in points as for annotate.
+	'''
+
+	if not in_arrows:
+		return
+
+	ax.add_collection(ArrowCollection(in_arrows,head_length,linewidths=1,zorder=3),autolim=False)
+
+	return
 
 #---------------------------------------------------------------------------------------#
-#		Plot comparison
+#		Load data experiment
 #---------------------------------------------------------------------------------------#
 
-def plot_comparison(self):
-	'''Plot experimental data alongside CBS predictions for comparison'''
+def load_experiment(self):
+	'''Load experimental values as specified in exp_data_file or from the data store'''
 
-	fig,ax = plt.subplots(1,2,figsize=(12,10))
+	if getattr(self,'exp_store',None) is not None:
+		exp_energies,exp_BE2,exp_rho2E0 = self.exp_store.read(self.Z,self.A-self.Z)
+	else:
+		exp_energies,exp_BE2,exp_rho2E0 = read_data_file('%s%s'% (self.exp_path,self.exp_file),sidecar_path(self))
 
-	#----- Experiment -----#
+	return as_columns(exp_energies),as_columns(exp_BE2),as_columns(exp_rho2E0)
 
-	self.exp_energies,self.exp_BE2,self.exp_rho2E0 = load_experiment(self)
+#---------------------------------------------------------------------------------------#
+#		Figures
+#---------------------------------------------------------------------------------------#
 
-	if self.exp_energies != []:
-		for state in self.exp_energies:
-			Level(ax[0],int(state[1]),state[2],'$%i^+$'% state[0]).plot()
+def new_figure(headless,nrows,ncols,**kwargs):
+	'''Create a figure with nrows x ncols axes, without pyplot if headless=True.
 
-	#dummy state to ensure correct width of plot
-	#Level(ax[0],1,-1e5,'').plot()
+	Further keyword arguments are passed to Figure (e.g. figsize), except sharex, sharey and squeeze.
+	'''
 
-	if self.exp_BE2 != []:
-		for transition in self.exp_BE2:
+	kwargs_subplots = {name:kwargs.pop(name) for name in ['sharex','sharey','squeeze'] if name in kwargs}
 
-			energy_start = self.exp_energies[(self.exp_energies[:,0:2]==(transition[0],transition[1])).all(axis=1).nonzero()][0,2]
-			energy_stop  = self.exp_energies[(self.exp_energies[:,0:2]==(transition[2],transition[3])).all(axis=1).nonzero()][0,2]
+	if headless:
+		fig = Figure(**kwargs)
+		FigureCanvasAgg(fig)
+	else:
+		fig = plt.figure(**kwargs)
 
-			Transition(ax[0],[transition[1],transition[3]],[energy_start,energy_stop],[transition[4],transition[5]],True,COLOR_E2).plot()
+	return fig,fig.subplots(nrows,ncols,**kwargs_subplots)
 
-	if self.exp_rho2E0 != []:
-		for transition in self.exp_rho2E0:
+def save_figure(fig,headless,out_format,to_bytes,out_file):
+	'''Save the figure to out_file or return its contents if to_bytes=True'''
 
-			energy_start = self.exp_energies[(self.exp_energies[:,0:2]==(transition[0],transition[1])).all(axis=1).nonzero()][0,2]
-			energy_stop  = self.exp_energies[(self.exp_energies[:,0:2]==(transition[2],transition[3])).all(axis=1).nonzero()][0,2]
+	if to_bytes:
+		out_plot = io.BytesIO()
+		fig.savefig(out_plot,format=out_format)
+		out_plot = out_plot.getvalue()
+	else:
+		out_plot = out_file
+		fig.savefig(out_plot,format=out_format)
 
-			Transition(ax[0],[transition[1],transition[3]],[energy_start,energy_stop],[transition[4],transition[5]],True,COLOR_RHO2E0).plot()
+	#headless figures are not known to pyplot and can be freed right away
+	if headless:
+		fig.clear()
 
-	#----- CBS -----#
+	return out_plot
+
+#---------------------------------------------------------------------------------------#
+#		Plot comparison
+#---------------------------------------------------------------------------------------#
 
-	if self.cbs_energies != []:
-		for state in self.cbs_energies:
+def plot_comparison(self,headless=False,out_format='pdf',to_bytes=False,uncertainties=None):
+	'''Plot experimental data alongside CBS predictions for comparison.
 
-			Level(ax[1],int(state[1]),state[2],'$%i^+$'% state[0]).plot()
+	With headless=True, the figure is created without pyplot and freed after saving.
+	With uncertainties ('symmetric' or 'asymmetric'), the labels of calculated transitions
+	contain the bands of propagate_uncertainties.
+	Returns the contents of the plot if to_bytes=True and the path of the written file otherwise.
+	'''
 
-	if self.cbs_BE2 != []:
-		for transition in self.cbs_BE2:
+	fig,ax = new_figure(headless,1,2,figsize=(12,10))
 
-			energy_start = self.cbs_energies[(self.cbs_energies[:,0:2]==(transition[0],transition[1])).all(axis=1).nonzero()][0,2]
-			energy_stop  = self.cbs_energies[(self.cbs_energies[:,0:2]==(transition[2],transition[3])).all(axis=1).nonzero()][0,2]
+	#----- Experiment -----#
 
-			Transition(ax[1],[transition[1],transition[3]],[energy_start,energy_stop],[int(transition[4])],True,COLOR_E2).plot()
+	self.exp_energies,self.exp_BE2,self.exp_rho2E0 = load_experiment(self)
 
-	if self.cbs_rho2E0 != []:
-		for transition in self.cbs_rho2E0:
+	arrows_exp = draw_spectrum(ax[0],self.exp_energies,
+			[(self.exp_BE2,[[transition[4],transition[5]] for transition in self.exp_BE2],COLOR_E2),
+			(self.exp_rho2E0,[[transition[4],transition[5]] for transition in self.exp_rho2E0],COLOR_RHO2E0)])
 
-			energy_start = self.cbs_energies[(self.cbs_energies[:,0:2]==(transition[0],transition[1])).all(axis=1).nonzero()][0,2]
-			energy_stop  = self.cbs_energies[(self.cbs_energies[:,0:2]==(transition[2],transition[3])).all(axis=1).nonzero()][0,2]
+	#----- CBS -----#
 
-			Transition(ax[1],[transition[1],transition[3]],[energy_start,energy_stop],[int(transition[4])],True,COLOR_RHO2E0).plot()
+	arrows_cbs = draw_spectrum(ax[1],self.cbs_energies,
+			[(self.cbs_BE2,cbs_values(self,'cbs_BE2',uncertainties),COLOR_E2),
+			(self.cbs_rho2E0,cbs_values(self,'cbs_rho2E0',uncertainties),COLOR_RHO2E0)])
 
 	#----- labels -----#
 
@@ -287,11 +441,15 @@ def plot_comparison(self):
 	ax[0].set_ylim(-0.1,max_energy+0.1)
 	ax[1].set_ylim(-0.1,max_energy+0.1)
 
+	#arrow widths are given in points and do not depend on the limits
+	draw_arrows(ax[0],arrows_exp)
+	draw_arrows(ax[1],arrows_cbs)
+
 	#----- other stuff -----#
 
-	plt.savefig('%slevelscheme_%i%s.pdf'% (self.out_path,self.A,self.nucl_name))
+	out_plot = '%slevelscheme_%i%s.%s'% (self.out_path,self.A,self.nucl_name,out_format)
 
-	return
+	return save_figure(fig,headless,out_format,to_bytes,out_plot)
 
 
 
@@ -0,0 +1,131 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import subprocess
+import signal
+import errno
+import os
+
+try:
+	import resource
+except ImportError:
+	#not available on Windows
+	resource = None
+
+from .errors import CBSProcessError
+
+#---------------------------------------------------------------------------------------#
+#		Resource limits
+#---------------------------------------------------------------------------------------#
+
+#names of the supported limits and the corresponding resources
+RLIMITS = {'cpu':'RLIMIT_CPU','memory':'RLIMIT_AS'}
+
+def check_rlimits(rlimits):
+	'''Check the resource limits {'cpu':seconds,'memory':bytes} and return them'''
+
+	if rlimits is None:
+		return None
+
+	if not isinstance(rlimits,dict) or any([name not in RLIMITS for name in rlimits]):
+		raise ValueError('rlimits must be a dict with the keys %s!'% ', '.join(RLIMITS))
+
+	for name,value in rlimits.items():
+		if not isinstance(value,int) or value <= 0:
+			raise ValueError('rlimit %s must be a positive integer!'% name)
+
+	if resource is None or not hasattr(resource,'prlimit'):
+		raise ValueError('resource limits are not supported on this platform!')
+
+	return dict(rlimits)
+
+def apply_rlimits(process,rlimits):
+	'''Set the resource limits of a just started cbsmodel process.
+
+	The limits are set from the parent with prlimit instead of a preexec_fn, 
+	which is not safe in the presence of threads (sessions, parallel fits).
+	'''
+
+	if not rlimits:
+		return
+
+	try:
+		for name,value in rlimits.items():
+			resource.prlimit(process.pid,getattr(resource,RLIMITS[name]),(value,value))
+	except ProcessLookupError:
+		#already terminated
+		pass
+
+#---------------------------------------------------------------------------------------#
+#		cbsmodel processes
+#---------------------------------------------------------------------------------------#
+
+#maximum length in characters of the commands given to cbsmodel on the command line.
+#Far below ARG_MAX (>= 256 KiB), which also counts a pointer per argument and the environment.
+MAX_COMMAND_LENGTH 	= 64*1024
+
+def process_options():
+	'''Keyword arguments of Popen for cbsmodel processes.
+
+	Every process is started in a new session, so that it can be killed 
+	together with all its children by kill_process_group.
+	'''
+
+	return {'start_new_session':True}
+
+def start_cbsmodel(command,rlimits=None,**kwargs):
+	'''Start cbsmodel with the arguments in command'''
+
+	try:
+		process = subprocess.Popen(command,**process_options(),**kwargs)
+	except OSError as error:
+		raise start_error(command,error)
+
+	apply_rlimits(process,rlimits)
+
+	return process
+
+def start_error(command,error):
+	'''CBSProcessError for the OSError raised while starting cbsmodel with the arguments in command'''
+
+	if isinstance(error,FileNotFoundError):
+		return CBSProcessError('cbsmodel executable `%s` not found!'% command[0])
+
+	if error.errno == errno.E2BIG:
+		return CBSProcessError('command line of cbsmodel too long (%i arguments, %i characters)!'% 
+					(len(command)-1,sum([len(argument) for argument in command])))
+
+	return CBSProcessError('cbsmodel could not be started: %s'% error)
+
+def kill_process_group(process):
+	'''Kill a cbsmodel process and all its children'''
+
+	try:
+		os.killpg(process.pid,signal.SIGKILL)
+	except OSError:
+		#already terminated
+		pass
+
+def check_returncode(process,run_string):
+	'''Raise CBSProcessError if cbsmodel was terminated by a signal, e.g. by a resource limit'''
+
+	if process.returncode is not None and process.returncode < 0:
+		raise CBSProcessError('cbsmodel was terminated by signal %i (resource limit?) while running `%s`'% 
+					(-process.returncode,' '.join(run_string.split()[:20])))
@@ -0,0 +1,469 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import weakref
+import atexit
+import socket
+import shutil
+import uuid
+import time
+import os
+
+import numpy as np
+
+try:
+	import fcntl
+except ImportError:
+	#not available on Windows
+	fcntl = None
+
+#---------------------------------------------------------------------------------------#
+#		General
+#---------------------------------------------------------------------------------------#
+
+#Columns of every chunk with one value per result
+
+COLUMNS_RESULT 		= ('name','Z','N','red_chi','time','input_file','exp_data_file')
+
+#Quantities with the number of columns (state(s) and value) and the attribute of CBSplot
+
+COLUMNS_QUANTITY 	= {'energy':3,'BE2':5,'ME2':5,'rho2E0':5}
+ATTRIBUTES_QUANTITY 	= {'energy':'cbs_energies','BE2':'cbs_BE2','ME2':'cbs_ME2','rho2E0':'cbs_rho2E0'}
+
+PREFIX_CHUNK 		= 'chunk-'
+PREFIX_TMP 		= '.tmp-'
+
+#names of the chunks merged into a chunk by compact()
+NAME_REPLACES 		= 'replaces'
+
+#lock file held by compact(), file locks do not exclude threads of the same process
+NAME_LOCK 		= '.compact.lock'
+_compact_threads 	= threading.Lock()
+
+#stores with appended results which have not been written yet, see flush_stores()
+_open_stores 		= weakref.WeakSet()
+_shared_stores 		= {}
+
+def load_column(path):
+	'''Memory-map a column stored as .npy file (empty columns cannot be mapped)'''
+
+	try:
+		return np.load(path,mmap_mode='r')
+	except ValueError:
+		return np.load(path)
+
+def result_values(result):
+	'''Values of a run CBSplot object or a result of CBSplotBatch as stored in a chunk, None if it failed'''
+
+	if not isinstance(result,dict):
+		if getattr(result,'fit_params',None) is None:
+			return None
+
+		result = {'nucleus':[result.nucl_name,result.Z,result.A-result.Z],
+			'input_file':result.input_path+result.input_file,
+			'exp_data_file':result.exp_data_file,
+			'success':True,
+			'name_fit_params':result.name_fit_params,
+			'fit_params':result.fit_params,
+			'red_chi':result.red_chi,
+			**{attribute:getattr(result,attribute) for attribute in ATTRIBUTES_QUANTITY.values()}}
+
+	if not result['success']:
+		return None
+
+	values = {'name':result['nucleus'][0],
+		'Z':result['nucleus'][1],
+		'N':result['nucleus'][2],
+		'red_chi':np.nan if result['red_chi'] is None else result['red_chi'],
+		'time':result.get('time',time.time()),
+		'input_file':result['input_file'] or '',
+		'exp_data_file':result['exp_data_file'] or '',
+		'param_names':list(result['name_fit_params']),
+		'params':np.asarray(result['fit_params'],dtype=float).reshape((-1,2))}
+
+	for in_keyword,num_columns in COLUMNS_QUANTITY.items():
+		quantity 		= np.asarray(result[ATTRIBUTES_QUANTITY[in_keyword]],dtype=float)
+		values[in_keyword] 	= quantity.reshape((-1,num_columns)) if quantity.size > 0 else np.zeros((0,num_columns))
+
+	return values
+
+#---------------------------------------------------------------------------------------#
+#		Chunks
+#---------------------------------------------------------------------------------------#
+
+class CBSResultsChunk:
+	'''Memory-mapped columns of a single chunk of a CBSResultsStore.
+
+	Columns with one value per result (name, Z, N, ...) are attributes of the chunk.
+	Fit parameters and quantities of variable length are stored in a single array each
+	(params with the columns value and uncertainty, energy with L, s and value, etc.)
+	together with the offsets of every result.
+	'''
+
+	def __init__(self,path):
+
+		self.path = path
+
+		for column in COLUMNS_RESULT+('param_names','params','params_offsets'):
+			setattr(self,column,load_column(os.path.join(path,'%s.npy'% column)))
+
+		self.quantities = {in_keyword:(load_column(os.path.join(path,'%s.npy'% in_keyword)),
+						load_column(os.path.join(path,'%s_offsets.npy'% in_keyword)))
+					for in_keyword in COLUMNS_QUANTITY}
+
+	def __len__(self):
+
+		return len(self.Z)
+
+	def fit_params(self,num_result):
+		'''Names and values of the fit parameters of a result, the values as value, uncertainty of every parameter'''
+
+		start,stop = self.params_offsets[num_result],self.params_offsets[num_result+1]
+
+		return [str(name) for name in self.param_names[start:stop]],self.params[start:stop].reshape(-1)
+
+	def quantity(self,in_keyword,num_result):
+		'''Quantities of type in_keyword of a result as in cbs_energies, cbs_BE2 etc.'''
+
+		values,offsets = self.quantities[in_keyword]
+
+		return values[offsets[num_result]:offsets[num_result+1]]
+
+	def result(self,num_result):
+		'''A result as dict as stored by CBSplotBatch'''
+
+		name_fit_params,fit_params = self.fit_params(num_result)
+
+		result = {'nucleus':[str(self.name[num_result]),int(self.Z[num_result]),int(self.N[num_result])],
+			'input_file':str(self.input_file[num_result]),
+			'exp_data_file':str(self.exp_data_file[num_result]) or None,
+			'success':True,
+			'error':None,
+			'error_type':None,
+			'name_fit_params':name_fit_params,
+			'fit_params':fit_params,
+			'red_chi':float(self.red_chi[num_result]),
+			'plot':None,
+			'stats':None,
+			'time':float(self.time[num_result])}
+
+		for in_keyword,attribute in ATTRIBUTES_QUANTITY.items():
+			result[attribute] = self.quantity(in_keyword,num_result)
+
+		return result
+
+def write_chunk(path,rows,replaces=()):
+	'''Write the values of many results as a new chunk in the directory path.
+
+	The columns are written to a temporary directory which is renamed afterwards,
+	hence readers never see incomplete chunks and writers never share files.
+	The names of the chunks in replaces are stored with the chunk, see chunk_names().
+	'''
+
+	#the names sort by time of creation and are unique across hosts and processes
+	name_chunk 	= '%s%020i-%s-%i-%s'% (PREFIX_CHUNK,time.time_ns(),socket.gethostname(),os.getpid(),uuid.uuid4().hex[:8])
+	path_tmp 	= os.path.join(path,PREFIX_TMP+name_chunk)
+
+	os.makedirs(path_tmp)
+
+	columns = {column:np.array([row[column] for row in rows]) for column in COLUMNS_RESULT}
+
+	columns['param_names'] 		= np.array(sum([row['param_names'] for row in rows],[]),dtype=str)
+	columns['params'] 		= np.concatenate([row['params'] for row in rows]+[np.zeros((0,2))])
+	columns['params_offsets'] 	= np.cumsum([0]+[len(row['params']) for row in rows])
+
+	for in_keyword,num_columns in COLUMNS_QUANTITY.items():
+		columns[in_keyword] 			= np.concatenate([row[in_keyword] for row in rows]+[np.zeros((0,num_columns))])
+		columns['%s_offsets'% in_keyword] 	= np.cumsum([0]+[len(row[in_keyword]) for row in rows])
+
+	if replaces:
+		columns[NAME_REPLACES] = np.array(sorted(replaces),dtype=str)
+
+	for column,values in columns.items():
+		with open(os.path.join(path_tmp,'%s.npy'% column),'wb') as out_file:
+			np.save(out_file,values)
+			out_file.flush()
+			os.fsync(out_file.fileno())
+
+	os.rename(path_tmp,os.path.join(path,name_chunk))
+
+	return os.path.join(path,name_chunk)
+
+def replaced_chunks(path):
+	'''Names of the chunks replaced by the chunk path'''
+
+	path_replaces = os.path.join(path,'%s.npy'% NAME_REPLACES)
+
+	if not os.path.exists(path_replaces):
+		return set()
+
+	return set([str(name) for name in np.load(path_replaces)])
+
+#---------------------------------------------------------------------------------------#
+#		Store
+#---------------------------------------------------------------------------------------#
+
+class CBSResultsStore:
+	'''Append-only columnar store of the results of many CBS calculations.
+
+	Arguments:
+	----------
+	path: string
+		directory of the store. It is created if it does not exist.
+	chunk_size: int
+		number of appended results after which a chunk is written automatically.
+		Remaining results are written by flush() or close(), at the latest when the interpreter exits.
+
+	Note:
+	-----
+	Results (run CBSplot objects or results of CBSplotBatch) are collected by append()
+	and written by flush() as a new chunk, a directory of .npy files with one column each.
+	Chunks are never changed, hence any number of processes and hosts can write to the same store
+	without locks. All columns are memory-mapped for reading, see chunks(), column() and results().
+	compact() merges all chunks into a single one while holding a lock file of the store.
+	'''
+
+	def __init__(self,path,chunk_size=1000):
+
+		if not isinstance(path,str):
+			raise ValueError('path of the results store must be string!')
+		else:
+			self.path = path
+
+		if not isinstance(chunk_size,int) or chunk_size < 1:
+			raise ValueError('chunk_size must be a positive integer!')
+		else:
+			self.chunk_size = chunk_size
+
+		os.makedirs(self.path,exist_ok=True)
+
+		self._rows = []
+		self._lock = threading.Lock()
+		self._pid  = os.getpid()
+
+		_open_stores.add(self)
+
+	def __getstate__(self):
+		#appended results which have not been written stay with the original object
+		return {'path':self.path,'chunk_size':self.chunk_size}
+
+	def __setstate__(self,state):
+		self.__init__(state['path'],state['chunk_size'])
+
+	def append(self,result):
+		'''Append a run CBSplot object or a result of CBSplotBatch. Failed results are skipped.'''
+
+		values = result_values(result)
+
+		if values is None:
+			return
+
+		with self._lock:
+			self._own_rows().append(values)
+			full = len(self._rows) >= self.chunk_size
+
+		if full:
+			self.flush()
+
+	def flush(self):
+		'''Write all appended results as a new chunk. Returns its path or None if there was nothing to write.'''
+
+		with self._lock:
+			rows,self._rows = self._own_rows(),[]
+
+		if not rows:
+			return None
+
+		return write_chunk(self.path,rows)
+
+	def _own_rows(self):
+		'''Appended results of this process, forked processes do not write the results of their parent'''
+
+		if self._pid != os.getpid():
+			self._rows 	= []
+			self._pid 	= os.getpid()
+
+		return self._rows
+
+	def close(self):
+		'''Write all appended results'''
+
+		return self.flush()
+
+	def __enter__(self):
+
+		return self
+
+	def __exit__(self,exc_type,exc_value,traceback):
+
+		self.close()
+
+	def write(self,results):
+		'''Append many results and write them at once'''
+
+		for result in results:
+			self.append(result)
+
+		return self.flush()
+
+	def chunk_names(self):
+		'''Names of all complete chunks in the order of their creation and the names of the replaced ones.
+
+		Chunks replaced by a chunk of compact() are left out, even if they have not been removed yet.
+		'''
+
+		names 		= sorted([name for name in os.listdir(self.path) if name.startswith(PREFIX_CHUNK)])
+		replaced 	= set()
+
+		for name in names:
+			replaced |= replaced_chunks(os.path.join(self.path,name))
+
+		return [name for name in names if name not in replaced],replaced
+
+	def chunk_paths(self):
+		'''Paths of all current chunks in the order of their creation'''
+
+		return [os.path.join(self.path,name) for name in self.chunk_names()[0]]
+
+	def chunks(self):
+		'''All current chunks as CBSResultsChunk'''
+
+		try:
+			return [CBSResultsChunk(path) for path in self.chunk_paths()]
+		except FileNotFoundError:
+			#the chunks have been replaced by compact() meanwhile
+			return self.chunks()
+
+	def __len__(self):
+
+		return sum([len(chunk) for chunk in self.chunks()])
+
+	def column(self,column):
+		'''Values of a column with one value per result (e.g. Z or red_chi) of all chunks'''
+
+		if column not in COLUMNS_RESULT:
+			raise ValueError('column must be one of %s!'% ', '.join(COLUMNS_RESULT))
+
+		chunks = self.chunks()
+
+		if not chunks:
+			return np.zeros(0)
+
+		return np.concatenate([getattr(chunk,column) for chunk in chunks])
+
+	def results(self,Z=None,N=None):
+		'''All results as dicts as stored by CBSplotBatch, optionally only those of Z and/or N'''
+
+		out_results = []
+
+		for chunk in self.chunks():
+			selected = np.ones(len(chunk),dtype=bool)
+
+			if Z is not None:
+				selected &= chunk.Z == Z
+			if N is not None:
+				selected &= chunk.N == N
+
+			out_results += [chunk.result(num_result) for num_result in np.flatnonzero(selected)]
+
+		return out_results
+
+	def compact(self):
+		'''Merge all chunks into a single one. Chunks written meanwhile are kept.
+
+		The merged chunk lists the chunks it replaces, which are removed afterwards.
+		Readers and later calls ignore replaced chunks which have not been removed,
+		e.g. after a crash, hence no result is ever read twice.
+		'''
+
+		with compact_lock(self.path):
+			names,replaced = self.chunk_names()
+
+			#left over by an interrupted compact()
+			for name in replaced:
+				shutil.rmtree(os.path.join(self.path,name),ignore_errors=True)
+
+			if len(names) < 2:
+				return
+
+			rows 		= []
+			replaces 	= set(names)
+
+			for name in names:
+				chunk 		= CBSResultsChunk(os.path.join(self.path,name))
+				rows 		+= [result_values(chunk.result(num_result)) for num_result in range(len(chunk))]
+				#only replaced chunks which could not be removed are listed again
+				replaces 	|= set([name_replaced for name_replaced in replaced_chunks(chunk.path) 
+							if os.path.exists(os.path.join(self.path,name_replaced))])
+
+			write_chunk(self.path,rows,replaces)
+
+			for name in names:
+				shutil.rmtree(os.path.join(self.path,name),ignore_errors=True)
+
+class compact_lock:
+	'''Exclusive lock of a store held by compact(), released when the context is left.
+
+	Concurrent calls of compact() in other processes or on other hosts wait for the lock,
+	otherwise they would merge the same chunks twice.
+	'''
+
+	def __init__(self,path):
+
+		self.path = os.path.join(path,NAME_LOCK)
+
+	def __enter__(self):
+
+		_compact_threads.acquire()
+
+		try:
+			self._file = open(self.path,'a')
+
+			if fcntl is not None:
+				fcntl.lockf(self._file,fcntl.LOCK_EX)
+		except BaseException:
+			_compact_threads.release()
+			raise
+
+		return self
+
+	def __exit__(self,exc_type,exc_value,traceback):
+
+		#closing the file releases the lock
+		self._file.close()
+		_compact_threads.release()
+
+def shared_store(path):
+	'''The CBSResultsStore of the directory path shared by all objects of this process'''
+
+	key = (os.getpid(),os.path.abspath(path))
+
+	if key not in _shared_stores:
+		_shared_stores[key] = CBSResultsStore(path)
+
+	return _shared_stores[key]
+
+@atexit.register
+def flush_stores():
+	'''Write the appended results of all stores of this process'''
+
+	for store in list(_open_stores):
+		if store._pid == os.getpid():
+			store.flush()
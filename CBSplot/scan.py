@@ -0,0 +1,184 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .CBS_commands import *
+from .native import fit_data,native_quantities
+from .stats import count
+from .process import MAX_COMMAND_LENGTH
+
+#---------------------------------------------------------------------------------------#
+#		Evaluate quantities for many parameter sets
+#---------------------------------------------------------------------------------------#
+
+def split_quantities(values_cbs,in_lists):
+	'''Split values of shape (P,number of quantities) into a dict {keyword:array of shape (P,len(list))}'''
+
+	out_quantities 	= {}
+	num_values 	= 0
+
+	for in_keyword,in_list in in_lists.items():
+		out_quantities[in_keyword] 	= values_cbs[:,num_values:num_values+len(in_list)]
+		num_values 			+= len(in_list)
+
+	return out_quantities
+
+def command_chunks(lengths,max_length):
+	'''Split consecutive blocks of commands with lengths into chunks (start,stop) of at most max_length characters.
+
+	Every chunk contains at least one block.
+	'''
+
+	out_chunks 	= []
+	start 		= 0
+	length_chunk 	= 0
+
+	for num_block,length in enumerate(lengths):
+		if num_block > start and length_chunk+length > max_length:
+			out_chunks.append((start,num_block))
+			start 		= num_block
+			length_chunk 	= 0
+
+		length_chunk += length
+
+	if start < len(lengths):
+		out_chunks.append((start,len(lengths)))
+
+	return out_chunks
+
+def cbs_quantities_many(self,values,in_lists,exact=False):
+	'''CBS predictions for all quantities in in_lists and all parameter sets in values.
+
+	values has shape (P,len(name_fit_params)). Returns a dict {keyword:array of shape (P,len(list))}.
+	With cbsmodel, all parameter sets are evaluated in as few calls as the limit of the command line allows
+	(MAX_COMMAND_LENGTH) or in a single call to the session.
+	Unless exact=True, the surrogate is used for all parameter sets it predicts accurately.
+	'''
+
+	values = np.atleast_2d(values)
+
+	if not exact and self.surrogate is not None and self.surrogate.covers(self.A,self.Z,self.backend,self.name_fit_params):
+		values_cbs,accurate 	= self.surrogate.lookup(values,in_lists,self.surrogate_tol)
+		inaccurate 		= ~np.all(accurate,axis=1)
+
+		count(self,'surrogate_hits',int(np.sum(~inaccurate)))
+
+		if np.any(inaccurate):
+			count(self,'surrogate_fallbacks',int(np.sum(inaccurate)))
+			quantities 		= cbs_quantities_many(self,values[inaccurate],in_lists,exact=True)
+			values_cbs[inaccurate] 	= np.concatenate([quantities[in_keyword] for in_keyword in in_lists],axis=1)
+
+		return split_quantities(values_cbs,in_lists)
+
+	if self.backend == 'numpy':
+		params = {param:values[:,num_param] for num_param,param in enumerate(self.name_fit_params)}
+		return native_quantities(self.A,self.Z,params,in_lists)
+
+	string_quantities 	= ''.join([quantities_string(in_list,in_keyword) for in_keyword,in_list in in_lists.items()])
+	num_quantities 		= sum([len(in_list) for in_list in in_lists.values()])
+
+	header 	= 'A %i Z %i Wu simpleoutput '% (self.A,self.Z)
+
+	#parameters are changed between the blocks of quantities, with enough digits for finite differences
+	blocks 	= [''.join(['%s %.10g '% (param,value) for param,value in zip(self.name_fit_params,values_set)])+string_quantities
+			for values_set in values]
+
+	#without session, the commands are split into several calls to stay below the limit of the command line
+	if self.session is not None:
+		chunks = [(0,len(blocks))]
+	else:
+		chunks = command_chunks([len(block) for block in blocks],MAX_COMMAND_LENGTH-len(header)-len('exit'))
+
+	values_cbs = []
+
+	for start,stop in chunks:
+		output_cbs = run_cbsmodel(self,header+''.join(blocks[start:stop])+'exit')
+		values_cbs.append(extract_cbs_quantities(self,output_cbs,(stop-start)*num_quantities).reshape((stop-start,num_quantities)))
+
+	values_cbs = np.concatenate(values_cbs) if values_cbs else np.zeros((0,num_quantities))
+
+	return split_quantities(values_cbs,in_lists)
+
+#---------------------------------------------------------------------------------------#
+#		Chisquare scan
+#---------------------------------------------------------------------------------------#
+
+def reduced_chi_square(self,values,data=None):
+	'''Reduced chisquare of the CBS fit data for all parameter sets in values'''
+
+	if data is None:
+		data = fit_data(self)
+
+	quantities 	= cbs_quantities_many(self,values,{in_keyword:data[in_keyword][0] for in_keyword in data})
+
+	chi_square 	= sum([np.sum(((quantities[in_keyword]-data[in_keyword][1])/data[in_keyword][2])**2,axis=1)
+				for in_keyword in data])
+	num_dof 	= sum([len(data[in_keyword][1]) for in_keyword in data])-len(self.name_fit_params)
+
+	return chi_square/num_dof if num_dof > 0 else chi_square
+
+def scan_chi_square(self,grid,out_file,chunk_size=1000,max_workers=None):
+	'''Calculate the reduced chisquare on a grid of the fit parameters.
+
+	The results are written to the memory-mapped .npy file out_file.
+	Points which have been calculated before (not NaN) are skipped,
+	hence an interrupted scan is resumed by calling it again with the same out_file.
+	'''
+
+	missing = [param for param in self.name_fit_params if param not in grid]
+
+	if missing or len(grid) != len(self.name_fit_params):
+		raise ValueError('grid must contain exactly the fit parameters %s!'% ' '.join(self.name_fit_params))
+
+	axes 	= [np.asarray(grid[param],dtype=float) for param in self.name_fit_params]
+	shape 	= tuple([len(axis) for axis in axes])
+
+	if os.path.exists(out_file):
+		out_chi = np.lib.format.open_memmap(out_file,mode='r+')
+		if out_chi.shape != shape:
+			raise ValueError('%s contains a scan of shape %s, not %s!'% (out_file,out_chi.shape,shape))
+	else:
+		out_chi 	= np.lib.format.open_memmap(out_file,mode='w+',dtype=float,shape=shape)
+		out_chi[...] 	= np.nan
+		out_chi.flush()
+
+	flat_chi 	= out_chi.reshape(-1)
+	data 		= fit_data(self)
+
+	#only chunks containing missing points are calculated
+	chunks 		= [np.arange(start,min(start+chunk_size,flat_chi.size)) for start in range(0,flat_chi.size,chunk_size)]
+	chunks 		= [chunk for chunk in chunks if np.any(np.isnan(flat_chi[chunk]))]
+
+	def run_chunk(chunk):
+		index 		= np.unravel_index(chunk,shape)
+		values 		= np.stack([axis[index_axis] for axis,index_axis in zip(axes,index)],axis=1)
+
+		flat_chi[chunk] = reduced_chi_square(self,values,data)
+		out_chi.flush()
+
+	with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+		for result in executor.map(run_chunk,chunks):
+			pass
+
+	return out_chi
@@ -0,0 +1,133 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import threading
+
+import numpy as np
+
+#---------------------------------------------------------------------------------------#
+#		General
+#---------------------------------------------------------------------------------------#
+
+#starting values of r_beta tried one after another if no seed is available
+R_BETAS = np.arange(0.1,1,0.2)
+
+#---------------------------------------------------------------------------------------#
+#		Seeds of fits
+#---------------------------------------------------------------------------------------#
+
+class CBSFitSeeds:
+	'''Converged fit parameters of nuclei used as starting values of fits of their neighbours.
+
+	Arguments:
+	----------
+	seeds: dict
+		known fit parameters {(Z,N):{param:value}}, e.g. from earlier calculations
+
+	Note:
+	-----
+	The nearest neighbour is the nucleus with the smallest |Z-Z'|+|N-N'|.
+	For equal distances, isotopes are preferred over isotones.
+	Seeds can be shared by several CBSplot objects and are thread-safe.
+	'''
+
+	def __init__(self,seeds=None):
+
+		self.seeds = {}
+
+		if seeds is not None:
+			for (Z,N),params in seeds.items():
+				self.seeds[(int(Z),int(N))] = {param:float(value) for param,value in params.items()}
+
+		self._lock = threading.Lock()
+
+	def __getstate__(self):
+		state 		= self.__dict__.copy()
+		state['_lock'] 	= None
+		return state
+
+	def __setstate__(self,state):
+		self.__dict__.update(state)
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.seeds)
+
+	def add(self,Z,N,name_fit_params,values):
+		'''Store the converged values of the fit parameters of nucleus (Z,N)'''
+
+		with self._lock:
+			self.seeds[(int(Z),int(N))] = {param:float(value) for param,value in zip(name_fit_params,values)}
+
+	def add_results(self,results):
+		'''Store the fit parameters of all successful results of CBSplotBatch'''
+
+		for result in results:
+			if result is not None and result['success']:
+				Z,N = result['nucleus'][1],result['nucleus'][2]
+				self.add(Z,N,result['name_fit_params'],result['fit_params'][0::2])
+
+	def nearest(self,Z,N):
+		'''Fit parameters of the nearest neighbour of (Z,N) as dict or None if no seed is known'''
+
+		with self._lock:
+			if not self.seeds:
+				return None
+
+			nucleus = min(self.seeds,key=lambda nucl: (abs(nucl[0]-Z)+abs(nucl[1]-N),abs(nucl[0]-Z),nucl))
+
+			return dict(self.seeds[nucleus])
+
+#---------------------------------------------------------------------------------------#
+#		Starting values of fits
+#---------------------------------------------------------------------------------------#
+
+def fit_starts(self):
+	'''Starting values of the fits of the CBSplot object self as list of dicts {param:value}.
+
+	Without seeds, r_beta is taken from R_BETAS. Otherwise the seed of the nearest neighbour
+	is tried first, followed by R_BETAS ordered by their distance to its r_beta.
+	All other seeded fit parameters are used as starting values of every fit.
+	'''
+
+	seed = None if getattr(self,'seeds',None) is None else self.seeds.nearest(self.Z,self.A-self.Z)
+
+	if seed is None:
+		return [{'rb':r_beta} for r_beta in R_BETAS]
+
+	seed_params = {param:value for param,value in seed.items() if param in self.name_fit_params and param != 'rb'}
+
+	if 'rb' in seed:
+		r_betas = [seed['rb']]+sorted(R_BETAS,key=lambda r_beta: abs(r_beta-seed['rb']))
+	else:
+		r_betas = list(R_BETAS)
+
+	return [dict({'rb':r_beta},**seed_params) for r_beta in r_betas]
+
+def start_args(start):
+	'''cbsmodel commands setting the starting values in start'''
+
+	return ['%s %s'% (param,value) for param,value in start.items()]
+
+def remember_fit(self):
+	'''Store the result of a successful fit as seed of the neighbours'''
+
+	if getattr(self,'seeds',None) is not None and self.cbs_fit_success:
+		self.seeds.add(self.Z,self.A-self.Z,self.name_fit_params,self.fit_params[0::2])
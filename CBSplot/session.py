@@ -0,0 +1,311 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import subprocess
+import threading
+import selectors
+import shutil
+import time
+import uuid
+import os
+
+from .errors import CBSTimeoutError,CBSProcessError
+from .process import check_rlimits,process_options,apply_rlimits,kill_process_group
+
+#---------------------------------------------------------------------------------------#
+#		Persistent cbsmodel session
+#---------------------------------------------------------------------------------------#
+
+#number of lines of stderr kept for error messages
+STDERR_LINES 	= 20
+
+def drain(stream,lines):
+	'''Read stream until its end and keep the last lines, so cbsmodel never blocks on a full pipe'''
+
+	try:
+		for line in iter(stream.readline,b''):
+			lines.append(line)
+	except (OSError,ValueError):
+		pass
+
+	try:
+		stream.close()
+	except (OSError,ValueError):
+		pass
+
+class CBSModelSession:
+	'''Long-lived cbsmodel process which is fed with commands over stdin/stdout pipes.
+
+	Arguments:
+	----------
+	executable: string
+		name or path of the cbsmodel executable
+	max_restarts: int
+		number of times a crashed cbsmodel process is restarted for a single command
+		before giving up
+	prompt: string
+		interactive prompt printed by cbsmodel (if any), removed from the output
+	rlimits: dict
+		resource limits {'cpu':seconds,'memory':bytes} of the cbsmodel process.
+		The CPU limit applies to the whole lifetime of the process.
+	startup_timeout: float
+		seconds to wait for cbsmodel to answer the first marker after its start
+
+	Note:
+	-----
+	The end of each response is detected by sending an unknown command containing
+	a unique marker after the actual commands. This relies on cbsmodel answering
+	unknown commands with an error message on stdout which contains the command,
+	this line is the last one read for the response. If the first marker is not echoed
+	within startup_timeout, CBSProcessError is raised since the executable does not
+	behave like cbsmodel. Everything printed before the first marker (the banner) is
+	read once at start-up and kept in banner, the responses only contain the output
+	of the commands. stderr is read separately, its last lines are kept in stderr.
+	cbsmodel keeps its parameters between commands, hence every command has to set
+	all parameters it relies on (as CBSplot does for A, Z and the fit parameters).
+	A session can be shared by several CBSplot objects and is thread-safe.
+	If a command does not finish within its timeout, cbsmodel is killed
+	and restarted with the next command.
+	'''
+
+	def __init__(self,executable='cbsmodel',max_restarts=3,prompt=None,rlimits=None,startup_timeout=10.):
+
+		if not isinstance(executable,str):
+			raise ValueError('executable must be string pointing to cbsmodel!')
+		else:
+			self.executable = executable
+
+		if not isinstance(max_restarts,int) or max_restarts < 0:
+			raise ValueError('max_restarts must be a non-negative integer!')
+		else:
+			self.max_restarts = max_restarts
+
+		if not isinstance(startup_timeout,(int,float)) or startup_timeout <= 0:
+			raise ValueError('startup_timeout must be a positive number!')
+		else:
+			self.startup_timeout = startup_timeout
+
+		self.prompt 	= prompt.encode() if isinstance(prompt,str) else prompt
+		self.rlimits 	= check_rlimits(rlimits)
+
+		self.process 	= None
+		self.banner 	= b''
+		self.stderr 	= collections.deque(maxlen=STDERR_LINES)
+		self.restarts 	= 0
+
+		self._stderr_thread = None
+
+		self._lock 	= threading.Lock()
+		self._token 	= uuid.uuid4().hex
+		self._counter 	= 0
+		self._buffer 	= b''
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		self.close()
+
+	def __del__(self):
+		try:
+			self.close()
+		except Exception:
+			pass
+
+	def __getstate__(self):
+		#processes cannot be transferred to other processes, start a new one there
+		state 			= self.__dict__.copy()
+		state['process'] 	= None
+		state['_lock'] 		= None
+		state['_stderr_thread'] = None
+		return state
+
+	def __setstate__(self,state):
+		self.__dict__.update(state)
+		self._lock = threading.Lock()
+
+	def _command(self):
+		'''Start cbsmodel without a shell, line buffered if possible'''
+
+		command = [self.executable]
+
+		#stdout of cbsmodel is block buffered when connected to a pipe
+		if shutil.which('stdbuf') is not None:
+			command = ['stdbuf','-oL','-eL']+command
+
+		return command
+
+	def _marker(self):
+
+		self._counter += 1
+
+		return ('__CBSplot_%s_%i__'% (self._token,self._counter)).encode()
+
+	def _readline(self,deadline=None):
+		'''Read a line of cbsmodel output, waiting until deadline (time.monotonic) at most'''
+
+		file_out = self.process.stdout.fileno()
+
+		while b'\n' not in self._buffer:
+			if deadline is not None:
+				with selectors.DefaultSelector() as selector:
+					selector.register(file_out,selectors.EVENT_READ)
+					if not selector.select(max(deadline-time.monotonic(),0)):
+						raise TimeoutError
+
+			chunk = os.read(file_out,65536)
+
+			if chunk == b'':
+				line,self._buffer = self._buffer,b''
+				return line
+
+			self._buffer += chunk
+
+		line,_,self._buffer = self._buffer.partition(b'\n')
+
+		return line+b'\n'
+
+	def _communicate(self,commands,timeout=None):
+		'''Send commands followed by a marker and read until the marker is echoed'''
+
+		marker 		= self._marker()
+		deadline 	= None if timeout is None else time.monotonic()+timeout
+
+		self.process.stdin.write(commands+b'\n'+marker+b'\n')
+		self.process.stdin.flush()
+
+		out_lines = []
+
+		while True:
+			line = self._readline(deadline)
+
+			if line == b'':
+				raise BrokenPipeError('cbsmodel terminated unexpectedly.')
+			if marker in line:
+				break
+
+			if self.prompt:
+				line = line.replace(self.prompt,b'')
+
+			out_lines.append(line)
+
+		return b''.join(out_lines)
+
+	def alive(self):
+		'''Check whether the cbsmodel process is running'''
+
+		return self.process is not None and self.process.poll() is None
+
+	def start(self):
+		'''Start the cbsmodel process (if not already running)'''
+
+		if self.alive():
+			return
+
+		self.process = subprocess.Popen(self._command(),stdin=subprocess.PIPE,
+						stdout=subprocess.PIPE,stderr=subprocess.PIPE,
+						**process_options())
+		apply_rlimits(self.process,self.rlimits)
+		self._buffer = b''
+
+		self.stderr 		= collections.deque(maxlen=STDERR_LINES)
+		self._stderr_thread 	= threading.Thread(target=drain,args=(self.process.stderr,self.stderr),daemon=True)
+		self._stderr_thread.start()
+
+		#everything in front of the first marker is printed by cbsmodel on start-up
+		try:
+			self.banner = self._communicate(b'',self.startup_timeout)
+		except TimeoutError:
+			kill_process_group(self.process)
+			self.close()
+			raise CBSProcessError('%s did not answer the end-of-response marker within %g s. '
+						'Sessions require a cbsmodel which answers unknown commands on stdout.'% 
+						(self.executable,self.startup_timeout))
+
+	def close(self):
+		'''Terminate the cbsmodel process'''
+
+		if self.process is None:
+			return
+
+		if self.process.poll() is None:
+			try:
+				self.process.stdin.write(b'exit\n')
+				self.process.stdin.close()
+				self.process.wait(timeout=1)
+			except (OSError,ValueError,subprocess.TimeoutExpired):
+				kill_process_group(self.process)
+				self.process.wait()
+
+		for stream in [self.process.stdin,self.process.stdout]:
+			try:
+				stream.close()
+			except (OSError,ValueError):
+				pass
+
+		#stderr is closed by drain() at its end
+		if self._stderr_thread is not None:
+			self._stderr_thread.join(timeout=1)
+
+		self.process 		= None
+		self._stderr_thread 	= None
+
+	def restart(self):
+		'''Restart the cbsmodel process'''
+
+		self.close()
+		self.start()
+		self.restarts += 1
+
+	def run(self,run_string,timeout=None):
+		'''Run the cbsmodel commands in run_string and return the output as bytes.
+
+		If cbsmodel does not answer within timeout seconds, it is killed and CBSTimeoutError is raised.
+		'''
+
+		#exit would terminate the session
+		commands = ' '.join([command for command in run_string.split() if command != 'exit']).encode()
+
+		with self._lock:
+			for attempt in range(self.max_restarts+1):
+				try:
+					#restart if cbsmodel crashed since the last command
+					if attempt == 0 and (self.process is None or self.alive()):
+						self.start()
+					else:
+						self.restart()
+
+					return self._communicate(commands,timeout)
+
+				except TimeoutError:
+					#a hung cbsmodel is restarted by the next command
+					kill_process_group(self.process)
+					self.close()
+					raise CBSTimeoutError('cbsmodel did not answer within %g s while running `%s`'% 
+								(timeout,' '.join(run_string.split()[:20])))
+
+				except (BrokenPipeError,ConnectionResetError,ValueError):
+					continue
+
+			#the remaining stderr of the crashed process is read before it is reported
+			self.close()
+
+		raise CBSProcessError('cbsmodel crashed %i times while running `%s`!%s'% (self.max_restarts+1,run_string,
+					''.join(['\n'+line.decode(errors='replace').rstrip() for line in self.stderr])))
@@ -0,0 +1,191 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import contextlib
+import threading
+import json
+import time
+import os
+
+#---------------------------------------------------------------------------------------#
+#		Statistics of CBS calculations
+#---------------------------------------------------------------------------------------#
+
+def cpu_times():
+	'''CPU time of this process and of its terminated child processes (cbsmodel)'''
+
+	times = os.times()
+
+	return time.process_time(),times.children_user+times.children_system
+
+class CBSStats:
+	'''Timing of the stages of CBS calculations and counters of cbsmodel calls.
+
+	Arguments:
+	----------
+	hook: callable
+		called as hook(name,values) whenever a stage is finished or a counter is increased,
+		e.g. to forward the statistics to a metrics sink. values is a dict with
+		the keys wall, cpu and cpu_children for stages and value for counters.
+
+	Note:
+	-----
+	Every stage is recorded by its number of calls and the sums of wall time, 
+	CPU time of this process and CPU time of terminated child processes in seconds.
+	The CPU times are measured for the whole process, hence they contain 
+	all threads running at the same time. The same object can be shared by
+	several CBSplot objects, which aggregates their statistics.
+	'''
+
+	def __init__(self,hook=None):
+
+		if hook is not None and not callable(hook):
+			raise ValueError('hook must be callable!')
+		else:
+			self.hook = hook
+
+		self.stages 	= {}
+		self.counters 	= {}
+
+		self._lock 	= threading.Lock()
+
+	def __getstate__(self):
+		state 		= self.__dict__.copy()
+		state['_lock'] 	= None
+		return state
+
+	def __setstate__(self,state):
+		self.__dict__.update(state)
+		self._lock = threading.Lock()
+
+	def add_stage(self,name,wall,cpu=0.,cpu_children=0.):
+		'''Record a finished stage'''
+
+		with self._lock:
+			stage = self.stages.setdefault(name,{'calls':0,'wall':0.,'cpu':0.,'cpu_children':0.})
+
+			stage['calls'] 		+= 1
+			stage['wall'] 		+= wall
+			stage['cpu'] 		+= cpu
+			stage['cpu_children'] 	+= cpu_children
+
+		if self.hook is not None:
+			self.hook(name,{'wall':wall,'cpu':cpu,'cpu_children':cpu_children})
+
+	def count(self,name,value=1):
+		'''Increase the counter name by value'''
+
+		with self._lock:
+			self.counters[name] = self.counters.get(name,0)+value
+
+		if self.hook is not None:
+			self.hook(name,{'value':value})
+
+	@contextlib.contextmanager
+	def stage(self,name):
+		'''Context manager recording the time spent in its block as stage name'''
+
+		start_wall 			= time.perf_counter()
+		start_cpu,start_children 	= cpu_times()
+
+		try:
+			yield
+		finally:
+			stop_cpu,stop_children = cpu_times()
+			self.add_stage(name,time.perf_counter()-start_wall,stop_cpu-start_cpu,stop_children-start_children)
+
+	def merge(self,other):
+		'''Add the statistics of other (CBSStats or dict from as_dict) to these'''
+
+		if isinstance(other,CBSStats):
+			other = other.as_dict()
+
+		with self._lock:
+			for name,other_stage in other['stages'].items():
+				stage = self.stages.setdefault(name,{'calls':0,'wall':0.,'cpu':0.,'cpu_children':0.})
+				for key in stage:
+					stage[key] += other_stage[key]
+
+			for name,value in other['counters'].items():
+				self.counters[name] = self.counters.get(name,0)+value
+
+		return self
+
+	def as_dict(self):
+		'''Statistics as dict {'stages':{name:{calls,wall,cpu,cpu_children}},'counters':{name:value}}'''
+
+		with self._lock:
+			return {'stages':{name:dict(stage) for name,stage in self.stages.items()},
+				'counters':dict(self.counters)}
+
+	def to_json(self,**kwargs):
+		'''Statistics as JSON string, kwargs are passed to json.dumps'''
+
+		return json.dumps(self.as_dict(),**kwargs)
+
+	def reset(self):
+		'''Remove all statistics'''
+
+		with self._lock:
+			self.stages 	= {}
+			self.counters 	= {}
+
+	def summary(self):
+		'''Table of all stages and counters as string'''
+
+		stats 	= self.as_dict()
+		output 	= '%-28s %8s %12s %12s %12s\n'% ('stage','calls','wall [s]','cpu [s]','children [s]')
+
+		for name,stage in sorted(stats['stages'].items(),key=lambda item: -item[1]['wall']):
+			output += '%-28s %8i %12.4f %12.4f %12.4f\n'% (name,stage['calls'],stage['wall'],stage['cpu'],stage['cpu_children'])
+
+		for name,value in sorted(stats['counters'].items()):
+			output += '%-28s %8i\n'% (name,value)
+
+		return output
+
+def aggregate_stats(list_stats):
+	'''Aggregate the statistics of many calculations (CBSStats or dicts) into a new CBSStats'''
+
+	out_stats = CBSStats()
+
+	for stats in list_stats:
+		if stats is not None:
+			out_stats.merge(stats)
+
+	return out_stats
+
+#---------------------------------------------------------------------------------------#
+#		Instrumentation of CBSplot objects
+#---------------------------------------------------------------------------------------#
+
+def timed(self,name):
+	'''Record the block as stage name if statistics are enabled for the CBSplot object self'''
+
+	if getattr(self,'stats',None) is None:
+		return contextlib.nullcontext()
+
+	return self.stats.stage(name)
+
+def count(self,name,value=1):
+	'''Increase counter name if statistics are enabled for the CBSplot object self'''
+
+	if getattr(self,'stats',None) is not None:
+		self.stats.count(name,value)
@@ -0,0 +1,291 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Interpolating surrogate of CBS predictions on a grid of the fit parameters.
+
+The predictions of all requested quantities are calculated once on a grid of the fit parameters
+(e.g. rb, Bbm2 and bmax) and stored in a directory containing
+
+	meta.json 	nucleus, backend, parameters, axes of the grid and quantities
+	table.npy 	predictions of shape (len(axis) for all parameters)+(number of quantities,)
+
+Queries are answered by multilinear interpolation in the memory-mapped table.
+The error of the interpolation is estimated from the second differences of the table
+along every axis, (1/2)|f''|(x-x_i)(x_{i+1}-x), summed over all axes.
+'''
+
+import itertools
+import uuid
+import json
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .scan import cbs_quantities_many
+
+#---------------------------------------------------------------------------------------#
+#		General
+#---------------------------------------------------------------------------------------#
+
+SURROGATE_VERSION 	= 1
+
+#relative error of the surrogate up to which its predictions are used instead of exact ones
+SURROGATE_TOL 		= 1e-3
+
+#absolute error always accepted, otherwise predictions close to 0 (e.g. energy 0 0) are never used
+SURROGATE_ATOL 		= 1e-6
+
+def quantity_keys(in_lists):
+	'''Keys (keyword,(L,s,...)) of all quantities in in_lists in their order'''
+
+	return [(in_keyword,tuple([int(i) for i in quantity])) for in_keyword,in_list in in_lists.items() for quantity in in_list]
+
+#---------------------------------------------------------------------------------------#
+#		Surrogate
+#---------------------------------------------------------------------------------------#
+
+class CBSSurrogate:
+	'''Interpolating surrogate of CBS predictions stored by build_surrogate().
+
+	Arguments:
+	----------
+	path: string
+		directory containing meta.json and table.npy
+
+	Note:
+	-----
+	The table is memory-mapped, hence only the parts needed for queries are read.
+	Points outside of the grid and points whose neighbours have not been calculated
+	(interrupted build) have the value NaN and an infinite error.
+	'''
+
+	def __init__(self,path):
+
+		if not isinstance(path,str):
+			raise ValueError('path of the surrogate must be string!')
+		else:
+			self.path = path
+
+		with open(os.path.join(path,'meta.json')) as meta_file:
+			meta = json.load(meta_file)
+
+		if meta['version'] != SURROGATE_VERSION:
+			raise ValueError('%s contains a surrogate of version %i, not %i!'% (path,meta['version'],SURROGATE_VERSION))
+
+		self.A 			= meta['A']
+		self.Z 			= meta['Z']
+		self.backend 		= meta['backend']
+		self.name_params 	= meta['params']
+		self.axes 		= [np.array(axis,dtype=float) for axis in meta['axes']]
+		self.keys 		= [(in_keyword,tuple(quantity)) for in_keyword,quantity in meta['quantities']]
+		self.columns 		= {key:num_key for num_key,key in enumerate(self.keys)}
+
+		self.shape 		= tuple([len(axis) for axis in self.axes])
+		self.table 		= np.load(os.path.join(path,'table.npy'),mmap_mode='r')
+
+		#plain views of the mapped table avoid the overhead of np.memmap in every query
+		self._flat 		= self.table.view(np.ndarray).reshape((-1,len(self.keys)))
+		self._strides 		= np.array([int(np.prod(self.shape[num_axis+1:])) for num_axis in range(len(self.shape))],dtype=np.intp)
+
+		#axes and widths of the cells padded to the same length, so that all axes are indexed at once
+		len_axes 		= max(self.shape)
+		self._points 		= np.array([np.pad(axis,(0,len_axes-len(axis)),mode='edge') for axis in self.axes])
+		self._widths 		= np.diff(self._points,axis=1)
+		self._last 		= np.array(self.shape,dtype=np.intp)-1
+		self._numbers 		= np.arange(len(self.axes))
+
+		#offsets of the corners of a cell and of the second differences along every axis
+		self._corners 		= np.array(list(itertools.product((0,1),repeat=len(self.axes))),dtype=np.intp)
+		self._stencils 		= np.array([shift*np.eye(len(self.axes),dtype=np.intp)[num_axis] 
+						for num_axis in range(len(self.axes)) for shift in (-1,0,1)])
+
+	def __getstate__(self):
+		#the table is mapped again instead of being copied
+		return {'path':self.path}
+
+	def __setstate__(self,state):
+		self.__init__(state['path'])
+
+	def covers(self,A,Z,backend,name_params):
+		'''Check whether the surrogate has been built for this nucleus, backend and fit parameters'''
+
+		return (self.A,self.Z,self.backend,list(self.name_params)) == (A,Z,backend,list(name_params))
+
+	def _gather(self,nodes,columns):
+		'''Table values at the grid nodes (...,number of parameters) for all columns'''
+
+		rows = self._flat[nodes @ self._strides]
+
+		return rows if columns is None else rows[...,columns]
+
+	def evaluate(self,values,columns=None):
+		'''Interpolated predictions and their estimated errors for the parameter sets in values.
+
+		values has shape (P,len(name_params)). Returns two arrays of shape (P,len(columns)),
+		columns are the numbers of the quantities in self.keys (default: all).
+		'''
+
+		values = np.atleast_2d(np.asarray(values,dtype=float))
+
+		if values.shape[1] != len(self.axes):
+			raise ValueError('values must contain the parameters %s!'% ' '.join(self.name_params))
+
+		if columns is not None:
+			columns = np.asarray(columns,dtype=np.intp)
+
+		#cell of every point and the position within it, points outside of the grid have frac outside of [0,1]
+		index = np.stack([np.searchsorted(axis,values[:,num_axis],side='right')-1 for num_axis,axis in enumerate(self.axes)],axis=1)
+		index = np.minimum(np.maximum(index,0),self._last-1)
+		width = self._widths[self._numbers,index]
+		frac  = (values-self._points[self._numbers,index])/width
+
+		inside 	= np.all((frac >= 0) & (frac <= 1),axis=1)
+		frac 	= np.minimum(np.maximum(frac,0),1)
+
+		#nodes of the second differences around the nearest node, not at the border of the grid
+		center 	= np.minimum(np.maximum(index+(frac >= 0.5),1),self._last-1)
+
+		f_nodes = self._gather(np.concatenate([index[None,:,:]+self._corners[:,None,:],
+						center[None,:,:]+self._stencils[:,None,:]]),columns)
+
+		f_corners 	= f_nodes[:len(self._corners)]
+		f_stencils 	= f_nodes[len(self._corners):].reshape((len(self.axes),3)+f_nodes.shape[1:])
+
+		weights 	= np.prod(np.where(self._corners[:,None,:],frac,1-frac),axis=2)
+		out_values 	= np.einsum('cp,cpq->pq',weights,f_corners)
+
+		#(1/2)|f''|(x-x_i)(x_{i+1}-x) along every axis
+		h_minus 	= self._widths[self._numbers,center-1].T[:,:,None]
+		h_plus 		= self._widths[self._numbers,center].T[:,:,None]
+		curvature 	= 2*((f_stencils[:,2]-f_stencils[:,1])/h_plus-(f_stencils[:,1]-f_stencils[:,0])/h_minus)/(h_plus+h_minus)
+		out_errors 	= 0.5*np.einsum('dpq,pd->pq',np.abs(curvature),width**2*frac*(1-frac))
+
+		out_values[~inside] 	= np.nan
+		out_errors[~inside] 	= np.inf
+
+		return out_values,out_errors
+
+	def lookup(self,values,in_lists,tol=SURROGATE_TOL,atol=SURROGATE_ATOL):
+		'''Predictions of all quantities in in_lists for the parameter sets in values.
+
+		Returns the predictions of shape (P,number of quantities) in the order of in_lists
+		and whether their estimated error is at most tol*|prediction|+atol.
+		Quantities not contained in the surrogate are never accurate.
+		'''
+
+		values 		= np.atleast_2d(values)
+		columns 	= np.array([self.columns.get(key,-1) for key in quantity_keys(in_lists)],dtype=np.intp)
+		known 		= columns >= 0
+
+		out_values 	= np.full((len(values),len(columns)),np.nan)
+		accurate 	= np.zeros((len(values),len(columns)),dtype=bool)
+
+		if np.any(known):
+			values_known,errors_known 	= self.evaluate(values,columns[known])
+			out_values[:,known] 		= values_known
+			accurate[:,known] 		= errors_known <= tol*np.abs(values_known)+atol
+
+		return out_values,accurate
+
+#---------------------------------------------------------------------------------------#
+#		Build
+#---------------------------------------------------------------------------------------#
+
+def write_meta(path,meta):
+	'''Write meta.json atomically'''
+
+	tmp_file = os.path.join(path,'.meta.%s.tmp'% uuid.uuid4().hex)
+
+	with open(tmp_file,'w') as meta_file:
+		json.dump(meta,meta_file,indent=1)
+
+	os.replace(tmp_file,os.path.join(path,'meta.json'))
+
+def build_surrogate(self,path,grid,in_lists,chunk_size=1000,max_workers=None):
+	'''Calculate the predictions of all quantities in in_lists on a grid of the fit parameters.
+
+	The surrogate is stored in the directory path. Grid points which have been calculated
+	before are skipped, hence an interrupted build is resumed by calling it again.
+	Returns the CBSSurrogate.
+	'''
+
+	missing = [param for param in self.name_fit_params if param not in grid]
+
+	if missing or len(grid) != len(self.name_fit_params):
+		raise ValueError('grid must contain exactly the fit parameters %s!'% ' '.join(self.name_fit_params))
+
+	axes = [np.asarray(grid[param],dtype=float) for param in self.name_fit_params]
+
+	for param,axis in zip(self.name_fit_params,axes):
+		if axis.ndim != 1 or len(axis) < 3 or np.any(np.diff(axis) <= 0):
+			raise ValueError('grid of %s must contain at least 3 increasing values!'% param)
+
+	in_lists 	= {in_keyword:np.asarray(in_list,dtype=int) for in_keyword,in_list in in_lists.items() if len(in_list) > 0}
+	keys 		= quantity_keys(in_lists)
+
+	if not keys:
+		raise ValueError('No quantities given for the surrogate!')
+
+	meta = {'version':SURROGATE_VERSION,
+		'A':self.A,
+		'Z':self.Z,
+		'backend':self.backend,
+		'params':list(self.name_fit_params),
+		'axes':[axis.tolist() for axis in axes],
+		'quantities':[[in_keyword,list(quantity)] for in_keyword,quantity in keys]}
+
+	shape 		= tuple([len(axis) for axis in axes])+(len(keys),)
+	table_file 	= os.path.join(path,'table.npy')
+
+	os.makedirs(path,exist_ok=True)
+
+	if os.path.exists(os.path.join(path,'meta.json')):
+		with open(os.path.join(path,'meta.json')) as meta_file:
+			if json.load(meta_file) != meta:
+				raise ValueError('%s contains a surrogate of different nucleus, parameters, grid or quantities!'% path)
+		table = np.lib.format.open_memmap(table_file,mode='r+')
+	else:
+		table 		= np.lib.format.open_memmap(table_file,mode='w+',dtype=float,shape=shape)
+		table[...] 	= np.nan
+		table.flush()
+		write_meta(path,meta)
+
+	flat_table = table.reshape((-1,len(keys)))
+
+	#only chunks containing missing points are calculated
+	chunks 	= [np.arange(start,min(start+chunk_size,len(flat_table))) for start in range(0,len(flat_table),chunk_size)]
+	chunks 	= [chunk for chunk in chunks if np.any(np.isnan(flat_table[chunk]))]
+
+	def run_chunk(chunk):
+		index 		= np.unravel_index(chunk,shape[:-1])
+		values 		= np.stack([axis[index_axis] for axis,index_axis in zip(axes,index)],axis=1)
+		quantities 	= cbs_quantities_many(self,values,in_lists,exact=True)
+
+		flat_table[chunk] = np.concatenate([quantities[in_keyword] for in_keyword in in_lists],axis=1)
+		table.flush()
+
+	with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+		for result in executor.map(run_chunk,chunks):
+			pass
+
+	del flat_table,table
+
+	return CBSSurrogate(path)
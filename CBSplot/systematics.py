@@ -0,0 +1,332 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Systematics of CBS results of many nuclei.
+
+The results are reduced to a table with one row per nucleus first,
+every series (e.g. an isotopic chain) is then drawn as a few array-backed collections,
+so that figures of hundreds of nuclei stay small and fast.
+'''
+
+import numpy as np
+
+from matplotlib import rcParams
+from matplotlib.collections import LineCollection,PathCollection
+from matplotlib.markers import MarkerStyle
+from matplotlib.transforms import IdentityTransform
+
+from .CBSplot import PLOT_FORMATS
+from .parsers import read_data_file,as_columns
+from .plots import new_figure,save_figure
+
+#---------------------------------------------------------------------------------------#
+#		General
+#---------------------------------------------------------------------------------------#
+
+#Quantities derived from the calculated levels and transitions
+
+SYSTEMATICS_QUANTITIES 	= ('R42','BE2_ratio','rho2E0')
+
+LABELS_SYSTEMATICS 	= {'R42':r'$E(4^+_1)/E(2^+_1)$',
+			'BE2_ratio':r'$B(E2;4^+_1\to2^+_1)/B(E2;2^+_1\to0^+_1)$',
+			'rho2E0':r'$\rho^2(E0;0^+_2\to0^+_1)$',
+			'rb':r'$r_\beta$',
+			'Bbm2':r'$B\beta_M^2$',
+			'bmax':r'$\beta_M$'}
+
+#Series
+
+MAX_LEGEND 		= 20
+MARKER_SIZE 		= 16
+MARKER_CBS 		= MarkerStyle('o').get_path().transformed(MarkerStyle('o').get_transform())
+MARKER_EXP 		= MarkerStyle('s').get_path().transformed(MarkerStyle('s').get_transform())
+
+#---------------------------------------------------------------------------------------#
+#		Table
+#---------------------------------------------------------------------------------------#
+
+def level_value(energies,L,s):
+	'''Energy of the level (L,s) in an array with the columns (L,s,value,...) or NaN'''
+
+	energies = np.asarray(energies,dtype=float)
+
+	if energies.ndim != 2 or len(energies) == 0:
+		return np.nan
+
+	match = (energies[:,0] == L) & (energies[:,1] == s)
+
+	return energies[match,2][0] if np.any(match) else np.nan
+
+def transition_value(transitions,L1,s1,L2,s2):
+	'''Value of the transition (L1,s1) -> (L2,s2) in an array with the columns (L1,s1,L2,s2,value,...) or NaN'''
+
+	transitions = np.asarray(transitions,dtype=float)
+
+	if transitions.ndim != 2 or len(transitions) == 0:
+		return np.nan
+
+	match = ((transitions[:,0] == L1) & (transitions[:,1] == s1) & 
+		(transitions[:,2] == L2) & (transitions[:,3] == s2))
+
+	return transitions[match,4][0] if np.any(match) else np.nan
+
+def derived_quantities(energies,BE2,rho2E0):
+	'''E(4+)/E(2+), B(E2;4+ -> 2+)/B(E2;2+ -> 0+) and rho2E0(0+_2 -> 0+_1) of the yrast band'''
+
+	#energies are taken relative to the ground state if it is given
+	ground 		= np.nan_to_num(level_value(energies,0,0))
+
+	with np.errstate(divide='ignore',invalid='ignore'):
+		R42 		= (level_value(energies,4,0)-ground)/(level_value(energies,2,0)-ground)
+		BE2_ratio 	= transition_value(BE2,4,0,2,0)/transition_value(BE2,2,0,0,0)
+
+	return R42,BE2_ratio,transition_value(rho2E0,0,1,0,0)
+
+def as_result(cbs):
+	'''Convert a CBSplot object into the dict of its results as stored by CBSplotBatch'''
+
+	if isinstance(cbs,dict):
+		return cbs
+
+	fit_params = getattr(cbs,'fit_params',None)
+
+	return {'nucleus':[cbs.nucl_name,cbs.Z,cbs.A-cbs.Z],
+		'exp_data_file':cbs.exp_data_file,
+		'success':fit_params is not None,
+		'name_fit_params':getattr(cbs,'name_fit_params',None),
+		'fit_params':fit_params,
+		'cbs_energies':cbs.cbs_energies,
+		'cbs_BE2':cbs.cbs_BE2,
+		'cbs_rho2E0':cbs.cbs_rho2E0}
+
+def systematics_dtype(params):
+	'''dtype of the table of systematics with the fit parameters params and their uncertainties'''
+
+	fields  = [('name','U8'),('Z',int),('N',int)]
+	fields += [(quantity,float) for quantity in SYSTEMATICS_QUANTITIES]
+	fields += sum([[(param,float),('%s_err'% param,float)] for param in params],[])
+
+	return np.dtype(fields)
+
+def systematics_table(results,params=('rb',),experiment=None):
+	'''Table of the systematics of many nuclei.
+
+	results is a list of results of CBSplotBatch (or CBSJobQueue) or of run CBSplot objects.
+	Returns a structured array with one row per successful result and the fields name, Z, N,
+	R42, BE2_ratio, rho2E0 and every fit parameter in params with its uncertainty (e.g. rb, rb_err).
+	Missing values are NaN. With experiment=True, the experimental values are read from the
+	exp_data_file of every result and with a CBSDataStore from the store instead. In this case,
+	the experimental table (fit parameters are NaN) is returned as well.
+	'''
+
+	results = [as_result(result) for result in results]
+	results = [result for result in results if result is not None and result['success']]
+
+	with_exp 	= experiment is not None and experiment is not False
+
+	rows 		= []
+	exp_rows 	= []
+
+	for result in results:
+		name,Z,N = result['nucleus']
+
+		#fit parameters are stored as value, uncertainty of every parameter
+		values_params = []
+
+		for param in params:
+			if param in (result['name_fit_params'] or []):
+				num_param 	= result['name_fit_params'].index(param)
+				values_params  += [result['fit_params'][2*num_param],result['fit_params'][2*num_param+1]]
+			else:
+				values_params  += [np.nan,np.nan]
+
+		rows.append((name,Z,N)+derived_quantities(result['cbs_energies'],result['cbs_BE2'],result['cbs_rho2E0'])
+				+tuple(values_params))
+
+		if not with_exp:
+			continue
+
+		if experiment is True:
+			exp_data = read_data_file(result['exp_data_file']) if result['exp_data_file'] is not None else None
+		else:
+			exp_data = experiment.read(Z,N) if (Z,N) in experiment else None
+
+		values_exp = derived_quantities(*[as_columns(data) for data in exp_data]) if exp_data is not None else (np.nan,)*3
+
+		exp_rows.append((name,Z,N)+values_exp+(np.nan,)*(2*len(params)))
+
+	out_table = np.array(rows,dtype=systematics_dtype(params))
+
+	if not with_exp:
+		return out_table
+
+	exp_table = np.array(exp_rows,dtype=systematics_dtype(params))
+
+	return out_table,exp_table
+
+#---------------------------------------------------------------------------------------#
+#		Plot
+#---------------------------------------------------------------------------------------#
+
+def series_of(table,x):
+	'''Indices of the rows of every series sorted along x.
+
+	Series are isotopic chains (same Z) for x='N' and isotonic chains (same N) for x='Z'.
+	'''
+
+	group 	= 'Z' if x == 'N' else 'N'
+	order 	= np.lexsort((table[x],table[group]))
+	keys,starts = np.unique(table[group][order],return_index=True)
+
+	return keys,np.split(order,starts[1:])
+
+def series_label(table,indices,x):
+	'''Legend label of a series'''
+
+	if x == 'N':
+		return '%s (Z = %i)'% (table['name'][indices[0]],table['Z'][indices[0]])
+
+	return 'N = %i'% table['N'][indices[0]]
+
+def draw_series(ax,x_values,y_values,y_errors,color,label,exp=False):
+	'''Draw a single series as one PathCollection of markers and one LineCollection of lines and error bars.
+
+	The data limits are not updated, see plot_systematics().
+	'''
+
+	valid = np.isfinite(y_values)
+
+	x_values,y_values = x_values[valid],y_values[valid]
+
+	if len(x_values) == 0:
+		return
+
+	#experimental values are drawn as open markers without lines
+	if exp:
+		ax.add_collection(PathCollection([MARKER_EXP],sizes=[MARKER_SIZE],offsets=np.column_stack((x_values,y_values)),
+					offset_transform=ax.transData,transform=IdentityTransform(),facecolors='none',edgecolors=color,zorder=3),autolim=False)
+		return
+
+	ax.add_collection(PathCollection([MARKER_CBS],sizes=[MARKER_SIZE],offsets=np.column_stack((x_values,y_values)),
+				offset_transform=ax.transData,transform=IdentityTransform(),facecolors=color,edgecolors=color,label=label,zorder=3),autolim=False)
+
+	segments = [np.column_stack((x_values,y_values))]
+
+	if y_errors is not None:
+		y_errors = np.nan_to_num(y_errors[valid])
+		errors 	 = np.empty((len(x_values),2,2))
+
+		errors[:,:,0] 	= x_values[:,None]
+		errors[:,0,1] 	= y_values-y_errors
+		errors[:,1,1] 	= y_values+y_errors
+
+		segments += list(errors[y_errors > 0])
+
+	ax.add_collection(LineCollection(segments,colors=color,linewidths=1),autolim=False)
+
+def plot_systematics(results,x='N',quantities=('R42','BE2_ratio','rho2E0','rb'),experiment=None,
+			headless=False,out_format='pdf',to_bytes=False,out_file=None):
+	'''Plot quantities of many nuclei against N or Z.
+
+	Arguments:
+	----------
+	results: list or array
+		results of CBSplotBatch, run CBSplot objects or a table of systematics_table()
+	x: string
+		'N' for isotopic chains or 'Z' for isotonic chains
+	quantities: list
+		one panel per quantity: R42, BE2_ratio, rho2E0 or the name of a fit parameter (with error bars)
+	experiment: bool or CBSDataStore
+		experimental values are added as open markers, see systematics_table()
+	headless, out_format, to_bytes:
+		as in CBSplot.plot()
+	out_file: string
+		path of the plot, defaults to systematics_<x>.<out_format>
+
+	Returns the path or the contents of the plot.
+	'''
+
+	if x not in ['N','Z']:
+		raise ValueError('x must be N or Z!')
+
+	if len(quantities) == 0:
+		raise ValueError('quantities must contain at least one quantity!')
+
+	if out_format not in PLOT_FORMATS:
+		raise ValueError('out_format must be one of %s!'% ', '.join(PLOT_FORMATS))
+
+	params = [quantity for quantity in quantities if quantity not in SYSTEMATICS_QUANTITIES]
+
+	if isinstance(results,np.ndarray):
+		table,exp_table = results,None
+	elif experiment is None or experiment is False:
+		table,exp_table = systematics_table(results,params),None
+	else:
+		table,exp_table = systematics_table(results,params,experiment)
+
+	if len(table) == 0:
+		raise ValueError('No successful results to plot!')
+
+	missing = [quantity for quantity in quantities if quantity not in table.dtype.names]
+
+	if missing:
+		raise ValueError('quantities %s are not in the table!'% ' '.join(missing))
+
+	fig,axes = new_figure(headless,len(quantities),1,figsize=(8,2.5*len(quantities)+1),sharex=True,squeeze=False)
+
+	keys,series 	= series_of(table,x)
+	colors 		= rcParams['axes.prop_cycle'].by_key()['color']
+
+	for ax,quantity in zip(axes[:,0],quantities):
+		for num_series,indices in enumerate(series):
+			color 	= colors[num_series % len(colors)]
+			errors 	= table['%s_err'% quantity][indices] if quantity in params else None
+
+			draw_series(ax,table[x][indices].astype(float),table[quantity][indices],errors,color,
+					series_label(table,indices,x))
+
+			if exp_table is not None and quantity in SYSTEMATICS_QUANTITIES:
+				draw_series(ax,table[x][indices].astype(float),exp_table[quantity][indices],None,color,None,True)
+
+		#the data limits are set once for all series
+		values 	= np.column_stack((table[x],table[quantity]))
+
+		if exp_table is not None and quantity in SYSTEMATICS_QUANTITIES:
+			values = np.concatenate((values,np.column_stack((table[x],exp_table[quantity]))))
+
+		if quantity in params:
+			errors = np.nan_to_num(table['%s_err'% quantity])
+			values = np.concatenate((values,np.column_stack((table[x],table[quantity]-errors)),
+						np.column_stack((table[x],table[quantity]+errors))))
+
+		ax.update_datalim(values[np.all(np.isfinite(values),axis=1)])
+		ax.autoscale_view()
+		ax.set_ylabel(LABELS_SYSTEMATICS.get(quantity,quantity))
+
+	axes[-1,0].set_xlabel(x)
+
+	if 0 < len(series) <= MAX_LEGEND:
+		axes[0,0].legend(fontsize='small',ncol=max(1,len(series)//5))
+
+	fig.tight_layout()
+
+	if out_file is None:
+		out_file = 'systematics_%s.%s'% (x,out_format)
+
+	return save_figure(fig,headless,out_format,to_bytes,out_file)
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+'''Benchmarks of CBSplot with the deterministic fake cbsmodel on PATH.
+
+Usage:
+------
+python benchmarks/run_benchmarks.py [--quick] [--filter NAME] [--repeat N]
+					[--baseline FILE] [--save-baseline] [--threshold RATIO]
+					[--import-budget SECONDS] [--fail-on-regression]
+
+Every benchmark reports the median wall time, the throughput (states, transitions
+or nuclei per second) and the peak memory allocated by Python (tracemalloc).
+The median times are compared with the stored baseline (baseline.json),
+which has to be recreated with --save-baseline when the machine changes.
+'''
+
+import subprocess
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import shutil
+import json
+import time
+import sys
+import os
+
+PATH_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+FILE_BASELINE 	= os.path.join(PATH_BENCHMARKS,'baseline.json')
+
+#`import CBSplot` must not take longer (s) and must not import these modules
+IMPORT_BUDGET 	= 0.5
+HEAVY_MODULES 	= ['matplotlib','uncertainties','scipy']
+
+sys.path.insert(0,os.path.dirname(PATH_BENCHMARKS))
+
+import numpy as np
+
+import CBSplot as cbs
+
+from CBSplot.CBS_commands import main_cbs_calculations,extract_params,read_input
+from CBSplot.plots import load_experiment,plot_comparison
+from CBSplot.systematics import plot_systematics
+from CBSplot.parsers import sidecar_file,sidecar_path
+
+#---------------------------------------------------------------------------------------#
+#		Fake cbsmodel
+#---------------------------------------------------------------------------------------#
+
+def install_fake_cbsmodel(path):
+	'''Put the fake cbsmodel on PATH as `cbsmodel`'''
+
+	os.symlink(os.path.join(PATH_BENCHMARKS,'fake_cbsmodel'),os.path.join(path,'cbsmodel'))
+
+	os.environ['PATH'] = path+os.pathsep+os.environ.get('PATH','')
+
+	#fits starting at r_beta = 0.1 fail, which exercises a retry
+	os.environ.setdefault('FAKE_CBSMODEL_FAIL','0.1:1')
+	os.environ.setdefault('FAKE_CBSMODEL_LATENCY','0')
+
+#---------------------------------------------------------------------------------------#
+#		Synthetic nuclei
+#---------------------------------------------------------------------------------------#
+
+def synthetic_states(num_states):
+	'''Levels (L,s) of a ground and a beta band with num_states levels in total'''
+
+	return [(2*num_L,s) for num_L in range(num_states) for s in range(2)][:num_states]
+
+def write_nucleus(path,name,num_states):
+	'''Write input file, fit data and plot data of a synthetic nucleus.
+
+	Returns (input_file,exp_data_file) and the number of requested quantities.
+	'''
+
+	states 		= synthetic_states(num_states)
+	transitions 	= [(L,s,L-2,s) for L,s in states if L > 0]
+
+	input_file 	= os.path.join(path,'input_%s.cbs'% name)
+	fit_file 	= os.path.join(path,'fit_%s.ET'% name)
+	exp_data_file 	= os.path.join(path,'plot_%s.ET'% name)
+
+	lines_fit 	= ['E %i %i %.1f 1'% (L,s,30*L*(L+1)/6+1000*s) for L,s in states[:6]]
+	lines_fit 	+= ['T %i %i %i %i %.1f 5'% (L1,s1,L2,s2,150+L1) for L1,s1,L2,s2 in transitions[:3]]
+
+	lines_exp 	= ['E %i %i %.1f 1'% (L,s,30*L*(L+1)/6+1000*s) for L,s in states]
+	lines_exp 	+= ['T %i %i %i %i %.1f 5'% (L1,s1,L2,s2,150+L1) for L1,s1,L2,s2 in transitions]
+
+	lines_input 	= ['A 154','Z 62','','Wu','','fit %s rb Bbm2 bmax'% fit_file,'']
+	lines_input 	+= ['energy %i %i'% state for state in states]
+	lines_input 	+= ['BE2 %i %i %i %i'% transition for transition in transitions]
+
+	if (0,1) in states:
+		lines_exp.append('T 0 1 0 0 50 5')
+		lines_input.append('rho2E0 0 1 0 0')
+
+	lines_input.append('exit')
+
+	for out_file,lines in [(input_file,lines_input),(fit_file,lines_fit),(exp_data_file,lines_exp)]:
+		with open(out_file,'w') as data_file:
+			data_file.write('\n'.join(lines)+'\n')
+
+	return (input_file,exp_data_file),len(states)+len(transitions)+((0,1) in states)
+
+def new_cbs(files,name='Sm',**options):
+
+	return cbs.CBSplot(nucleus=[name,62,92],input_file=files[0],exp_data_file=files[1],verbose=False,**options)
+
+def remove_sidecars(cbs_obj,files):
+
+	for in_file in files:
+		try:
+			os.remove(sidecar_file(in_file,sidecar_path(cbs_obj)))
+		except OSError:
+			pass
+
+#---------------------------------------------------------------------------------------#
+#		Measurement
+#---------------------------------------------------------------------------------------#
+
+def measure(name,func,items,repeat,setup=None):
+	'''Median wall time, throughput and peak memory of func'''
+
+	times = []
+
+	for num_repeat in range(repeat):
+		if setup is not None:
+			setup()
+
+		start = time.perf_counter()
+		func()
+		times.append(time.perf_counter()-start)
+
+	#memory is measured separately since tracemalloc slows down the calls
+	if setup is not None:
+		setup()
+
+	tracemalloc.start()
+	func()
+	peak_memory = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	median = float(np.median(times))
+
+	return {'name':name,
+		'items':items,
+		'median':median,
+		'min':float(np.min(times)),
+		'throughput':items/median if median > 0 else float('inf'),
+		'peak_kib':peak_memory/1024}
+
+def import_package(trace_memory=False):
+	'''Import CBSplot in a fresh interpreter.
+
+	Returns the wall time of the import, its peak memory (if trace_memory=True)
+	and the heavy modules imported by it.
+	'''
+
+	code = ('import tracemalloc,time,json,sys\n'
+		'if %r: tracemalloc.start()\n'
+		'start = time.perf_counter()\n'
+		'import CBSplot\n'
+		'wall = time.perf_counter()-start\n'
+		'print(json.dumps([wall,tracemalloc.get_traced_memory()[1],[m for m in %r if m in sys.modules]]))'
+		% (trace_memory,HEAVY_MODULES))
+
+	env 			= dict(os.environ)
+	env['PYTHONPATH'] 	= os.path.dirname(PATH_BENCHMARKS)+os.pathsep+env.get('PYTHONPATH','')
+
+	output = subprocess.run([sys.executable,'-c',code],env=env,check=True,stdout=subprocess.PIPE).stdout
+
+	return json.loads(output)
+
+def measure_import(repeat):
+	'''Median time and peak memory of `import CBSplot` as in measure()'''
+
+	times 		= [import_package()[0] for num_repeat in range(repeat)]
+	_,peak_memory,heavy_modules = import_package(trace_memory=True)
+
+	median = float(np.median(times))
+
+	return {'name':'import[CBSplot]',
+		'items':1,
+		'median':median,
+		'min':float(np.min(times)),
+		'throughput':1/median,
+		'peak_kib':peak_memory/1024,
+		'heavy_modules':heavy_modules}
+
+def synthetic_results(num_nuclei):
+	'''Results of CBSplotBatch for a chart of num_nuclei nuclei with random values'''
+
+	rng 	= np.random.default_rng(0)
+	results = []
+
+	for num_nucleus in range(num_nuclei):
+		Z,N 	= 50+2*(num_nucleus//40),60+num_nucleus % 40
+		E2 	= 80+500*rng.random()
+
+		results.append({'nucleus':['N%i'% Z,Z,N],
+				'success':True,
+				'input_file':None,
+				'exp_data_file':None,
+				'name_fit_params':['rb','Bbm2','bmax'],
+				'fit_params':np.array([rng.random(),0.01,0.03,0.001,0.5,0.01]),
+				'red_chi':1.0,
+				'cbs_energies':np.array([[0,0,0],[2,0,E2],[4,0,E2*(2+1.3*rng.random())]]),
+				'cbs_BE2':np.array([[2,0,0,0,100],[4,0,2,0,100+50*rng.random()]]),
+				'cbs_ME2':np.zeros((0,5)),
+				'cbs_rho2E0':np.array([[0,1,0,0,100*rng.random()]])})
+
+	return results
+
+def benchmarks(path,quick=False):
+	'''Generator of all benchmarks as (name,func,items,setup,repeat_factor)'''
+
+	sizes 		= [10,100] if quick else [10,100,1000]
+	sizes_plot 	= [10,50] if quick else [10,50,200]
+	sizes_nuclei 	= [1,4] if quick else [1,4,16]
+	sizes_chart 	= [100] if quick else [100,500]
+
+	for num_states in sizes:
+		files,num_quantities = write_nucleus(path,'n%i'% num_states,num_states)
+
+		#sidecar files are only used with a cache
+		cbs_obj = new_cbs(files,cache=cbs.CBSCache(os.path.join(path,'cache')))
+
+		yield ('read_input[cold,%i]'% num_states,lambda: read_input(cbs_obj),num_quantities,
+			lambda: remove_sidecars(cbs_obj,files),1)
+		yield ('read_input[warm,%i]'% num_states,lambda: read_input(cbs_obj),num_quantities,None,1)
+
+		cbs_obj.exp_path,cbs_obj.exp_file = os.path.split(files[1])
+		cbs_obj.exp_path 		+= '/'
+
+		yield ('load_experiment[cold,%i]'% num_states,lambda: load_experiment(cbs_obj),num_states,
+			lambda: remove_sidecars(cbs_obj,files),1)
+		yield ('load_experiment[warm,%i]'% num_states,lambda: load_experiment(cbs_obj),num_states,None,1)
+
+		store 		= cbs.CBSDataStore(os.path.join(path,'store_%i.db'% num_states))
+		store.import_file(62,92,files[1])
+		store_obj 	= new_cbs(files,exp_store=store)
+
+		yield ('load_experiment[store,%i]'% num_states,lambda: load_experiment(store_obj),num_states,None,1)
+
+		yield ('main_cbs_calculations[%i]'% num_states,lambda: main_cbs_calculations(cbs_obj),num_quantities,None,0.2)
+
+	files,num_quantities = write_nucleus(path,'fit',10)
+
+	for parallel_fit in [False,True]:
+		cbs_obj = new_cbs(files,parallel_fit=parallel_fit)
+		read_input(cbs_obj)
+
+		yield ('extract_params[parallel_fit=%s]'% parallel_fit,lambda: extract_params(cbs_obj),1,None,0.2)
+
+	with cbs.CBSModelSession() as session:
+		cbs_obj = new_cbs(files,session=session)
+
+		yield ('main_cbs_calculations[session,10]',lambda: main_cbs_calculations(cbs_obj),num_quantities,None,1)
+
+	for num_states in sizes_plot:
+		files,num_quantities = write_nucleus(path,'plot%i'% num_states,num_states)
+
+		cbs_obj = new_cbs(files)
+		cbs_obj.run()
+		cbs_obj.exp_path,cbs_obj.exp_file = os.path.split(files[1])
+		cbs_obj.exp_path 		+= '/'
+
+		yield ('plot_comparison[%i]'% num_states,lambda: plot_comparison(cbs_obj,True,'pdf',True),num_states,None,0.2)
+
+	for num_nuclei in sizes_chart:
+		results = synthetic_results(num_nuclei)
+
+		yield ('plot_systematics[%i]'% num_nuclei,lambda results=results: plot_systematics(results,headless=True,to_bytes=True),
+				num_nuclei,None,0.2)
+
+		#every repetition of the writes adds a chunk, hence the reads use a store of a single chunk
+		store_write 	= cbs.CBSResultsStore(os.path.join(path,'results_write%i'% num_nuclei))
+		store_read 	= cbs.CBSResultsStore(os.path.join(path,'results_read%i'% num_nuclei))
+		store_read.write(results)
+
+		yield ('results_store[write,%i]'% num_nuclei,lambda results=results,store=store_write: store.write(results),num_nuclei,None,1)
+		yield ('results_store[read,%i]'% num_nuclei,lambda store=store_read: store.results(),num_nuclei,None,1)
+
+	for num_nuclei in sizes_nuclei:
+		jobs = []
+
+		for num_nucleus in range(num_nuclei):
+			files,num_quantities = write_nucleus(path,'nucl%i'% num_nucleus,10)
+			jobs.append((['N%i'% num_nucleus,62,92],files[0],files[1]))
+
+		def run_sequential(jobs=jobs):
+			for job in jobs:
+				new_cbs(job[1:],job[0][0]).run()
+
+		yield ('nuclei[sequential,%i]'% num_nuclei,run_sequential,num_nuclei,None,0.2)
+		yield ('nuclei[batch,%i]'% num_nuclei,lambda jobs=jobs: cbs.CBSplotBatch(jobs,verbose=False).run(),num_nuclei,None,0.2)
+
+#---------------------------------------------------------------------------------------#
+#		Report
+#---------------------------------------------------------------------------------------#
+
+def report(results,baseline,threshold):
+	'''Print all results compared with the baseline and return the names of regressions'''
+
+	regressions = []
+
+	print('%-40s %8s %12s %14s %12s %10s'% ('benchmark','items','median [ms]','throughput [1/s]','peak [KiB]','baseline'))
+
+	for result in results:
+		ratio_string = ''
+
+		if result['name'] in baseline:
+			ratio 		= result['median']/baseline[result['name']]['median']
+			ratio_string 	= '%.2fx'% ratio
+
+			if ratio > threshold:
+				ratio_string += ' SLOWER'
+				regressions.append(result['name'])
+
+		print('%-40s %8i %12.3f %14.1f %12.1f %10s'% (result['name'],result['items'],1e3*result['median'],
+			result['throughput'],result['peak_kib'],ratio_string))
+
+	return regressions
+
+def main():
+
+	parser = argparse.ArgumentParser(description='Benchmarks of CBSplot with a fake cbsmodel')
+	parser.add_argument('--quick',action='store_true',help='smaller sizes and fewer repetitions')
+	parser.add_argument('--filter',default='',help='only run benchmarks containing this string')
+	parser.add_argument('--repeat',type=int,default=None,help='repetitions of every benchmark')
+	parser.add_argument('--baseline',default=FILE_BASELINE,help='file of the stored baseline')
+	parser.add_argument('--save-baseline',action='store_true',help='store the results as new baseline')
+	parser.add_argument('--threshold',type=float,default=1.25,help='ratio to the baseline reported as regression')
+	parser.add_argument('--import-budget',type=float,default=IMPORT_BUDGET,help='maximum time of `import CBSplot` in s')
+	parser.add_argument('--fail-on-regression',action='store_true',help='exit with 1 if a regression is found')
+	args = parser.parse_args()
+
+	repeat 	= args.repeat or (5 if args.quick else 20)
+	path 	= tempfile.mkdtemp(prefix='CBSplot_benchmarks_')
+
+	try:
+		install_fake_cbsmodel(path)
+
+		results = []
+
+		if args.filter in 'import[CBSplot]':
+			results.append(measure_import(max(1,repeat//4)))
+
+		for name,func,items,setup,repeat_factor in benchmarks(path,args.quick):
+			if args.filter in name:
+				results.append(measure(name,func,items,max(1,int(repeat*repeat_factor)),setup))
+	finally:
+		shutil.rmtree(path,ignore_errors=True)
+
+	baseline = {}
+
+	if os.path.exists(args.baseline):
+		with open(args.baseline) as in_file:
+			baseline = {result['name']:result for result in json.load(in_file)['results']}
+
+	regressions = report(results,baseline,args.threshold)
+
+	#the import time is compared with a fixed budget as well
+	for result in results:
+		if result['name'] == 'import[CBSplot]':
+			if result['median'] > args.import_budget or result['heavy_modules']:
+				print('import CBSplot takes %.3f s (budget %.3f s) and imports %s'% (result['median'],args.import_budget,
+					', '.join(result['heavy_modules']) or 'no heavy modules'))
+				regressions.append(result['name'])
+
+	if args.save_baseline:
+		with open(args.baseline,'w') as out_file:
+			json.dump({'python':platform.python_version(),
+				'numpy':np.__version__,
+				'machine':platform.machine(),
+				'results':results},out_file,indent=1)
+
+	if regressions and args.fail_on_regression:
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
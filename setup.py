@@ -27,7 +27,8 @@ setup(
         author='Tobias Beck',
         author_email='tbeck@ikp.tu-darmstadt.de',
         #license=None,
-        python_requires='>=3',
+        python_requires='>=3.9',
         packages=['CBSplot'],
         install_requires=['numpy','matplotlib','uncertainties'],
+        extras_require={'native':['scipy']},
 )
@@ -0,0 +1,71 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Fixtures of the tests, which run CBSplot with the fake cbsmodel of the benchmarks'''
+
+import shutil
+import sys
+import os
+
+import pytest
+
+PATH_TESTS 	= os.path.dirname(os.path.abspath(__file__))
+PATH_PACKAGE 	= os.path.dirname(PATH_TESTS)
+PATH_EXAMPLE 	= os.path.join(PATH_PACKAGE,'example')
+
+FILES_EXAMPLE 	= ['input_154Sm.cbs','154Sm.ET','plot_data_154Sm.ET']
+
+sys.path.insert(0,PATH_PACKAGE)
+
+@pytest.fixture(autouse=True)
+def fake_cbsmodel(tmp_path_factory,monkeypatch):
+	'''Put the fake cbsmodel on PATH as `cbsmodel`, fits starting at r_beta = 0.1 fail'''
+
+	path_bin = tmp_path_factory.mktemp('bin')
+
+	os.symlink(os.path.join(PATH_PACKAGE,'benchmarks','fake_cbsmodel'),os.path.join(path_bin,'cbsmodel'))
+
+	monkeypatch.setenv('PATH',str(path_bin)+os.pathsep+os.environ.get('PATH',''))
+	monkeypatch.setenv('FAKE_CBSMODEL_FAIL','0.1:1')
+	monkeypatch.setenv('FAKE_CBSMODEL_LATENCY','0')
+
+	return path_bin
+
+@pytest.fixture
+def example(tmp_path,monkeypatch):
+	'''Copy the 154Sm example into a temporary working directory'''
+
+	for name in FILES_EXAMPLE:
+		shutil.copy(os.path.join(PATH_EXAMPLE,name),tmp_path)
+
+	monkeypatch.chdir(tmp_path)
+
+	return tmp_path
+
+@pytest.fixture
+def new_cbs(example):
+	'''Create a CBSplot object of the 154Sm example'''
+
+	import CBSplot as cbs
+
+	def new_cbs(**options):
+		options.setdefault('verbose',False)
+		return cbs.CBSplot(nucleus=['Sm',62,92],input_file='input_154Sm.cbs',exp_data_file='plot_data_154Sm.ET',**options)
+
+	return new_cbs
@@ -0,0 +1,53 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+
+import numpy as np
+
+import CBSplot as cbs
+
+def test_async_matches_sync(new_cbs):
+	cbs_sync 	= new_cbs()
+	cbs_async 	= new_cbs()
+
+	cbs_sync.run()
+	asyncio.run(cbs_async.run_async())
+
+	assert np.array_equal(cbs_sync.fit_params,cbs_async.fit_params)
+	for quantity in ['cbs_energies','cbs_BE2','cbs_ME2','cbs_rho2E0']:
+		assert np.array_equal(getattr(cbs_sync,quantity),getattr(cbs_async,quantity))
+
+def test_async_rerun_is_incremental(new_cbs):
+	cbs_obj = new_cbs(stats=True)
+
+	asyncio.run(cbs_obj.run_async())
+	asyncio.run(cbs_obj.run_async())
+
+	assert cbs_obj.stats.counters['fits_skipped'] == 1
+	assert cbs_obj.stats.counters['quantities_reused'] == sum([len(quantity) for quantity in
+				[cbs_obj.cbs_energies,cbs_obj.cbs_BE2,cbs_obj.cbs_ME2,cbs_obj.cbs_rho2E0]])
+
+def test_run_many_async(new_cbs):
+	list_cbs 	= [new_cbs(),new_cbs()]
+	status 		= asyncio.run(cbs.run_many_async(list_cbs,max_concurrency=1))
+
+	assert all(status)
+	assert np.array_equal(list_cbs[0].cbs_BE2,list_cbs[1].cbs_BE2)
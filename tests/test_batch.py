@@ -0,0 +1,54 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+import CBSplot as cbs
+from CBSplot.batch import run_job
+
+JOB 		= (['Sm',62,92],'input_154Sm.cbs','plot_data_154Sm.ET')
+JOB_MISSING 	= (['Sm',62,92],'missing.cbs','plot_data_154Sm.ET')
+
+def test_run_job_reports_errors(example):
+	result = run_job(JOB_MISSING,{'stats':True})
+
+	assert not result['success']
+	assert result['error_type'] is not None and 'missing.cbs' in result['error']
+	assert result['fit_params'] is None
+
+	result = run_job(JOB,{})
+
+	assert result['success'] and result['error'] is None
+	assert len(result['cbs_BE2']) > 0
+
+def test_failing_job_does_not_stop_batch(new_cbs,example):
+	batch 	= cbs.CBSplotBatch([JOB,JOB_MISSING,JOB],max_workers=2,verbose=False)
+	results = batch.run()
+
+	assert [result['success'] for result in results] == [True,False,True]
+	assert batch.failed() == [results[1]]
+	assert 'missing.cbs' in results[1]['error']
+
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+
+	for result in [results[0],results[2]]:
+		assert np.array_equal(result['fit_params'],cbs_obj.fit_params)
+		assert np.array_equal(result['cbs_energies'],cbs_obj.cbs_energies)
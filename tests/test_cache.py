@@ -0,0 +1,98 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+
+import CBSplot as cbs
+import CBSplot.cache
+
+def counting_scans(cache,monkeypatch):
+	'''Count the scans of the cache directory'''
+
+	scans 		= []
+	entries 	= cache._entries
+
+	def _entries():
+		scans.append(1)
+		return entries()
+
+	monkeypatch.setattr(cache,'_entries',_entries)
+
+	return scans
+
+def test_put_and_get(tmp_path):
+	cache 	= cbs.CBSCache(str(tmp_path))
+	key 	= cache.key('A 154 Z 62 energy 2 0 exit')
+
+	assert cache.get(key) is None
+
+	cache.put(key,b'simple output\n81.3\n')
+
+	assert cache.get(key) == b'simple output\n81.3\n'
+	assert cache.key('A 154  Z 62 energy 2 0 exit') == key
+
+def test_key_depends_on_data_file(tmp_path):
+	cache 		= cbs.CBSCache(str(tmp_path/'cache'))
+	data_file 	= tmp_path/'154Sm.ET'
+
+	data_file.write_text('E 2 0 82 0.1\n')
+	key 		= cache.key('fit 154Sm.ET rb',[str(data_file)])
+
+	data_file.write_text('E 2 0 81 0.1\n')
+	assert cache.key('fit 154Sm.ET rb',[str(data_file)]) != key
+
+def test_evict_only_above_max_size(tmp_path,monkeypatch):
+	cache 	= cbs.CBSCache(str(tmp_path),max_size=10*100)
+	scans 	= counting_scans(cache,monkeypatch)
+
+	for num_output in range(10):
+		cache.put('%i'% num_output,b'x'*100)
+
+	#only the first write scans the directory
+	assert len(scans) == 1
+
+	cache.put('10',b'x'*100)
+
+	assert len(scans) == 2
+	assert cache.size() <= cache.max_size
+	assert cache.get('10') is not None and cache.get('0') is None
+
+def test_evict_interval(tmp_path,monkeypatch):
+	monkeypatch.setattr(CBSplot.cache,'EVICT_INTERVAL',5)
+
+	cache 	= cbs.CBSCache(str(tmp_path))
+	scans 	= counting_scans(cache,monkeypatch)
+
+	for num_output in range(11):
+		cache.put('%i'% num_output,b'x')
+
+	assert len(scans) == 3
+
+def test_cache_hits(new_cbs,tmp_path):
+	cache 		= cbs.CBSCache(str(tmp_path/'cache'))
+	cbs_first 	= new_cbs(cache=cache)
+	cbs_second 	= new_cbs(cache=cache,stats=True)
+
+	cbs_first.run()
+	cbs_second.run()
+
+	assert cbs_second.stats.counters['cache_hits'] >= 2
+	assert cbs_second.stats.counters.get('subprocesses',0) == 0
+	assert (cbs_first.cbs_BE2 == cbs_second.cbs_BE2).all()
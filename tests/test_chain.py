@@ -0,0 +1,51 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+import CBSplot as cbs
+
+#the members share the input file of 154Sm
+@pytest.mark.filterwarnings('ignore:Mass numbers do not coincide')
+def test_members_hold_global_fit(example):
+	members = [cbs.CBSplot(nucleus=['Sm',62,N],input_file='input_154Sm.cbs',exp_data_file='plot_data_154Sm.ET',
+				verbose=False,stats=True) for N in [90,92,94]]
+
+	for member in members:
+		member.run()
+
+	single_params 	= [member.fit_params.copy() for member in members]
+	fit_retries 	= [member.stats.counters['fit_retries'] for member in members]
+
+	chain 		= cbs.CBSChainFit(members,shared=['Bbm2'],polynomial={'bmax':1},max_workers=1)
+	chain.run()
+
+	for num_member,member in enumerate(members):
+		assert np.array_equal(member.fit_params[0::2],chain.params[num_member])
+		assert np.array_equal(member.fit_params[1::2],chain.errors[num_member])
+		assert np.array_equal(member.fit_result.values,chain.params[num_member])
+		assert member.fit_result.red_chi == member.red_chi == chain.red_chi
+
+		#the quantities are calculated for the global parameters without fitting again
+		assert member.stats.counters['fit_retries'] == fit_retries[num_member]
+
+	assert not all([np.array_equal(params,member.fit_params) for params,member in zip(single_params,members)])
+	assert np.ptp([member.fit_params[2] for member in members]) == 0
@@ -0,0 +1,91 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import pickle
+import os
+
+import numpy as np
+import pytest
+
+import CBSplot as cbs
+
+from CBSplot.parsers import read_data_file
+
+def test_import_and_read(example,tmp_path):
+	store = cbs.CBSDataStore(str(tmp_path/'levels.db'))
+
+	assert store.import_files([(62,92,'plot_data_154Sm.ET'),(62,90,'154Sm.ET')]) == 2
+	assert store.nuclei() == [(62,90),(62,92)]
+	assert (62,92) in store and (62,94) not in store
+
+	for stored,read in zip(store.read(62,92),read_data_file('plot_data_154Sm.ET')):
+		assert np.array_equal(stored,read)
+
+def test_unchanged_files_are_skipped(example,tmp_path):
+	store = cbs.CBSDataStore(str(tmp_path/'levels.db'))
+
+	assert store.import_file(62,92,'plot_data_154Sm.ET')
+	assert not store.import_file(62,92,'plot_data_154Sm.ET')
+	assert store.import_file(62,92,'plot_data_154Sm.ET',force=True)
+
+	with open('plot_data_154Sm.ET','a') as data_file:
+		data_file.write('\nE 12 0 1800 2\n')
+
+	assert store.import_file(62,92,'plot_data_154Sm.ET')
+
+	levels = store.levels(62,92)
+	assert levels[-1]['L'] == 12 and len(levels) == len(read_data_file('plot_data_154Sm.ET')[0])
+
+def test_queries(example,tmp_path):
+	store = cbs.CBSDataStore(str(tmp_path/'levels.db'))
+	store.import_file(62,92,'plot_data_154Sm.ET')
+
+	levels 		= store.levels(62,92,L=2)
+	transitions 	= store.transitions(62,92,'BE2',L=2,s=0)
+
+	assert list(levels['L']) == [2]*len(levels)
+	assert all([(transition['L1'],transition['s1']) == (2,0) or (transition['L2'],transition['s2']) == (2,0)
+			for transition in transitions])
+	assert len(transitions) > 0
+
+	store.remove(62,92)
+
+	assert store.nuclei() == []
+	with pytest.raises(ValueError):
+		store.read(62,92)
+
+def test_pickle(example,tmp_path):
+	store = cbs.CBSDataStore(str(tmp_path/'levels.db'))
+	store.import_file(62,92,'plot_data_154Sm.ET')
+
+	assert pickle.loads(pickle.dumps(store)).nuclei() == [(62,92)]
+
+def test_plot_data_from_store(new_cbs,tmp_path):
+	from CBSplot.plots import load_experiment
+
+	store 		= cbs.CBSDataStore(str(tmp_path/'levels.db'))
+	store.import_file(62,92,'plot_data_154Sm.ET')
+
+	cbs_file 	= new_cbs()
+	cbs_file.exp_path,cbs_file.exp_file = '','plot_data_154Sm.ET'
+	cbs_store 	= new_cbs(exp_store=store)
+
+	for stored,read in zip(load_experiment(cbs_store),load_experiment(cbs_file)):
+		assert np.array_equal(stored,read)
@@ -0,0 +1,98 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+import signal
+import time
+import os
+
+import numpy as np
+
+from CBSplot.distributed import CBSJobQueue,run_worker,start_local_workers
+
+def test_submit_is_idempotent(example):
+	queue 	= CBSJobQueue(str(example/'queue.db'))
+	jobs 	= [(['Sm',62,92],'input_154Sm.cbs','plot_data_154Sm.ET')]
+
+	assert queue.submit(jobs) == queue.submit(jobs)
+	assert queue.counts()['pending'] == 1
+
+def test_job_without_exp_data_file(example):
+	queue 	= CBSJobQueue(str(example/'queue.db'))
+	ids 	= queue.submit([(['Sm',62,92],'input_154Sm.cbs',None),
+				(['Sm',62,92],'input_154Sm.cbs','plot_data_154Sm.ET')])
+
+	assert len(set(ids)) == 2
+	assert queue.submit([(['Sm',62,92],'input_154Sm.cbs',None)]) == ids[:1]
+
+	assert run_worker(str(example/'queue.db'),poll_interval=0.01) == 2
+
+	results = queue.wait(ids,poll_interval=0.01,timeout=10)
+
+	assert [result['success'] for result in results] == [True,True]
+	assert results[0]['exp_data_file'] is None
+	assert np.allclose(results[0]['fit_params'],results[1]['fit_params'])
+
+def test_failed_jobs_are_permanent(example):
+	queue 	= CBSJobQueue(str(example/'queue.db'))
+	ids 	= queue.submit([(['Sm',62,92],'missing.cbs',None)],max_attempts=2)
+
+	run_worker(str(example/'queue.db'),poll_interval=0.01)
+
+	result = queue.wait(ids,poll_interval=0.01,timeout=10)[0]
+
+	assert not result['success']
+	assert queue.counts()['failed'] == 1
+
+def test_worker_writes_results_store(example):
+	from CBSplot.results import CBSResultsStore
+
+	queue 	= CBSJobQueue(str(example/'queue.db'))
+	ids 	= queue.submit([(['Sm',62,92],'input_154Sm.cbs',None)],options={'results_store':str(example/'results')})
+
+	run_worker(str(example/'queue.db'),poll_interval=0.01)
+
+	store = CBSResultsStore(str(example/'results'))
+
+	assert len(store) == 1
+	assert np.array_equal(store.results()[0]['fit_params'],queue.results(ids)[0]['fit_params'])
+
+def test_requeued_job_of_dead_worker(example,monkeypatch):
+	queue 	= CBSJobQueue(str(example/'queue.db'))
+	ids 	= queue.submit([(['Sm',62,92],'input_154Sm.cbs',None)],heartbeat_timeout=1.)
+
+	#the first worker hangs in its fit and is killed
+	monkeypatch.setenv('FAKE_CBSMODEL_LATENCY','30')
+	worker = start_local_workers(str(example/'queue.db'),1,poll_interval=0.01,heartbeat_interval=0.2)[0]
+
+	start = time.monotonic()
+	while queue.counts()['running'] == 0 and time.monotonic()-start < 10:
+		time.sleep(0.01)
+
+	os.kill(worker.pid,signal.SIGKILL)
+	worker.join()
+
+	#the second worker waits until the heartbeat expires and runs the job again
+	monkeypatch.setenv('FAKE_CBSMODEL_LATENCY','0')
+
+	assert run_worker(str(example/'queue.db'),poll_interval=0.05,idle_timeout=0.) == 1
+
+	result = queue.wait(ids,poll_interval=0.01,timeout=10)[0]
+
+	assert result['success']
+	assert queue.counts()['done'] == 1
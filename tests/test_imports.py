@@ -0,0 +1,61 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import subprocess
+import sys
+import os
+
+PATH_PACKAGE 	= os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['matplotlib','scipy','uncertainties']
+
+CHECK_IMPORTS = '''
+import sys
+import CBSplot as cbs
+
+heavy = %r
+
+assert [name for name in heavy if name in sys.modules] == [], 'imported by CBSplot'
+
+cbs_obj = cbs.CBSplot(nucleus=['Sm',62,92],input_file='input_154Sm.cbs',exp_data_file='plot_data_154Sm.ET',verbose=False)
+cbs_obj.run()
+
+assert [name for name in heavy if name in sys.modules] == [], 'imported by run()'
+
+assert cbs.plot_systematics.__module__ == 'CBSplot.systematics'
+assert cbs.Level.__module__ == 'CBSplot.plots'
+assert cbs.plots is sys.modules['CBSplot.plots']
+assert cbs.SYSTEMATICS_QUANTITIES == ('R42','BE2_ratio','rho2E0')
+assert 'matplotlib' in sys.modules and 'uncertainties' in sys.modules
+
+try:
+	cbs.unknown_name
+except AttributeError:
+	pass
+else:
+	raise AssertionError('unknown names must raise AttributeError')
+'''
+
+def test_lazy_imports(example):
+	#a new interpreter, since the tests import matplotlib themselves
+	process = subprocess.run([sys.executable,'-c',CHECK_IMPORTS% HEAVY_MODULES],cwd=str(example),
+				env=dict(os.environ,PYTHONPATH=PATH_PACKAGE),capture_output=True,text=True)
+
+	assert process.returncode == 0,process.stderr
@@ -0,0 +1,91 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+def num_quantities(cbs_obj):
+	return sum([len(quantity) for quantity in [cbs_obj.cbs_energies,cbs_obj.cbs_BE2,cbs_obj.cbs_ME2,cbs_obj.cbs_rho2E0]])
+
+def test_unchanged_rerun(new_cbs):
+	cbs_obj = new_cbs(stats=True)
+	cbs_obj.run()
+
+	subprocesses 	= cbs_obj.stats.counters['subprocesses']
+	cbs_BE2 	= cbs_obj.cbs_BE2.copy()
+
+	cbs_obj.run()
+
+	assert cbs_obj.stats.counters['fits_skipped'] == 1
+	assert cbs_obj.stats.counters['quantities_reused'] == num_quantities(cbs_obj)
+	assert cbs_obj.stats.counters['subprocesses'] == subprocesses
+	assert np.array_equal(cbs_obj.cbs_BE2,cbs_BE2)
+
+def test_new_quantity(new_cbs,example):
+	cbs_obj = new_cbs(stats=True)
+	cbs_obj.run()
+
+	subprocesses 	= cbs_obj.stats.counters['subprocesses']
+	num_before 	= num_quantities(cbs_obj)
+
+	input_file 	= example/'input_154Sm.cbs'
+	input_file.write_text(input_file.read_text().replace('\nexit','\nenergy 8 1\n\nexit'))
+
+	cbs_obj.run()
+
+	assert cbs_obj.stats.counters['fits_skipped'] == 1
+	assert cbs_obj.stats.counters['quantities_reused'] == num_before
+	assert cbs_obj.stats.counters['subprocesses'] == subprocesses+1
+	assert [8,1] in cbs_obj.cbs_energies[:,:2].tolist()
+
+def test_changed_fit_data(new_cbs,example):
+	cbs_obj = new_cbs(stats=True)
+	cbs_obj.run()
+
+	fit_calls 	= cbs_obj.stats.stages['cbs_fit_data']['calls']
+
+	data_file 	= example/'154Sm.ET'
+	data_file.write_text(data_file.read_text().replace('E 4 0 \t267','E 4 0 \t268'))
+
+	cbs_obj.run()
+
+	assert cbs_obj.stats.counters.get('fits_skipped',0) == 0
+	assert cbs_obj.stats.stages['cbs_fit_data']['calls'] > fit_calls
+
+def test_removed_quantities(new_cbs,example):
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+
+	assert len(cbs_obj.cbs_rho2E0) == 1
+
+	input_file 	= example/'input_154Sm.cbs'
+	input_file.write_text(input_file.read_text().replace('rho2E0 0 1 0 0\n',''))
+
+	cbs_obj.run()
+
+	assert len(cbs_obj.cbs_rho2E0) == 0
+	assert len(cbs_obj.cbs_BE2) == 8
+
+	lines 		= input_file.read_text().splitlines()
+	input_file.write_text('\n'.join([line for line in lines if not line.startswith(('energy','BE2'))]))
+
+	cbs_obj.run()
+
+	assert num_quantities(cbs_obj) == 0
+	assert cbs_obj.cbs_energies_bands is None
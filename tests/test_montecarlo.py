@@ -0,0 +1,83 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+import CBSplot.montecarlo
+
+ATTRIBUTES = ['cbs_energies','cbs_BE2','cbs_ME2','cbs_rho2E0']
+
+def bands(cbs_obj):
+	return {attribute:getattr(cbs_obj,'%s_bands'% attribute) for attribute in ATTRIBUTES}
+
+def test_bands_bracket_values(new_cbs):
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+	cbs_obj.propagate_uncertainties(num_samples=200,seed=1)
+
+	for attribute in ATTRIBUTES:
+		values 		= np.asarray(getattr(cbs_obj,attribute))
+		bands_values 	= getattr(cbs_obj,'%s_bands'% attribute)
+
+		assert len(bands_values) == len(values)
+
+		if len(values) > 0:
+			assert np.all(bands_values[:,0] <= values[:,-1]) and np.all(values[:,-1] <= bands_values[:,-1])
+			assert np.all(bands_values[:,0] <= bands_values[:,1]) and np.all(bands_values[:,1] <= bands_values[:,2])
+
+	first = bands(cbs_obj)
+	cbs_obj.propagate_uncertainties(num_samples=200,seed=1)
+
+	assert all([np.array_equal(first[attribute],cbs_obj_bands) for attribute,cbs_obj_bands in bands(cbs_obj).items()])
+
+def test_chunks_give_same_bands(new_cbs,monkeypatch):
+	cbs_obj = new_cbs(stats=True)
+	cbs_obj.run()
+	cbs_obj.propagate_uncertainties(num_samples=100,seed=2)
+
+	single 		= bands(cbs_obj)
+	subprocesses 	= cbs_obj.stats.counters['subprocesses']
+
+	monkeypatch.setattr(CBSplot.montecarlo,'MC_CHUNK',7)
+	cbs_obj.propagate_uncertainties(num_samples=100,seed=2)
+
+	assert cbs_obj.stats.counters['subprocesses'] == subprocesses+15
+
+	assert all([np.array_equal(single[attribute],chunked) for attribute,chunked in bands(cbs_obj).items()])
+
+def test_unchanged_rerun_keeps_bands(new_cbs,example):
+	cbs_obj = new_cbs(stats=True,mc_samples=50)
+	cbs_obj.run()
+
+	first = bands(cbs_obj)
+
+	cbs_obj.run()
+
+	assert cbs_obj.stats.counters['propagations_skipped'] == 1
+	assert cbs_obj.stats.stages['propagate_uncertainties']['calls'] == 1
+	assert all([first[attribute] is rerun for attribute,rerun in bands(cbs_obj).items()])
+
+	input_file 	= example/'input_154Sm.cbs'
+	input_file.write_text(input_file.read_text().replace('\nexit','\nenergy 8 1\n\nexit'))
+
+	cbs_obj.run()
+
+	assert cbs_obj.stats.stages['propagate_uncertainties']['calls'] == 2
+	assert len(cbs_obj.cbs_energies_bands) == len(cbs_obj.cbs_energies)
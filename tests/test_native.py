@@ -0,0 +1,105 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+'''Regression tests of the numpy backend against values calculated by cbsmodel'''
+
+import json
+import sys
+import os
+
+import numpy as np
+import pytest
+
+from CBSplot.native import native_quantities,compare_backends
+
+PATH_REFERENCE 	= os.path.join(os.path.dirname(os.path.abspath(__file__)),'data','cbsmodel_154Sm.json')
+
+#relative tolerances of the energies and of all other quantities and fit parameters
+RTOL_ENERGY 	= 5e-4
+RTOL 		= 1e-4
+
+#cbsmodel answering with the reference values, the fit is not needed
+REFERENCE_CBSMODEL = '''#!%s
+import json
+import sys
+
+reference 	= json.load(open(%r))
+values 		= {(keyword,)+tuple(row[:-1]):row[-1] for keyword in ['energy','BE2','rho2E0'] for row in reference[keyword]}
+tokens 		= sys.argv[1:]
+
+for num_token,token in enumerate(tokens):
+	if token == 'simpleoutput':
+		print('simple output')
+	elif token in ['energy','BE2','rho2E0']:
+		num_states = 2 if token == 'energy' else 4
+		print(values[(token,)+tuple(int(i) for i in tokens[num_token+1:num_token+1+num_states])])
+'''
+
+@pytest.fixture
+def reference():
+	with open(PATH_REFERENCE) as in_file:
+		return json.load(in_file)
+
+@pytest.fixture
+def reference_cbsmodel(tmp_path_factory,monkeypatch):
+	'''Put a cbsmodel printing the reference values on PATH'''
+
+	path_bin = tmp_path_factory.mktemp('reference_bin')
+
+	with open(os.path.join(path_bin,'cbsmodel'),'w') as out_file:
+		out_file.write(REFERENCE_CBSMODEL% (sys.executable,PATH_REFERENCE))
+	os.chmod(os.path.join(path_bin,'cbsmodel'),0o755)
+
+	monkeypatch.setenv('PATH',str(path_bin)+os.pathsep+os.environ['PATH'])
+
+def reference_lists(reference):
+	return {in_keyword:np.array(reference[in_keyword],dtype=float) for in_keyword in ['energy','BE2','rho2E0']}
+
+def test_quantities_match_cbsmodel(reference):
+	params 		= dict(zip(reference['name_fit_params'],reference['fit_params'][0::2]))
+	in_lists 	= reference_lists(reference)
+
+	quantities 	= native_quantities(154,62,params,{in_keyword:in_list[:,:-1].astype(int)
+					for in_keyword,in_list in in_lists.items()})
+
+	for in_keyword,in_list in in_lists.items():
+		np.testing.assert_allclose(quantities[in_keyword][0],in_list[:,-1],
+				rtol=RTOL_ENERGY if in_keyword == 'energy' else RTOL,atol=1e-3)
+
+def test_fit_matches_cbsmodel(new_cbs,reference):
+	cbs_obj = new_cbs(backend='numpy')
+	cbs_obj.run()
+
+	np.testing.assert_allclose(cbs_obj.fit_params,reference['fit_params'],rtol=RTOL)
+	np.testing.assert_allclose(cbs_obj.red_chi,reference['red_chi'],rtol=RTOL)
+
+	for in_keyword,attribute in [('energy','cbs_energies'),('BE2','cbs_BE2'),('rho2E0','cbs_rho2E0')]:
+		np.testing.assert_allclose(getattr(cbs_obj,attribute)[:,-1],np.array(reference[in_keyword])[:,-1],
+				rtol=RTOL_ENERGY if in_keyword == 'energy' else RTOL,atol=1e-3)
+
+def test_compare_backends(new_cbs,reference_cbsmodel):
+	cbs_obj = new_cbs(backend='numpy')
+	cbs_obj.run()
+
+	deviations = compare_backends(cbs_obj)
+
+	assert sorted(deviations) == ['BE2','energy','rho2E0']
+	assert deviations['energy'] < RTOL_ENERGY
+	assert deviations['BE2'] < RTOL and deviations['rho2E0'] < RTOL
@@ -0,0 +1,68 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import time
+import os
+
+import pytest
+
+from CBSplot.CBS_commands import read_input,cbs_fit_data_parallel
+from CBSplot.seeds import fit_starts,start_args
+
+@pytest.fixture
+def slow_cbsmodel(fake_cbsmodel,tmp_path,monkeypatch):
+	'''cbsmodel whose fits starting at r_beta = 0.3 take 1 s and above r_beta = 0.5 take 30 s'''
+
+	path_bin = tmp_path/'bin_slow'
+	path_bin.mkdir()
+
+	path = path_bin/'cbsmodel'
+	path.write_text('#!/bin/sh\n'
+			'case " $* " in\n'
+			'	*" rb 0.3"*) sleep 1;;\n'
+			'	*" rb 0.7"*|*" rb 0.9"*) sleep 30;;\n'
+			'esac\n'
+			'exec %s "$@"\n'% os.path.join(fake_cbsmodel,'cbsmodel'))
+	os.chmod(path,0o755)
+
+	monkeypatch.setenv('PATH',str(path_bin)+os.pathsep+os.environ['PATH'])
+
+def test_first_success_wins(new_cbs,slow_cbsmodel):
+	cbs_obj = new_cbs(parallel_fit=True,stats=True)
+	read_input(cbs_obj)
+
+	time_start 	= time.monotonic()
+	outputs_cbs 	= cbs_fit_data_parallel(cbs_obj,[start_args(start) for start in fit_starts(cbs_obj)])
+
+	#the fit at r_beta = 0.1 fails, the one at 0.5 finishes first but the one at 0.3 takes precedence
+	assert b'Fit failed' in outputs_cbs[0]
+	assert b'Fit successful' in outputs_cbs[1] and b'rb=0.3' in outputs_cbs[1]
+	assert outputs_cbs[2:] == [None]*3
+
+	#the fits at 0.7 and 0.9 are killed, the one at 0.5 has finished before
+	assert cbs_obj.stats.counters['fits_killed'] == 2
+	assert time.monotonic()-time_start < 20
+
+def test_run_with_parallel_fit(new_cbs,slow_cbsmodel):
+	cbs_obj = new_cbs(parallel_fit=True,stats=True)
+	cbs_obj.run()
+
+	assert cbs_obj.cbs_fit_success
+	assert cbs_obj.stats.counters['fits_killed'] == 2
@@ -0,0 +1,103 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+
+import numpy as np
+import pytest
+
+import CBSplot as cbs
+import CBSplot.parsers as parsers
+
+def test_no_sidecars_next_to_files(new_cbs,tmp_path):
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+
+	assert not [name for name in os.listdir(tmp_path) if name.endswith('.npz')]
+
+def test_sidecars_in_cache(tmp_path):
+	small_file 	= tmp_path/'small.ET'
+	large_file 	= tmp_path/'large.ET'
+
+	small_file.write_text('E 2 0 82 1\nT 2 0 0 0 144 3\n')
+	large_file.write_text(''.join('E %i 0 %i 1\n'% (2*(i % 10),i) for i in range(4000)))
+	assert os.path.getsize(large_file) >= parsers.SIDECAR_MIN_SIZE
+
+	cache 		= cbs.CBSCache(str(tmp_path/'cache'))
+	path_sidecars 	= os.path.join(cache.path,'parsed')
+
+	parsers.read_data_file(str(small_file),path_sidecars)
+	assert not os.path.exists(path_sidecars)
+
+	levels,_,_ 	= parsers.read_data_file(str(large_file),path_sidecars)
+	assert os.path.exists(parsers.sidecar_file(str(large_file),path_sidecars))
+
+	levels_cached,_,_ = parsers.read_data_file(str(large_file),path_sidecars)
+	assert np.array_equal(levels,levels_cached)
+	assert sorted(os.listdir(tmp_path)) == ['cache','large.ET','small.ET']
+
+NAMES = ['rb','Bbm2','bmax']
+
+def fit_output(lines_params,chi=True,success=True):
+	'''Output of a fit in cbsmodel with the parameter lines lines_params'''
+
+	lines = ['cbsmodel','fitting 12 data points','','fit parameters:']+lines_params+['']
+
+	if chi:
+		lines.append('chi^2/ndf : 1.2500')
+
+	lines.append('Fit successful' if success else 'Fit failed: no convergence')
+
+	return ('\n'.join(lines)+'\n').encode()
+
+def test_fit_parameters_by_label():
+	output_cbs 	= fit_output(['bmax   : 0.47642 +- 0.00136','E0frac : 1.00000 +- 0.10000',
+					'rb     : 0.36254 +- 0.00032','Bbm2   : 0.02834 +- 0.00001'])
+	fit_result 	= parsers.parse_fit_output(output_cbs,NAMES)
+
+	assert fit_result.success
+	assert fit_result.red_chi == 1.25
+	assert np.array_equal(fit_result.values,[0.36254,0.02834,0.47642])
+	assert np.array_equal(fit_result.uncertainties,[0.00032,0.00001,0.00136])
+	assert np.array_equal(fit_result.fit_params(),[0.36254,0.00032,0.02834,0.00001,0.47642,0.00136])
+
+def test_fit_parameters_in_order():
+	#labels differing from the names of the parameters are taken in their order
+	output_cbs 	= fit_output(['r_beta : 0.36254 +- 0.00032','B/b^2 : 0.02834 +- 0.00001','b_max : 0.47642 +- 0.00136'])
+	fit_result 	= parsers.parse_fit_output(output_cbs,NAMES)
+
+	assert np.array_equal(fit_result.values,[0.36254,0.02834,0.47642])
+
+	with pytest.raises(cbs.CBSOutputError):
+		parsers.parse_fit_output(fit_output(['r_beta : 0.36254 +- 0.00032','B/b^2 : 0.02834 +- 0.00001']),NAMES)
+
+def test_fit_output_errors():
+	output_cbs = fit_output(['rb : 0.36254 +- 0.00032','Bbm2 : 0.02834 +- 0.00001','bmax : 0.47642 +- 0.00136'],chi=False)
+
+	with pytest.raises(cbs.CBSOutputError,match='chisquare'):
+		parsers.parse_fit_output(output_cbs,NAMES)
+
+	with pytest.raises(cbs.CBSOutputError,match='rb'):
+		parsers.parse_fit_output(fit_output(['rb : 0.3x +- 0.00032','Bbm2 : 0.02834 +- 0.00001','bmax : 0.47642 +- 0.00136']),NAMES)
+
+	fit_result = parsers.parse_fit_output(fit_output([],chi=False,success=False),NAMES)
+
+	assert not fit_result.success
+	assert np.all(np.isnan(fit_result.values))
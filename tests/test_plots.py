@@ -0,0 +1,133 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import pytest
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import CBSplot as cbs
+from CBSplot.plots import Level,Transition,ArrowCollection,draw_arrows
+
+def arrow_figure(dpi):
+	fig 	= Figure(figsize=(4,4),dpi=dpi)
+	FigureCanvasAgg(fig)
+	ax 	= fig.add_subplot()
+	ax.set_xlim(0,10)
+	ax.set_ylim(0,1)
+
+	draw_arrows(ax,[((1.5,0.8),(1.5,0.2),4,8,'royalblue')])
+
+	return fig,ax
+
+def drawn_arrow(fig,ax):
+	fig.canvas.draw()
+
+	collection = [artist for artist in ax.collections if isinstance(artist,ArrowCollection)][0]
+
+	return collection.get_paths()[0].vertices
+
+def test_arrow_tip_follows_limits():
+	fig,ax 		= arrow_figure(100)
+
+	for ylim in [(0,1),(0,2)]:
+		ax.set_ylim(*ylim)
+		vertices = drawn_arrow(fig,ax)
+		assert np.allclose(vertices[3],ax.transData.transform((1.5,0.2)))
+
+def test_arrow_size_in_points():
+	head_widths = []
+
+	for dpi in [100,200]:
+		fig,ax 		= arrow_figure(dpi)
+		vertices 	= drawn_arrow(fig,ax)
+		head_widths.append(np.hypot(*(vertices[2]-vertices[4])))
+
+	assert np.isclose(head_widths[0],8*100/72)
+	assert np.isclose(head_widths[1],2*head_widths[0])
+
+def test_level_and_transition():
+	fig 	= Figure()
+	FigureCanvasAgg(fig)
+	ax 	= fig.add_subplot()
+
+	for band,energy,name in [(0,0,r'$0^+$'),(0,82,r'$2^+$'),(1,1099,r'$0^+$'),(2,1400,r'$2^+$')]:
+		Level(ax,band,energy,name).plot()
+	ax.set_ylim(-0.1,1.5)
+
+	Transition(ax,[0,0],[82,0],[176,1],True,'royalblue').plot()
+	Transition(ax,[2,0],[1400,82],[5],True,'royalblue').plot()
+
+	fig.canvas.draw()
+
+	assert len([artist for artist in ax.collections if isinstance(artist,ArrowCollection)]) == 2
+	#the final level of the second transition is extended
+	assert len(ax.collections) == 4+2+1
+
+MAGIC = {'pdf':b'%PDF','png':b'\x89PNG','svg':b'<?xml'}
+
+def test_headless_plot(new_cbs,example):
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+
+	for out_format,magic in MAGIC.items():
+		assert cbs_obj.plot(headless=True,out_format=out_format,to_bytes=True).startswith(magic)
+
+	out_file = cbs_obj.plot(headless=True,out_format='png')
+
+	assert (example/out_file).read_bytes().startswith(MAGIC['png'])
+
+def test_plot_formats(new_cbs):
+	cbs_obj = new_cbs()
+
+	with pytest.raises(ValueError,match='No CBS calculation'):
+		cbs_obj.plot(headless=True,to_bytes=True)
+
+	cbs_obj.run()
+
+	for out_format in ['jpg','PDF',None]:
+		with pytest.raises(ValueError,match='out_format'):
+			cbs_obj.plot(headless=True,out_format=out_format,to_bytes=True)
+
+	with pytest.raises(ValueError,match='out_format'):
+		cbs.plot_many([cbs_obj],out_format='jpg')
+
+	with pytest.raises(ValueError,match='plot_format'):
+		cbs.CBSplotBatch([(['Sm',62,92],'input_154Sm.cbs','plot_data_154Sm.ET')],plot_format='jpg')
+
+def test_plot_many(new_cbs):
+	list_cbs = [new_cbs() for num_cbs in range(3)]
+
+	for cbs_obj in list_cbs:
+		cbs_obj.run()
+
+	single 		= list_cbs[0].plot(headless=True,out_format='svg',to_bytes=True)
+	out_plots 	= cbs.plot_many(list_cbs,out_format='svg',to_bytes=True,max_workers=2)
+
+	assert len(out_plots) == 3
+	assert all([out_plot.startswith(MAGIC['svg']) for out_plot in out_plots])
+	#the same object gives the same level scheme in a worker
+	assert len(out_plots[0]) == pytest.approx(len(single),rel=0.05)
+
+	assert cbs.plot_many([],out_format='png') == []
@@ -0,0 +1,86 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+import resource
+import asyncio
+import os
+
+import pytest
+
+import CBSplot as cbs
+from CBSplot.process import start_cbsmodel,kill_process_group
+
+@pytest.fixture
+def crashing_cbsmodel(tmp_path):
+	'''cbsmodel which terminates right after its start'''
+
+	path = tmp_path/'crashing_cbsmodel'
+	path.write_text('#!/bin/sh\nexit 1\n')
+	os.chmod(path,0o755)
+
+	return str(path)
+
+def test_session_crash_is_process_error(crashing_cbsmodel):
+	with cbs.CBSModelSession(executable=crashing_cbsmodel,max_restarts=1) as session:
+		with pytest.raises(cbs.CBSProcessError):
+			session.run('A 154 Z 62 energy 2 0 exit')
+
+def test_run_returns_status(new_cbs,crashing_cbsmodel):
+	with cbs.CBSModelSession(executable=crashing_cbsmodel,max_restarts=0) as session:
+		status = new_cbs(session=session).run(raise_errors=False)
+
+	assert not status
+	assert isinstance(status.error,cbs.CBSError)
+
+def test_run_async_returns_status(new_cbs,crashing_cbsmodel):
+	assert asyncio.run(new_cbs().run_async())
+
+	with cbs.CBSModelSession(executable=crashing_cbsmodel,max_restarts=0) as session:
+		cbs_obj = new_cbs(session=session)
+
+		status = asyncio.run(cbs_obj.run_async(raise_errors=False))
+
+		assert not status
+		assert isinstance(status.error,cbs.CBSError)
+
+		with pytest.raises(cbs.CBSError):
+			asyncio.run(cbs_obj.run_async())
+
+def test_timeout(new_cbs,monkeypatch):
+	monkeypatch.setenv('FAKE_CBSMODEL_LATENCY','2')
+
+	status = new_cbs(timeout=0.2).run(raise_errors=False)
+
+	assert not status
+	assert status.error_type == 'CBSFitError'
+
+def test_rlimits_are_applied():
+	process = start_cbsmodel(['sleep','10'],{'cpu':5,'memory':2*1024**3})
+
+	try:
+		assert resource.prlimit(process.pid,resource.RLIMIT_CPU) == (5,5)
+		assert resource.prlimit(process.pid,resource.RLIMIT_AS) == (2*1024**3,2*1024**3)
+	finally:
+		kill_process_group(process)
+		process.wait()
+
+def test_rlimits_of_session(new_cbs):
+	with cbs.CBSModelSession() as session:
+		with pytest.raises(ValueError):
+			new_cbs(session=session,rlimits={'cpu':5})
@@ -0,0 +1,54 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from CBSplot.CBS_commands import (read_input,quantities_in_lists,all_quantities_string,
+				calculate_cbs_quantities,extract_cbs_quantities)
+
+def test_single_call(new_cbs):
+	cbs_obj = new_cbs(stats=True)
+	cbs_obj.run()
+
+	assert cbs_obj.stats.stages['calculate_cbs_quantities']['calls'] == 1
+	#two fits (the first one fails) and one call for all quantities
+	assert cbs_obj.stats.counters['subprocesses'] == 3
+
+def test_positions(new_cbs):
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+
+	in_lists 		= quantities_in_lists(*read_input(cbs_obj))
+	run_string,positions 	= all_quantities_string(cbs_obj,in_lists)
+
+	assert list(positions) == list(in_lists)
+	assert run_string.count('simpleoutput') == 1 and run_string.endswith('exit')
+	assert [stop-start for start,stop in positions.values()] == [len(in_list) for in_list in in_lists.values()]
+
+def test_same_values_as_calls_per_type(new_cbs):
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+
+	in_lists = quantities_in_lists(*read_input(cbs_obj))
+
+	for in_keyword,attribute in [('energy','cbs_energies'),('BE2','cbs_BE2'),('rho2E0','cbs_rho2E0')]:
+		values_cbs = extract_cbs_quantities(cbs_obj,calculate_cbs_quantities(cbs_obj,in_lists[in_keyword],in_keyword))
+
+		assert np.array_equal(getattr(cbs_obj,attribute)[:,-1],values_cbs)
@@ -0,0 +1,138 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+import threading
+
+import numpy as np
+
+import CBSplot as cbs
+import CBSplot.results
+
+def test_rerun_appends_once(new_cbs,example):
+	store 		= cbs.CBSResultsStore(str(example/'results'))
+	cbs_obj 	= new_cbs(results_store=store)
+
+	for num_run in range(3):
+		cbs_obj.run()
+
+	assert len(store) == 0
+	assert store.close() is not None
+	assert len(store) == 1
+	assert len(store.chunk_paths()) == 1
+
+	result = store.results()[0]
+
+	assert result['nucleus'] == ['Sm',62,92]
+	assert result['name_fit_params'] == cbs_obj.name_fit_params
+	assert np.array_equal(result['fit_params'],cbs_obj.fit_params)
+	assert np.array_equal(result['cbs_BE2'],cbs_obj.cbs_BE2)
+	assert np.array_equal(result['cbs_energies'],cbs_obj.cbs_energies)
+
+def test_shared_store_and_chunk_size(new_cbs,example):
+	cbs_objs = [new_cbs(results_store=str(example/'results')) for num_obj in range(2)]
+
+	assert cbs_objs[0].results_store is cbs_objs[1].results_store
+
+	store 		= cbs_objs[0].results_store
+	store.chunk_size = 2
+
+	for cbs_obj in cbs_objs:
+		cbs_obj.run()
+
+	assert len(store.chunk_paths()) == 1
+	assert list(store.column('Z')) == [62,62]
+
+def test_batch_writes_one_chunk(example):
+	jobs 	= [(['Sm',62,92],'input_154Sm.cbs','plot_data_154Sm.ET')]*3
+	batch 	= cbs.CBSplotBatch(jobs,max_workers=2,verbose=False,results_store=str(example/'results'))
+	batch.run()
+
+	store = cbs.CBSResultsStore(str(example/'results'))
+
+	assert len(store.chunk_paths()) == 1
+	assert len(store) == 3
+
+def test_failed_results_are_skipped(example):
+	store = cbs.CBSResultsStore(str(example/'results'))
+
+	assert store.write([{'success':False}]) is None
+	assert len(store) == 0
+
+def test_interrupted_compact(new_cbs,example,monkeypatch):
+	import shutil
+
+	store = cbs.CBSResultsStore(str(example/'results'))
+
+	for num_run in range(2):
+		cbs_obj = new_cbs()
+		cbs_obj.run()
+		store.write([cbs_obj])
+
+	assert len(store.chunk_paths()) == 2
+
+	#crash after the merged chunk has been written
+	with monkeypatch.context() as patch:
+		patch.setattr(shutil,'rmtree',lambda *args,**kwargs: None)
+		store.compact()
+
+	assert len(store.chunk_paths()) == 1
+	assert len(store) == 2
+
+	store.write(store.results()[:1])
+	store.compact()
+
+	assert len(store.chunk_paths()) == 1
+	assert len(store) == 3
+	assert len([path for path in (example/'results').iterdir() if path.is_dir()]) == 1
+
+	#the removed chunks of the first compact() are not listed again
+	assert len(CBSplot.results.replaced_chunks(store.chunk_paths()[0])) == 2
+
+def compact(path):
+	cbs.CBSResultsStore(path).compact()
+
+def test_concurrent_compact(new_cbs,example):
+	store 	= cbs.CBSResultsStore(str(example/'results'))
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+
+	for num_chunk in range(8):
+		store.write([cbs_obj])
+
+	context 	= multiprocessing.get_context('fork')
+	processes 	= [context.Process(target=compact,args=(store.path,)) for num_process in range(4)]
+
+	for process in processes:
+		process.start()
+
+	threads 	= [threading.Thread(target=store.compact) for num_thread in range(2)]
+
+	for thread in threads:
+		thread.start()
+
+	for process in processes:
+		process.join()
+
+	for thread in threads:
+		thread.join()
+
+	assert all([process.exitcode == 0 for process in processes])
+	assert len(store.chunk_paths()) == 1
+	assert len(store) == 8
@@ -0,0 +1,63 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+import CBSplot as cbs
+import CBSplot.scan
+
+from CBSplot.scan import cbs_quantities_many,command_chunks
+from CBSplot.process import start_cbsmodel
+
+IN_LISTS 	= {'energy':np.array([[2,0],[4,0]]),'BE2':np.array([[2,0,0,0]])}
+
+def parameter_sets(num_sets):
+	return np.stack([np.linspace(0.2,0.5,num_sets),np.full(num_sets,0.028),np.linspace(0.4,0.5,num_sets)],axis=1)
+
+def test_command_chunks():
+	assert command_chunks([3,3,3,3],6) == [(0,2),(2,4)]
+	assert command_chunks([10,1,1],6) == [(0,1),(1,3)]
+	assert command_chunks([],6) == []
+
+def test_many_parameter_sets_in_chunks(new_cbs,monkeypatch):
+	values 		= parameter_sets(50)
+
+	cbs_obj 	= new_cbs(stats=True)
+	cbs_obj.run()
+
+	calls 		= cbs_obj.stats.counters['subprocesses']
+	quantities 	= cbs_quantities_many(cbs_obj,values,IN_LISTS)
+
+	assert cbs_obj.stats.counters['subprocesses'] == calls+1
+
+	monkeypatch.setattr(CBSplot.scan,'MAX_COMMAND_LENGTH',500)
+
+	quantities_chunks = cbs_quantities_many(cbs_obj,values,IN_LISTS)
+
+	assert cbs_obj.stats.counters['subprocesses'] > calls+2
+
+	for in_keyword in IN_LISTS:
+		assert quantities_chunks[in_keyword].shape == (50,len(IN_LISTS[in_keyword]))
+		assert np.array_equal(quantities[in_keyword],quantities_chunks[in_keyword])
+
+def test_command_line_too_long():
+	with pytest.raises(cbs.CBSProcessError,match='too long'):
+		start_cbsmodel(['cbsmodel']+['energy']*512*1024)
@@ -0,0 +1,108 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import pickle
+
+import numpy as np
+import pytest
+
+import CBSplot as cbs
+import CBSplot.batch
+from CBSplot.seeds import fit_starts,R_BETAS
+from CBSplot.CBS_commands import read_input
+
+SEEDS = {(62,90):{'rb':0.30,'Bbm2':0.020},(62,96):{'rb':0.40,'Bbm2':0.030},(64,92):{'rb':0.50,'Bbm2':0.040}}
+
+def test_nearest_seed():
+	seeds = cbs.CBSFitSeeds(SEEDS)
+
+	assert seeds.nearest(62,91) == SEEDS[(62,90)]
+	assert seeds.nearest(62,95) == SEEDS[(62,96)]
+	#(62,90) and (64,92) are equally far from (62,92), isotopes are preferred
+	assert seeds.nearest(62,92) == SEEDS[(62,90)]
+	assert seeds.nearest(64,93) == SEEDS[(64,92)]
+	assert cbs.CBSFitSeeds().nearest(62,92) is None
+
+def test_fit_starts(new_cbs):
+	cbs_obj = new_cbs(seeds=cbs.CBSFitSeeds(SEEDS))
+	read_input(cbs_obj)
+
+	starts = fit_starts(cbs_obj)
+
+	assert starts[0] == {'rb':0.30,'Bbm2':0.020}
+	assert [start['rb'] for start in starts[1:]] == sorted(R_BETAS,key=lambda r_beta: abs(r_beta-0.30))
+	assert all([start['Bbm2'] == 0.020 for start in starts])
+
+	cbs_obj = new_cbs()
+	read_input(cbs_obj)
+
+	assert [start['rb'] for start in fit_starts(cbs_obj)] == list(R_BETAS)
+
+def test_seeds_are_stored_and_reloaded(new_cbs,example):
+	seeds 	= cbs.CBSFitSeeds()
+	cbs_obj = new_cbs(seeds=seeds,stats=True)
+	cbs_obj.run()
+
+	assert seeds.nearest(62,92) == dict(zip(cbs_obj.name_fit_params,cbs_obj.fit_params[0::2]))
+
+	reloaded = pickle.loads(pickle.dumps(seeds))
+	reloaded.add(62,94,['rb'],[0.4])
+
+	assert reloaded.nearest(62,92) == seeds.nearest(62,92)
+	assert len(reloaded) == 2 and len(seeds) == 1
+
+	#seeds from the results of earlier calculations
+	store = cbs.CBSResultsStore(str(example/'results'))
+	store.write([cbs_obj])
+
+	stored = cbs.CBSFitSeeds()
+	stored.add_results(store.results())
+
+	assert stored.seeds == seeds.seeds
+
+	#the fit starting from the seed converges at once
+	cbs_seeded = new_cbs(seeds=stored,stats=True)
+	cbs_seeded.run()
+
+	assert cbs_seeded.stats.counters.get('fit_retries',0) < cbs_obj.stats.counters['fit_retries']
+
+class RecordingExecutor(CBSplot.batch.ProcessPoolExecutor):
+	'''Executor recording the nuclei and the number of seeds of all submitted jobs'''
+
+	submitted = []
+
+	def submit(self,function,job,options,*args):
+		RecordingExecutor.submitted.append((tuple(job[0]),len(options['seeds'])))
+		return super().submit(function,job,options,*args)
+
+@pytest.mark.filterwarnings('ignore:Mass numbers do not coincide')
+def test_warm_start_order(example,monkeypatch):
+	monkeypatch.setattr(CBSplot.batch,'ProcessPoolExecutor',RecordingExecutor)
+	RecordingExecutor.submitted = []
+
+	jobs 	= [(['Sm',62,N],'input_154Sm.cbs','plot_data_154Sm.ET') for N in [94,90,92]]
+	batch 	= cbs.CBSplotBatch(jobs,max_workers=1,verbose=False,warm_start=True)
+	results = batch.run()
+
+	#jobs are submitted in the order of (Z,N), each with the seeds of all jobs finished before
+	assert RecordingExecutor.submitted == [(('Sm',62,90),0),(('Sm',62,92),1),(('Sm',62,94),2)]
+	assert [result['nucleus'][2] for result in results] == [94,90,92]
+	assert all([result['success'] for result in results])
+	assert len(batch.seeds) == 3
@@ -0,0 +1,112 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import subprocess
+import os
+
+import numpy as np
+import pytest
+
+import CBSplot as cbs
+import CBSplot.CBS_commands
+
+COMMANDS = 'A 154 Z 62 Wu simpleoutput rb 0.36 Bbm2 0.028 bmax 0.48 energy 2 0 BE2 2 0 0 0 exit'
+
+def script(tmp_path,name,text):
+	'''Write an executable shell script to tmp_path'''
+
+	path = tmp_path/name
+	path.write_text('#!/bin/sh\n'+text)
+	os.chmod(path,0o755)
+
+	return str(path)
+
+@pytest.fixture
+def banner_cbsmodel(tmp_path):
+	'''cbsmodel printing a banner on stdout and much text on stderr at its start'''
+
+	return script(tmp_path,'banner_cbsmodel',
+			'echo "cbsmodel stand-in with a banner"\n'
+			'head -c 1000000 /dev/zero | tr "\\0" "x" >&2\n'
+			'echo >&2\n'
+			'echo "warning: no configuration" >&2\n'
+			'exec cbsmodel "$@"\n')
+
+def test_session_matches_command_line():
+	output_cbs = subprocess.run(['cbsmodel']+COMMANDS.split(),stdout=subprocess.PIPE,check=True).stdout
+
+	with cbs.CBSModelSession() as session:
+		assert session.run(COMMANDS) == output_cbs
+		assert session.run(COMMANDS) == output_cbs
+
+	assert cbs.parsers.parse_simple_output(output_cbs,2).shape == (2,)
+
+def test_banner_is_read_once(banner_cbsmodel):
+	with cbs.CBSModelSession(executable=banner_cbsmodel) as session:
+		output_cbs = session.run(COMMANDS)
+
+		assert session.banner == b'cbsmodel stand-in with a banner\n'
+		assert output_cbs.startswith(b'simple output')
+		assert len(cbs.parsers.parse_simple_output(output_cbs,2)) == 2
+
+def test_stderr_is_separate(banner_cbsmodel):
+	with cbs.CBSModelSession(executable=banner_cbsmodel) as session:
+		output_cbs = session.run(COMMANDS,timeout=10)
+
+		assert b'x' not in output_cbs and b'warning' not in output_cbs
+		session.close()
+		assert session.stderr[-1] == b'warning: no configuration\n'
+
+def test_missing_marker(tmp_path):
+	silent_cbsmodel = script(tmp_path,'silent_cbsmodel','cat > /dev/null\n')
+
+	with cbs.CBSModelSession(executable=silent_cbsmodel,startup_timeout=0.5) as session:
+		with pytest.raises(cbs.CBSProcessError,match='marker'):
+			session.run(COMMANDS)
+
+def test_crash_reports_stderr(tmp_path):
+	crashing_cbsmodel = script(tmp_path,'crashing_cbsmodel','echo "segmentation fault" >&2\nexit 1\n')
+
+	with cbs.CBSModelSession(executable=crashing_cbsmodel,max_restarts=1) as session:
+		with pytest.raises(cbs.CBSProcessError,match='segmentation fault'):
+			session.run(COMMANDS)
+
+def test_calculation_with_session(new_cbs,banner_cbsmodel):
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+
+	with cbs.CBSModelSession(executable=banner_cbsmodel) as session:
+		cbs_session = new_cbs(session=session,stats=True)
+		cbs_session.run()
+
+	assert cbs_session.stats.counters['session_calls'] >= 2
+	assert np.array_equal(cbs_obj.fit_params,cbs_session.fit_params)
+	assert np.array_equal(cbs_obj.cbs_BE2,cbs_session.cbs_BE2)
+
+def test_error_reply_is_not_cached(new_cbs,tmp_path):
+	with cbs.CBSModelSession() as session:
+		cbs_obj 	= new_cbs(session=session,cache=cbs.CBSCache(str(tmp_path/'cache')))
+
+		output_error 	= CBSplot.CBS_commands.run_cbsmodel(cbs_obj,'A 154 Z 62 Wu simpleoutput energy 2 0 unknown exit')
+		output_cbs 	= CBSplot.CBS_commands.run_cbsmodel(cbs_obj,COMMANDS)
+
+	assert b'Error' in output_error
+	assert cbs_obj.cache.get(cbs_obj.cache.key('A 154 Z 62 Wu simpleoutput energy 2 0 unknown exit')) is None
+	assert cbs_obj.cache.get(cbs_obj.cache.key(COMMANDS)) == output_cbs
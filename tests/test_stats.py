@@ -0,0 +1,41 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+def test_parallel_fit_is_one_stage(new_cbs):
+	cbs_obj 	= new_cbs(parallel_fit=True,stats=True)
+
+	start 		= time.perf_counter()
+	cbs_obj.run()
+	wall_run 	= time.perf_counter()-start
+
+	stage = cbs_obj.stats.stages['cbs_fit_data']
+
+	assert stage['calls'] == 1
+	assert stage['wall'] <= wall_run
+	assert cbs_obj.stats.counters['subprocesses'] >= 2
+
+def test_sequential_fits_are_stages(new_cbs):
+	cbs_obj = new_cbs(stats=True)
+	cbs_obj.run()
+
+	#the fit starting at r_beta = 0.1 fails
+	assert cbs_obj.stats.stages['cbs_fit_data']['calls'] == 2
+	assert cbs_obj.stats.counters['fit_retries'] == 1
@@ -0,0 +1,93 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import pickle
+
+import numpy as np
+import pytest
+
+import CBSplot as cbs
+from CBSplot.scan import cbs_quantities_many
+
+GRID 		= {'rb':np.linspace(0.30,0.42,13),'Bbm2':np.linspace(0.026,0.030,9),'bmax':np.linspace(0.40,0.55,4)}
+IN_LISTS 	= {'energy':np.array([[0,0],[2,0],[4,0],[0,1]]),'BE2':np.array([[2,0,0,0],[2,1,0,1]])}
+
+@pytest.fixture
+def surrogate(new_cbs,example):
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+
+	return cbs_obj.build_surrogate(str(example/'surrogate'),GRID,IN_LISTS)
+
+def test_accurate_values_match_exact(new_cbs,surrogate):
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+
+	values 		= np.random.default_rng(0).uniform([0.31,0.0265,0.41],[0.41,0.0295,0.54],(20,3))
+	exact 		= cbs_quantities_many(cbs_obj,values,IN_LISTS,exact=True)
+	exact 		= np.concatenate([exact[in_keyword] for in_keyword in IN_LISTS],axis=1)
+
+	out_values,accurate = surrogate.lookup(values,IN_LISTS,tol=1e-3)
+
+	assert np.mean(accurate) > 0.5
+	assert np.all(np.abs(out_values-exact)[accurate] <= 1e-3*np.abs(exact)[accurate]+cbs.SURROGATE_ATOL+1e-6)
+
+	#energy 0 0 vanishes, it is only accepted by the absolute tolerance
+	assert np.all(exact[:,0] == 0) and np.all(accurate[:,0])
+
+def test_fallback_to_exact(new_cbs,surrogate):
+	out_values,accurate = surrogate.lookup([[0.2,0.028,0.48],[0.36,0.028,0.6]],IN_LISTS)
+
+	assert not np.any(accurate)
+	assert np.all(np.isnan(out_values))
+
+	cbs_exact 	= new_cbs()
+	cbs_exact.run()
+
+	cbs_tol 	= new_cbs(surrogate=surrogate,surrogate_tol=0.,stats=True)
+	cbs_tol.run()
+
+	#only the quantities without interpolation error are taken from the surrogate
+	assert cbs_tol.stats.counters['surrogate_fallbacks'] > 0
+	assert np.array_equal(cbs_tol.cbs_energies[1:],cbs_exact.cbs_energies[1:])
+
+def test_run_with_surrogate(new_cbs,surrogate):
+	cbs_exact 	= new_cbs()
+	cbs_exact.run()
+
+	cbs_obj 	= new_cbs(surrogate=surrogate,surrogate_tol=1e-2,stats=True)
+	cbs_obj.run()
+
+	assert cbs_obj.stats.counters['surrogate_hits'] > 0
+	assert np.allclose(cbs_obj.cbs_energies,cbs_exact.cbs_energies,rtol=1e-2,atol=cbs.SURROGATE_ATOL)
+
+def test_reload(surrogate,example):
+	reloaded = cbs.CBSSurrogate(str(example/'surrogate'))
+
+	assert isinstance(reloaded.table,np.memmap)
+	assert reloaded.keys == surrogate.keys
+	assert reloaded.name_params == ['rb','Bbm2','bmax']
+	assert reloaded.shape == (13,9,4)
+	assert np.array_equal(reloaded.table,surrogate.table)
+	assert not np.any(np.isnan(reloaded.table))
+
+	values = [[0.3625,0.02834,0.476]]
+
+	assert np.array_equal(pickle.loads(pickle.dumps(reloaded)).evaluate(values)[0],surrogate.evaluate(values)[0])
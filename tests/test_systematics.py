@@ -0,0 +1,75 @@
+#  SPDX-License-Identifier: GPL-3.0+
+#
+# Copyright © 2020 T. Beck.
+#
+# This file is part of CBSplot.
+#
+# CBSplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBSplot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBSplot.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import pytest
+
+import CBSplot as cbs
+
+def result(N,E4,rb):
+	'''Result of CBSplotBatch with E(2+) = 100, B(E2;2+ -> 0+) = 100 and the fit parameters rb, bmax'''
+
+	return {'nucleus':['Sm',62,N],
+		'exp_data_file':None,
+		'success':True,
+		'name_fit_params':['rb','bmax'],
+		'fit_params':np.array([rb,0.01,0.3,0.02]),
+		'cbs_energies':np.array([[0,0,0.],[2,0,100.],[4,0,E4]]),
+		'cbs_BE2':np.array([[2,0,0,0,100.],[4,0,2,0,150.]]),
+		'cbs_rho2E0':np.array([[0,1,0,0,0.05]])}
+
+RESULTS = [result(92,300.,0.35),result(90,250.,0.2),{'nucleus':['Sm',62,94],'success':False}]
+
+def test_systematics_table():
+	table = cbs.systematics_table(RESULTS,params=('rb','Bbm2'))
+
+	assert len(table) == 2
+	assert list(table['N']) == [92,90]
+	assert np.allclose(table['R42'],[3.,2.5])
+	assert np.allclose(table['BE2_ratio'],1.5)
+	assert np.allclose(table['rho2E0'],0.05)
+	assert np.allclose(table['rb'],[0.35,0.2]) and np.allclose(table['rb_err'],0.01)
+	assert np.all(np.isnan(table['Bbm2'])) and np.all(np.isnan(table['Bbm2_err']))
+
+def test_systematics_of_run(new_cbs):
+	cbs_obj = new_cbs()
+	cbs_obj.run()
+
+	table 	= cbs.systematics_table([cbs_obj])
+	E2,E4 	= [cbs_obj.cbs_energies[(cbs_obj.cbs_energies[:,0] == L) & (cbs_obj.cbs_energies[:,1] == 0),2][0] for L in [2,4]]
+
+	assert table['R42'][0] == pytest.approx(E4/E2)
+	assert table['rb'][0] == cbs_obj.fit_params[0]
+
+def test_plot_systematics_to_bytes():
+	pdf = cbs.plot_systematics(RESULTS,headless=True,to_bytes=True)
+	png = cbs.plot_systematics(RESULTS,quantities=('R42','rb'),headless=True,out_format='png',to_bytes=True)
+
+	assert pdf.startswith(b'%PDF')
+	assert png.startswith(b'\x89PNG')
+
+	with pytest.raises(ValueError):
+		cbs.plot_systematics(RESULTS,x='A',headless=True,to_bytes=True)
+
+	with pytest.raises(ValueError):
+		cbs.plot_systematics(RESULTS,headless=True,out_format='jpg',to_bytes=True)